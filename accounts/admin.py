@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+
+from core.admin import LargeTableAdminMixin
 from .models import UserProfile, Notification
 
 class UserProfileInline(admin.StackedInline):
@@ -15,6 +17,9 @@ class UserAdmin(BaseUserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'get_university_email', 'get_department')
     list_filter = BaseUserAdmin.list_filter + ('profile__is_verified', 'profile__department')
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('profile__department')
+    
     def get_university_email(self, obj):
         return obj.profile.university_email if hasattr(obj, 'profile') else '-'
     get_university_email.short_description = 'University Email'
@@ -56,17 +61,23 @@ class UserProfileAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'department')
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('title', 'recipient', 'notification_type', 'is_read', 'created_at')
     list_filter = ('notification_type', 'is_read', 'created_at')
     search_fields = ('title', 'message', 'recipient__username')
     readonly_fields = ('created_at',)
-    date_hierarchy = 'created_at'
+    # No date_hierarchy: listing the years and months it links to reads every row
     
     actions = ['mark_as_read', 'mark_as_unread']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('recipient')
+    
     def mark_as_read(self, request, queryset):
         queryset.update(is_read=True)
     mark_as_read.short_description = "Mark selected notifications as read"
@@ -0,0 +1,101 @@
+# Generated manually: SQLite FTS5 index for user search, kept in sync by triggers
+
+from django.db import migrations
+
+# Index rows for the users matched by `{target}`, an SQL "= id" or
+# "IN (...)" condition on the user id; REFRESH_SQL replaces existing rows
+INSERT_SQL = """
+    INSERT INTO user_fts (rowid, username, name, bio, department, branch, skills)
+    SELECT u.id, u.username, u.first_name || ' ' || u.last_name, COALESCE(p.bio, ''),
+           COALESCE(d.code || ' ' || d.name, ''), COALESCE(b.code || ' ' || b.name, ''),
+           COALESCE((SELECT group_concat(s.name, ' ')
+                     FROM {offeredskill} o JOIN {skill} s ON s.id = o.skill_id
+                     WHERE o.user_id = u.id AND o.is_active), '')
+    FROM {user} u
+    LEFT JOIN {userprofile} p ON p.user_id = u.id
+    LEFT JOIN {department} d ON d.id = p.department_id
+    LEFT JOIN {branch} b ON b.id = p.branch_id
+    WHERE u.id {target}
+"""
+REFRESH_SQL = 'DELETE FROM user_fts WHERE rowid {target}; ' + INSERT_SQL + '; '
+
+TRIGGERS = {
+    'user_fts_user_insert': ('AFTER INSERT ON {user}', ['= new.id']),
+    'user_fts_user_update': ('AFTER UPDATE OF username, first_name, last_name ON {user}', ['= new.id']),
+    'user_fts_profile_insert': ('AFTER INSERT ON {userprofile}', ['= new.user_id']),
+    'user_fts_profile_update': ('AFTER UPDATE OF bio, department_id, branch_id, user_id ON {userprofile}',
+                                ['= old.user_id', '= new.user_id']),
+    'user_fts_profile_delete': ('AFTER DELETE ON {userprofile}', ['= old.user_id']),
+    'user_fts_offered_insert': ('AFTER INSERT ON {offeredskill}', ['= new.user_id']),
+    'user_fts_offered_update': ('AFTER UPDATE OF skill_id, is_active, user_id ON {offeredskill}',
+                                ['= old.user_id', '= new.user_id']),
+    'user_fts_offered_delete': ('AFTER DELETE ON {offeredskill}', ['= old.user_id']),
+    'user_fts_skill_update': ('AFTER UPDATE OF name ON {skill}',
+                              ['IN (SELECT user_id FROM {offeredskill} WHERE skill_id = new.id)']),
+    'user_fts_department_update': ('AFTER UPDATE OF code, name ON {department}',
+                                   ['IN (SELECT user_id FROM {userprofile} WHERE department_id = new.id)']),
+    'user_fts_branch_update': ('AFTER UPDATE OF code, name ON {branch}',
+                               ['IN (SELECT user_id FROM {userprofile} WHERE branch_id = new.id)']),
+}
+
+CREATE_TABLE_SQL = """
+    CREATE VIRTUAL TABLE user_fts USING fts5(
+        username, name, bio, department, branch, skills,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+
+def create_user_fts(apps, schema_editor):
+    """Other backends fall back to icontains lookups in accounts.search"""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(CREATE_TABLE_SQL)
+    except Exception:
+        # SQLite built without FTS5
+        return
+
+    tables = {
+        name: schema_editor.quote_name(apps.get_model(app_label, model)._meta.db_table)
+        for name, (app_label, model) in {
+            'user': ('auth', 'User'),
+            'userprofile': ('accounts', 'UserProfile'),
+            'department': ('core', 'Department'),
+            'branch': ('core', 'Branch'),
+            'offeredskill': ('skills', 'OfferedSkill'),
+            'skill': ('skills', 'Skill'),
+        }.items()
+    }
+    for name, (event, targets) in TRIGGERS.items():
+        body = ''.join(REFRESH_SQL.format(target=target.format(**tables), **tables) for target in targets)
+        schema_editor.execute(f'CREATE TRIGGER {name} {event.format(**tables)} BEGIN {body} END')
+    schema_editor.execute(
+        f"CREATE TRIGGER user_fts_user_delete AFTER DELETE ON {tables['user']} BEGIN "
+        f"DELETE FROM user_fts WHERE rowid = old.id; END"
+    )
+    schema_editor.execute(INSERT_SQL.format(target=f"IN (SELECT id FROM {tables['user']})", **tables))
+
+
+def drop_user_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in [*TRIGGERS, 'user_fts_user_delete']:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    schema_editor.execute('DROP TABLE IF EXISTS user_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_userprofile_branch_alter_userprofile_department'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0001_initial'),
+        ('skills', '0007_skill_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_user_fts, drop_user_fts),
+    ]
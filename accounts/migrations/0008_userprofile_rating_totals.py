@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+FIELDS = ['teacher_rating_sum', 'teacher_rating_count', 'learner_rating_sum', 'learner_rating_count']
+
+
+def add_rating_total_columns(apps, schema_editor):
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    for name in FIELDS:
+        field = UserProfile._meta.get_field(name)
+        if schema_editor.connection.vendor != 'sqlite':
+            schema_editor.add_field(UserProfile, field)
+            continue
+        # Django rebuilds SQLite tables to add NOT NULL columns, which would
+        # drop the user_fts triggers on this table
+        definition, _ = schema_editor.column_sql(UserProfile, field)
+        check = field.db_parameters(schema_editor.connection)['check']
+        schema_editor.execute('ALTER TABLE {} ADD COLUMN {} {} DEFAULT 0 CHECK ({})'.format(
+            schema_editor.quote_name(UserProfile._meta.db_table), schema_editor.quote_name(field.column), definition, check,
+        ))
+
+
+def remove_rating_total_columns(apps, schema_editor):
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    for name in FIELDS:
+        schema_editor.remove_field(UserProfile, UserProfile._meta.get_field(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_notification_recent_idx'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='userprofile',
+                    name=name,
+                    field=models.PositiveIntegerField(default=0, editable=False),
+                )
+                for name in FIELDS
+            ],
+        ),
+        migrations.RunPython(add_rating_total_columns, remove_rating_total_columns),
+    ]
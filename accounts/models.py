@@ -33,6 +33,11 @@ class UserProfile(models.Model):
     total_sessions_learned = models.PositiveIntegerField(default=0)
     average_rating_as_teacher = models.FloatField(default=0.0)
     average_rating_as_learner = models.FloatField(default=0.0)
+    # Running totals behind the averages (see skill_sessions.ratings)
+    teacher_rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    teacher_rating_count = models.PositiveIntegerField(default=0, editable=False)
+    learner_rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    learner_rating_count = models.PositiveIntegerField(default=0, editable=False)
     
     # Preferences
     prefer_in_person = models.BooleanField(default=True)
@@ -94,6 +99,10 @@ class Notification(models.Model):
     class Meta:
         ordering = ['-created_at']
         db_table = 'notification'
+        indexes = [
+            # Read backwards for the newest-first ordering
+            models.Index(fields=['created_at'], name='notification_recent_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.recipient.username}"
@@ -0,0 +1,136 @@
+"""
+User search.
+
+On SQLite the user_fts FTS5 table (migration 0006, kept in sync by
+triggers) indexes usernames, names, bios, department and branch codes and
+the names of the skills each user offers. Matches are ranked with BM25
+and fetched together with everything the results need in one query,
+with keyset pagination on (score, user id). Other backends fall back to
+icontains lookups with a simpler ranking.
+"""
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Case, Exists, FloatField, OuterRef, Q, Value, When
+
+from core.models import Department, Branch
+from skills.models import OfferedSkill, Skill
+from skills.search import search_terms, match_expression
+from skills.suggestions import encode_cursor, decode_cursor
+from .models import UserProfile
+
+FTS_TABLE = 'user_fts'
+# BM25 weights for username, name, bio, department, branch and skills
+BM25_WEIGHTS = (10.0, 8.0, 1.0, 3.0, 3.0, 4.0)
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+
+RESULT_FIELDS = ('id', 'username', 'first_name', 'last_name', 'year', 'department', 'branch', 'score')
+
+_fts_tables = {}
+
+
+def fts_available():
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in _fts_tables:
+        _fts_tables[key] = (connection.vendor == 'sqlite'
+                            and FTS_TABLE in connection.introspection.table_names())
+    return _fts_tables[key]
+
+
+def _fts_rows(terms, department, year, skill_id, after, limit):
+    table = connection.ops.quote_name
+    sql = [
+        f"""
+        SELECT u.id, u.username, u.first_name, u.last_name, p.year, d.code, b.code, f.score
+        FROM (SELECT rowid AS user_id, bm25({FTS_TABLE}, {', '.join(['%s'] * len(BM25_WEIGHTS))}) AS score
+              FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s) f
+        JOIN {table(User._meta.db_table)} u ON u.id = f.user_id
+        LEFT JOIN {table(UserProfile._meta.db_table)} p ON p.user_id = u.id
+        LEFT JOIN {table(Department._meta.db_table)} d ON d.id = p.department_id
+        LEFT JOIN {table(Branch._meta.db_table)} b ON b.id = p.branch_id
+        WHERE u.is_active
+        """
+    ]
+    params = [*BM25_WEIGHTS, match_expression(terms)]
+    if department:
+        sql.append('AND UPPER(d.code) = UPPER(%s)')
+        params.append(department)
+    if year:
+        sql.append('AND p.year = %s')
+        params.append(year)
+    if skill_id:
+        sql.append(f'AND EXISTS (SELECT 1 FROM {table(OfferedSkill._meta.db_table)} o '
+                   f'WHERE o.user_id = u.id AND o.skill_id = %s AND o.is_active)')
+        params.append(skill_id)
+    if after:
+        sql.append('AND (f.score > %s OR (f.score = %s AND u.id > %s))')
+        params.extend([after[0], after[0], after[1]])
+    sql.append('ORDER BY f.score, u.id LIMIT %s')
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute('\n'.join(sql), params)
+        return cursor.fetchall()
+
+
+def _orm_rows(terms, department, year, skill_id, after, limit):
+    users = User.objects.filter(is_active=True)
+    for term in terms:
+        users = users.filter(
+            Q(username__icontains=term) | Q(first_name__icontains=term) | Q(last_name__icontains=term)
+            | Q(profile__bio__icontains=term) | Q(profile__department__code__iexact=term)
+            | Q(profile__branch__code__iexact=term)
+            | Exists(OfferedSkill.objects.filter(
+                user_id=OuterRef('pk'), is_active=True,
+                skill__in=Skill.objects.filter(name__icontains=term),
+            ))
+        )
+    if department:
+        users = users.filter(profile__department__code__iexact=department)
+    if year:
+        users = users.filter(profile__year=year)
+    if skill_id:
+        users = users.filter(Exists(OfferedSkill.objects.filter(
+            user_id=OuterRef('pk'), skill_id=skill_id, is_active=True
+        )))
+
+    # Lower is better, like bm25()
+    first = terms[0] if terms else ''
+    users = users.annotate(score=Case(
+        When(username__iexact=first, then=Value(-3.0)),
+        When(username__istartswith=first, then=Value(-2.0)),
+        When(Q(first_name__istartswith=first) | Q(last_name__istartswith=first), then=Value(-1.0)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    ))
+    if after:
+        users = users.filter(Q(score__gt=after[0]) | Q(score=after[0], id__gt=after[1]))
+    return list(users.order_by('score', 'id').values_list(
+        'id', 'username', 'first_name', 'last_name', 'profile__year',
+        'profile__department__code', 'profile__branch__code', 'score',
+    )[:limit])
+
+
+def search_users(text, department=None, year=None, skill_id=None, cursor=None, limit=PAGE_SIZE):
+    """
+    One page of matching active users, best first, as
+    {'results': [...], 'next_cursor': ...}. Raises InvalidCursor.
+    """
+    terms = search_terms(text)
+    if not terms and not (department or year or skill_id):
+        return {'results': [], 'next_cursor': None}
+    after = decode_cursor(cursor) if cursor else None
+
+    if terms and fts_available():
+        rows = _fts_rows(terms, department, year, skill_id, after, limit + 1)
+    else:
+        rows = _orm_rows(terms, department, year, skill_id, after, limit + 1)
+
+    results = [dict(zip(RESULT_FIELDS, row)) for row in rows[:limit]]
+    for result in results:
+        result['name'] = f"{result.pop('first_name')} {result.pop('last_name')}".strip()
+        del result['score']
+    return {
+        'results': results,
+        'next_cursor': encode_cursor(rows[limit - 1][-1], rows[limit - 1][0]) if len(rows) > limit else None,
+    }
@@ -1,3 +1,60 @@
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
 
-# Create your tests here.
+from core.models import Department
+from skills.models import SkillCategory, Skill, OfferedSkill
+from .models import UserProfile
+from .search import search_users, fts_available
+
+
+class UserSearchIndexTests(TestCase):
+    def setUp(self):
+        if not fts_available():
+            self.skipTest('user_fts needs SQLite with FTS5')
+        self.department = Department.objects.create(name='Physics', code='PHY')
+        self.skill = Skill.objects.create(name='Astronomy', category=SkillCategory.objects.create(name='Science'))
+        self.user = User.objects.create(username='stargazer', first_name='Vera', last_name='Rubin')
+
+    def found(self, text):
+        return [result['username'] for result in search_users(text)['results']]
+
+    def index_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM user_fts')
+            return cursor.fetchone()[0]
+
+    def test_triggers_follow_user_profile_and_skill_writes(self):
+        self.assertEqual(self.found('stargaz'), ['stargazer'])
+        self.assertEqual(self.found('vera'), ['stargazer'])
+
+        self.user.last_name = 'Leavitt'
+        self.user.save()
+        self.assertEqual(self.found('rubin'), [])
+        self.assertEqual(self.found('leavitt'), ['stargazer'])
+
+        profile = UserProfile.objects.create(user=self.user, university_email='vera@uni.edu',
+                                             department=self.department, bio='Galaxy rotation curves')
+        self.assertEqual(self.found('galaxy'), ['stargazer'])
+        self.assertEqual(self.found('physics'), ['stargazer'])
+        self.department.name = 'Astrophysics'
+        self.department.save()
+        self.assertEqual(self.found('astrophysics'), ['stargazer'])
+
+        offered = OfferedSkill.objects.create(user=self.user, skill=self.skill)
+        self.assertEqual(self.found('astronomy'), ['stargazer'])
+        self.skill.name = 'Cosmology'
+        self.skill.save()
+        self.assertEqual(self.found('astronomy'), [])
+        self.assertEqual(self.found('cosmology'), ['stargazer'])
+        offered.is_active = False
+        offered.save()
+        self.assertEqual(self.found('cosmology'), [])
+
+        profile.delete()
+        self.assertEqual(self.found('galaxy'), [])
+        self.assertEqual(self.found('leavitt'), ['stargazer'])
+
+        self.user.delete()
+        self.assertEqual(self.found('leavitt'), [])
+        self.assertEqual(self.index_rows(), 0)
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'core.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'skills.middleware.DeferredRefreshMiddleware',
 ]
 
 ROOT_URLCONF = 'campus_skill_swap.urls'
@@ -164,6 +166,10 @@ REST_FRAMEWORK = {
 # Email settings (for university email validation)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# SQL instrumentation (core.middleware): the share of requests whose
+# queries are counted, timed and checked for N+1s; 0 turns it off
+SQL_INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('SQL_INSTRUMENTATION_SAMPLE_RATE', '0'))
+
 # Login URLs
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'campus_skill_swap.settings')
 
 application = get_wsgi_application()
+
+# Build the in-memory skill autocomplete index before the first request
+from skills.autocomplete import autocomplete  # noqa: E402
+
+autocomplete.warm()
@@ -1,5 +1,14 @@
 from django.contrib import admin
 from .models import Department, Branch
+from .paginator import EstimatedCountPaginator
+
+
+class LargeTableAdminMixin:
+    """ModelAdmin settings for tables too big to count on every changelist load"""
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) shown next to filtered results
+    show_full_result_count = False
+
 
 @admin.register(Department)
 class DepartmentAdmin(admin.ModelAdmin):
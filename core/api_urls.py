@@ -8,12 +8,17 @@ urlpatterns = [
     path('notifications/', api_views.NotificationListAPI.as_view(), name='notification_list'),
     path('notifications/unread-count/', api_views.UnreadNotificationCountAPI.as_view(), name='unread_count'),
     
+    # Request APIs
+    path('requests/counts/', api_views.RequestCountsAPI.as_view(), name='request_counts'),
+    
     # Search APIs
     path('search/users/', api_views.UserSearchAPI.as_view(), name='user_search'),
     path('search/skills/', api_views.SkillSearchAPI.as_view(), name='skill_search'),
+    path('search/cache-stats/', api_views.SearchCacheStatsAPI.as_view(), name='search_cache_stats'),
     
     # Skill matching API
     path('matching/suggestions/', api_views.SkillMatchingSuggestionsAPI.as_view(), name='matching_suggestions'),
+    path('matching/similar-students/', api_views.SimilarStudentsAPI.as_view(), name='similar_students'),
     
     # Quick actions
     path('user/<int:user_id>/send-request/', api_views.SendSkillRequestAPI.as_view(), name='send_request'),
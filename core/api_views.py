@@ -2,7 +2,6 @@ from django.contrib.auth.models import User
 from django.http import JsonResponse
 from django.views.generic import ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
 
 class NotificationListAPI(LoginRequiredMixin, ListView):
     """API for listing user notifications"""
@@ -23,43 +22,116 @@ class UnreadNotificationCountAPI(LoginRequiredMixin, ListView):
         return JsonResponse({'count': count})
 
 
+class RequestCountsAPI(LoginRequiredMixin, ListView):
+    """API for the requests page header: request counts by direction and status"""
+    
+    def get(self, request, *args, **kwargs):
+        from skill_sessions.dashboard import request_counts, request_stats, session_counts
+        counts = request_counts(request.user)
+        sessions = session_counts(request.user)
+        return JsonResponse({
+            **counts,
+            'stats': request_stats(counts, sessions['scheduled'] + sessions['in_progress']),
+        })
+
+
 class UserSearchAPI(LoginRequiredMixin, ListView):
-    """API for searching users"""
+    """API for searching users, filterable by department code, year and offered skill"""
     
     def get(self, request, *args, **kwargs):
-        query = request.GET.get('q', '')
-        if not query:
-            return JsonResponse({'results': []})
-        
-        from accounts.models import UserProfile
-        users = UserProfile.objects.filter(
-            Q(user__username__icontains=query) |
-            Q(user__first_name__icontains=query)
-        )[:10]
+        from accounts.search import search_users, PAGE_SIZE, MAX_PAGE_SIZE
+        from skills.suggestions import InvalidCursor
+        from .result_cache import normalize, user_search_cache
+        try:
+            limit = min(max(int(request.GET.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            limit = PAGE_SIZE
+        try:
+            skill_id = int(request.GET['skill']) if request.GET.get('skill') else None
+        except ValueError:
+            return JsonResponse({'error': 'Invalid skill'}, status=400)
         
-        data = [{'id': u.user.id, 'username': u.user.username} for u in users]
-        return JsonResponse({'results': data})
+        query = normalize(request.GET.get('q', ''))
+        department = request.GET.get('department', '').upper() or None
+        year = request.GET.get('year') or None
+        cursor = request.GET.get('cursor') or None
+        try:
+            page = user_search_cache.get_or_compute(
+                (query, department, year, skill_id, cursor, limit),
+                lambda: search_users(
+                    query, department=department, year=year, skill_id=skill_id, cursor=cursor, limit=limit
+                ),
+            )
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        return JsonResponse(page)
 
 
 class SkillSearchAPI(LoginRequiredMixin, ListView):
     """API for searching skills"""
     
     def get(self, request, *args, **kwargs):
-        query = request.GET.get('q', '')
+        from .result_cache import normalize, skill_search_cache
+        query = normalize(request.GET.get('q', ''))
         if not query:
             return JsonResponse({'results': []})
         
-        from skills.models import Skill
-        skills = Skill.objects.filter(name__icontains=query)[:10]
-        data = [{'id': s.id, 'name': s.name} for s in skills]
+        from skills.search import search_skills
+        data = skill_search_cache.get_or_compute(
+            (query,), lambda: [{'id': s.id, 'name': s.name} for s in search_skills(query, limit=10)]
+        )
         return JsonResponse({'results': data})
 
 
+class SearchCacheStatsAPI(LoginRequiredMixin, ListView):
+    """API for the search result cache counters of this process"""
+    
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return JsonResponse({'error': 'Staff only'}, status=403)
+        from .result_cache import cache_stats
+        return JsonResponse({'caches': cache_stats()})
+
+
 class SkillMatchingSuggestionsAPI(LoginRequiredMixin, ListView):
     """API for getting skill matching suggestions"""
     
     def get(self, request, *args, **kwargs):
-        return JsonResponse({'results': []})
+        from skills.suggestions import get_suggestions, InvalidCursor, PAGE_SIZE, MAX_PAGE_SIZE
+        try:
+            limit = min(max(int(request.GET.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            limit = PAGE_SIZE
+        
+        try:
+            page = get_suggestions(request.user, request.GET.get('cursor'), limit)
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        return JsonResponse(page)
+
+
+class SimilarStudentsAPI(LoginRequiredMixin, ListView):
+    """API for students whose offered and desired skills resemble the user's"""
+    
+    def get(self, request, *args, **kwargs):
+        from skills.similarity import similar_students, RESULTS, MAX_RESULTS
+        try:
+            limit = min(max(int(request.GET.get('limit', RESULTS)), 1), MAX_RESULTS)
+        except ValueError:
+            limit = RESULTS
+        
+        data = []
+        for user, similarity in similar_students(request.user, limit):
+            profile = user.profile if hasattr(user, 'profile') else None
+            department = profile.department if profile else None
+            data.append({
+                'id': user.id,
+                'username': user.username,
+                'name': user.get_full_name(),
+                'department': department.code if department else None,
+                'similarity': round(similarity, 3),
+            })
+        return JsonResponse({'results': data})
 
 
 class SendSkillRequestAPI(LoginRequiredMixin, ListView):
@@ -0,0 +1,387 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import DateTimeField, Max
+from django.utils import timezone
+
+from accounts.models import UserProfile, Notification
+from core.models import Department, Branch
+from skills.canonical import add_builtin_aliases, resolver, skill_key
+from skills.facets import update_offered_counts
+from skills.models import SkillCategory, Skill, OfferedSkill, DesiredSkill
+from skills.similarity import rebuild_signatures
+from skill_sessions.models import SkillSwapRequest, SkillSwapSession, SessionReview, SessionReminder
+from skill_sessions.ratings import rebuild_ratings
+
+CATEGORIES = {
+    'Programming': ['Python', 'JavaScript', 'Java', 'C++', 'Go', 'Rust', 'SQL', 'Django', 'React', 'Git'],
+    'Data & AI': ['Machine Learning', 'Data Analysis', 'Statistics', 'Deep Learning', 'Excel', 'Tableau'],
+    'Design': ['Figma', 'Photoshop', 'UI Design', 'Illustration', 'Blender', '3D Modeling'],
+    'Languages': ['Spanish', 'French', 'German', 'Japanese', 'Mandarin', 'Hindi', 'Arabic'],
+    'Music': ['Guitar', 'Piano', 'Singing', 'Drums', 'Music Production', 'Violin'],
+    'Mathematics': ['Calculus', 'Linear Algebra', 'Probability', 'Discrete Math', 'Number Theory'],
+    'Business': ['Public Speaking', 'Marketing', 'Accounting', 'Negotiation', 'Entrepreneurship'],
+    'Science': ['Physics', 'Organic Chemistry', 'Biology', 'Electronics', 'Circuit Design'],
+    'Sports & Fitness': ['Yoga', 'Swimming', 'Chess', 'Badminton', 'Running', 'Weight Training'],
+    'Arts & Writing': ['Creative Writing', 'Photography', 'Painting', 'Video Editing', 'Poetry'],
+}
+
+SKILL_VARIANTS = ['{}', 'Advanced {}', 'Intro to {}', 'Applied {}', '{} Projects', '{} for Research']
+
+FIRST_NAMES = ['Aarav', 'Maya', 'Liam', 'Priya', 'Noah', 'Zara', 'Ethan', 'Ananya', 'Lucas', 'Sofia',
+               'Arjun', 'Emma', 'Rohan', 'Isla', 'Kabir', 'Chloe', 'Vihaan', 'Mia', 'Dev', 'Leah']
+LAST_NAMES = ['Shah', 'Patel', 'Smith', 'Kumar', 'Garcia', 'Chen', 'Singh', 'Brown', 'Khan', 'Lee',
+              'Mehta', 'Wilson', 'Rao', 'Martin', 'Iyer', 'Lopez', 'Das', 'Clark', 'Nair', 'Young']
+
+LEVELS = [code for code, _ in OfferedSkill.PROFICIENCY_LEVELS]
+URGENCIES = [code for code, _ in DesiredSkill.URGENCY_LEVELS]
+FORMATS = ['online', 'in_person', 'both']
+YEARS = [code for code, _ in UserProfile.YEAR_CHOICES]
+REQUEST_STATUSES = ['pending', 'accepted', 'declined', 'cancelled', 'expired']
+REQUEST_STATUS_WEIGHTS = [30, 40, 12, 10, 8]
+SESSION_STATUSES = ['scheduled', 'in_progress', 'completed', 'cancelled', 'no_show']
+SESSION_STATUS_WEIGHTS = [30, 5, 50, 10, 5]
+NOTIFICATION_TYPES = [code for code, _ in Notification.NOTIFICATION_TYPES]
+
+
+class Command(BaseCommand):
+    help = 'Generate a reproducible synthetic campus (users, skills, requests, sessions) for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Number of students to create')
+        parser.add_argument('--skills', type=int, default=500, help='Number of skills across all categories')
+        parser.add_argument('--offered-per-user', type=float, default=3.0,
+                            help='Average number of offered skills per student')
+        parser.add_argument('--desired-per-user', type=float, default=3.0,
+                            help='Average number of desired skills per student')
+        parser.add_argument('--requests-per-user', type=float, default=2.0,
+                            help='Average number of swap requests sent per student')
+        parser.add_argument('--notifications-per-user', type=float, default=3.0,
+                            help='Average number of notifications per student')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent for skill popularity (0 means uniform)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+        parser.add_argument('--prefix', default='student', help='Username prefix for generated students')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.inserted_models = []
+        prefix = options['prefix']
+
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f'Users with the prefix "{prefix}_" already exist; use another --prefix.')
+
+        if not Department.objects.exists():
+            call_command('populate_departments', stdout=self.stdout)
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            skills = self.create_skills(options['skills'])
+            users = self.create_users(options['users'], prefix)
+            offered, desired = self.create_user_skills(
+                users, skills, options['offered_per_user'], options['desired_per_user'], options['skew']
+            )
+            requests = self.create_requests(users, offered, options['requests_per_user'])
+            sessions = self.create_sessions(requests)
+            reviews = self.create_reviews(sessions)
+            reminders = self.create_reminders(sessions)
+            notifications = self.create_notifications(users, options['notifications_per_user'])
+            self.reset_sequences()
+            # Rows inserted here skip the signals that maintain the counts
+            # and similarity signatures
+            update_offered_counts()
+            rebuild_ratings()
+            rebuild_signatures()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Created {len(users)} users, {len(skills)} skills, {len(offered)} offered and '
+                f'{desired} desired skills, {len(requests)} requests, {len(sessions)} sessions, '
+                f'{reviews} reviews, {reminders} reminders and {notifications} notifications '
+                f'in {elapsed:.1f}s'
+            )
+        )
+
+    def insert(self, model, fields, rows):
+        """
+        Insert rows of values for `fields` (attnames, without the pk) and
+        return their new ids. Other columns get their model defaults.
+
+        Unlike bulk_create() no model instance is built per row, which is
+        what makes a 100k user campus take seconds rather than minutes.
+        """
+        meta = model._meta
+        prepare = [
+            connection.ops.adapt_datetimefield_value if isinstance(meta.get_field(name), DateTimeField) else None
+            for name in fields
+        ]
+        columns = [meta.pk.column] + [meta.get_field(name).column for name in fields]
+        defaults = []
+        for field in meta.concrete_fields:
+            if field.primary_key or field.attname in fields:
+                continue
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                value = self.now
+            else:
+                value = field.get_default()
+            columns.append(field.column)
+            defaults.append(field.get_db_prep_save(value, connection))
+        defaults = tuple(defaults)
+
+        first_id = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(meta.db_table),
+            ', '.join(connection.ops.quote_name(column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), self.batch_size):
+                batch = [
+                    (first_id + start + offset,)
+                    + tuple(value if convert is None or value is None else convert(value)
+                            for value, convert in zip(row, prepare))
+                    + defaults
+                    for offset, row in enumerate(rows[start:start + self.batch_size])
+                ]
+                cursor.executemany(sql, batch)
+        self.inserted_models.append(model)
+        return range(first_id, first_id + len(rows))
+
+    def reset_sequences(self):
+        # Explicit ids leave sequences behind on PostgreSQL and friends
+        statements = connection.ops.sequence_reset_sql(no_style(), self.inserted_models)
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+
+    def create_skills(self, count):
+        categories = {}
+        for name in CATEGORIES:
+            categories[name], _ = SkillCategory.objects.get_or_create(name=name, defaults={'is_active': True})
+
+        wanted = []
+        for variant_number in range(count):
+            variant = SKILL_VARIANTS[variant_number] if variant_number < len(SKILL_VARIANTS) else f'{{}} {variant_number}'
+            for category_name, base_names in CATEGORIES.items():
+                for base_name in base_names:
+                    if len(wanted) >= count:
+                        break
+                    wanted.append((variant.format(base_name), categories[category_name], variant_number == 0))
+            if len(wanted) >= count:
+                break
+
+        # Reuse the canonical skill for names that already exist in any spelling
+        existing = resolver.resolve_many(name for name, _, _ in wanted)
+        new_skills = {}
+        for name, category, is_popular in wanted:
+            key = skill_key(name)
+            if name not in existing and key not in new_skills:
+                # bulk_create() skips Skill.save(), which fills in the key
+                new_skills[key] = Skill(name=name, category=category, is_popular=is_popular, normalized_name=key)
+        created = Skill.objects.bulk_create(new_skills.values(), batch_size=self.batch_size)
+        ids = {key: skill.id for key, skill in zip(new_skills, created)}
+        add_builtin_aliases(created)
+        resolver.invalidate()
+
+        # Popular skills first so they get the heaviest Zipf weights
+        return list(dict.fromkeys(
+            existing.get(name) or ids[skill_key(name)]
+            for name, _, _ in sorted(wanted, key=lambda skill: not skill[2])
+        ))
+
+    def create_users(self, count, prefix):
+        rng = self.rng
+        password = make_password('password123')
+        branches = list(Branch.objects.order_by('id').values_list('id', 'department_id')) or [(None, None)]
+
+        names = [(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)) for _ in range(count)]
+        users = self.insert(
+            User,
+            ['username', 'first_name', 'last_name', 'email', 'password', 'date_joined'],
+            [(f'{prefix}_{n}', first_name, last_name, f'{prefix}_{n}@example.com', password, self.now)
+             for n, (first_name, last_name) in enumerate(names)],
+        )
+
+        profiles = []
+        for n, (user_id, (first_name, _)) in enumerate(zip(users, names)):
+            branch_id, department_id = rng.choice(branches)
+            prefer_online = rng.random() < 0.8
+            profiles.append((
+                user_id, f'{prefix}_{n}@campus.edu', department_id, branch_id, rng.choice(YEARS),
+                f'{first_name} likes swapping skills.', rng.random() < 0.7,
+                prefer_online, not prefer_online or rng.random() < 0.6,
+            ))
+        self.insert(
+            UserProfile,
+            ['user_id', 'university_email', 'department_id', 'branch_id', 'year', 'bio', 'is_verified',
+             'prefer_online', 'prefer_in_person'],
+            profiles,
+        )
+        return users
+
+    def pick_skills(self, cum_weights, skills, count, exclude=()):
+        picked = set()
+        attempts = 0
+        while len(picked) < count and attempts < count * 10:
+            skill_id = self.rng.choices(skills, cum_weights=cum_weights)[0]
+            if skill_id not in exclude:
+                picked.add(skill_id)
+            attempts += 1
+        return sorted(picked)
+
+    def draw_count(self, average):
+        # Roughly Poisson around the average, at least one
+        return max(1, int(self.rng.expovariate(1 / average) + 0.5))
+
+    def create_user_skills(self, users, skills, offered_per_user, desired_per_user, skew):
+        """Returns (offered as (id, user_id, skill_id) tuples, number of desired skills)"""
+        rng = self.rng
+        cum_weights = list(accumulate(1 / (rank + 1) ** skew for rank in range(len(skills))))
+        offered, desired = [], []
+        for user_id in users:
+            teaches = self.pick_skills(cum_weights, skills, self.draw_count(offered_per_user))
+            for skill_id in teaches:
+                offered.append((
+                    user_id, skill_id, rng.choices(LEVELS, weights=[15, 40, 30, 15])[0],
+                    rng.randint(0, 6), rng.choice(FORMATS), rng.random() < 0.95,
+                ))
+            for skill_id in self.pick_skills(cum_weights, skills, self.draw_count(desired_per_user), teaches):
+                desired.append((
+                    user_id, skill_id, rng.choice(URGENCIES),
+                    rng.choices(LEVELS[:3], weights=[60, 30, 10])[0], rng.choice(LEVELS[1:]),
+                    rng.choice(FORMATS), rng.random() < 0.95,
+                ))
+        offered_ids = self.insert(
+            OfferedSkill,
+            ['user_id', 'skill_id', 'proficiency_level', 'years_of_experience', 'teaching_preference', 'is_active'],
+            offered,
+        )
+        self.insert(
+            DesiredSkill,
+            ['user_id', 'skill_id', 'urgency', 'current_level', 'target_level', 'learning_preference',
+             'is_active'],
+            desired,
+        )
+        return [(offer_id, row[0], row[1]) for offer_id, row in zip(offered_ids, offered)], len(desired)
+
+    def create_requests(self, users, offered, requests_per_user):
+        """Returns (id, requester_id, recipient_id, skill_id, status, duration) tuples"""
+        rng = self.rng
+        total = int(len(users) * requests_per_user)
+        requests, rows = [], []
+        for _ in range(total):
+            offer_id, teacher_id, skill_id = rng.choice(offered)
+            requester_id = rng.choice(users)
+            if requester_id == teacher_id:
+                continue
+            status = rng.choices(REQUEST_STATUSES, weights=REQUEST_STATUS_WEIGHTS)[0]
+            responded = status in ('accepted', 'declined')
+            duration = rng.choice([30, 45, 60, 90])
+            requests.append((requester_id, teacher_id, skill_id, status, duration))
+            rows.append((
+                requester_id, teacher_id, offer_id, status, 'Would love to learn this from you!', duration,
+                rng.choice(['online', 'in_person', 'flexible']),
+                self.now + timedelta(days=rng.randint(-7, 7)),
+                self.now - timedelta(days=rng.randint(0, 30)) if responded else None,
+            ))
+        ids = self.insert(
+            SkillSwapRequest,
+            ['requester_id', 'recipient_id', 'offered_skill_id', 'status', 'message', 'proposed_duration',
+             'proposed_format', 'expires_at', 'responded_at'],
+            rows,
+        )
+        return [(request_id,) + request for request_id, request in zip(ids, requests)]
+
+    def create_sessions(self, requests):
+        """Returns (id, teacher_id, learner_id, status, scheduled_date) tuples"""
+        rng = self.rng
+        sessions, rows = [], []
+        for request_id, requester_id, recipient_id, skill_id, request_status, duration in requests:
+            if request_status != 'accepted':
+                continue
+            status = rng.choices(SESSION_STATUSES, weights=SESSION_STATUS_WEIGHTS)[0]
+            if status == 'scheduled':
+                scheduled = self.now + timedelta(hours=rng.randint(1, 24 * 30))
+            else:
+                scheduled = self.now - timedelta(hours=rng.randint(1, 24 * 90))
+            completed = status == 'completed'
+            sessions.append((recipient_id, requester_id, status, scheduled))
+            rows.append((
+                request_id, recipient_id, requester_id, skill_id, scheduled, duration,
+                rng.choice(['online', 'in_person']), status,
+                scheduled if status in ('in_progress', 'completed') else None,
+                scheduled + timedelta(minutes=duration) if completed else None,
+                duration if completed else None,
+            ))
+        ids = self.insert(
+            SkillSwapSession,
+            ['request_id', 'teacher_id', 'learner_id', 'skill_id', 'scheduled_date', 'duration_minutes',
+             'format', 'status', 'started_at', 'ended_at', 'actual_duration'],
+            rows,
+        )
+        return [(session_id,) + session for session_id, session in zip(ids, sessions)]
+
+    def create_reviews(self, sessions):
+        rng = self.rng
+        reviews = []
+        for session_id, teacher_id, learner_id, status, _ in sessions:
+            if status != 'completed':
+                continue
+            for reviewer_id, reviewee_id in ((learner_id, teacher_id), (teacher_id, learner_id)):
+                if rng.random() < 0.6:
+                    rating = rng.choices([1, 2, 3, 4, 5], weights=[3, 5, 15, 40, 37])[0]
+                    reviews.append((
+                        session_id, reviewer_id, reviewee_id, rating,
+                        max(1, min(5, rating + rng.randint(-1, 1))),
+                        max(1, min(5, rating + rng.randint(-1, 1))),
+                        max(1, min(5, rating + rng.randint(-1, 1))),
+                        'Great session.' if rating >= 3 else 'Could have been better.',
+                        rating >= 3,
+                    ))
+        self.insert(
+            SessionReview,
+            ['session_id', 'reviewer_id', 'reviewee_id', 'overall_rating', 'communication_rating',
+             'knowledge_rating', 'punctuality_rating', 'review_text', 'would_recommend'],
+            reviews,
+        )
+        return len(reviews)
+
+    def create_reminders(self, sessions):
+        reminders = [
+            (session_id, user_id, scheduled - timedelta(hours=1), scheduled < self.now)
+            for session_id, teacher_id, learner_id, status, scheduled in sessions
+            if status in ('scheduled', 'in_progress', 'completed')
+            for user_id in (teacher_id, learner_id)
+        ]
+        self.insert(SessionReminder, ['session_id', 'user_id', 'reminder_time', 'is_sent'], reminders)
+        return len(reminders)
+
+    def create_notifications(self, users, notifications_per_user):
+        rng = self.rng
+        total = int(len(users) * notifications_per_user)
+        notifications = []
+        for _ in range(total):
+            notification_type = rng.choice(NOTIFICATION_TYPES)
+            notifications.append((
+                rng.choice(users), notification_type, notification_type.replace('_', ' ').title(),
+                'You have a new update on Campus Skill-Swap.', rng.random() < 0.5, rng.choice(users),
+            ))
+        self.insert(
+            Notification,
+            ['recipient_id', 'notification_type', 'title', 'message', 'is_read', 'related_user_id'],
+            notifications,
+        )
+        return len(notifications)
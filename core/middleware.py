@@ -0,0 +1,140 @@
+"""
+Per-request SQL instrumentation.
+
+QueryInstrumentationMiddleware wraps every database connection with
+connection.execute_wrapper() for a sampled share of requests
+(SQL_INSTRUMENTATION_SAMPLE_RATE, 0.0 to 1.0; 0 turns it off). For a
+sampled request it records the query count, total SQL time and the
+SQL_INSTRUMENTATION_SLOWEST slowest statements. A query shape (the SQL
+with its parameters left out) run SQL_INSTRUMENTATION_REPEAT_THRESHOLD
+times or more is reported as a likely N+1, with the template line and
+the project code that issued it. The summary is logged as JSON to
+core.middleware and returned in a Server-Timing header.
+
+Unsampled requests cost one random() call. Sampled ones add a timer and
+a dict update per query; the stack is only walked when a shape first
+reaches the threshold.
+"""
+import json
+import logging
+import os
+import random
+import re
+import sys
+import sysconfig
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Parameter lists of any length, so IN (%s, %s) and IN (%s) share a shape
+PLACEHOLDERS = re.compile(r'%s(?:\s*,\s*%s)+')
+# Frames from these files never count as the origin of a query
+LIBRARY_PATHS = tuple({sysconfig.get_paths()[name] for name in ('stdlib', 'purelib', 'platlib')} | {__file__})
+
+
+def query_shape(sql):
+    return PLACEHOLDERS.sub('%s, ...', sql)
+
+
+def query_origin():
+    """
+    {'template': 'name.html:12' or None, 'code': 'app/module.py:34 in func' or None}:
+    the template line being rendered and the innermost project frame
+    """
+    origin = {'template': None, 'code': None}
+    frame = sys._getframe(2)
+    while frame is not None and None in origin.values():
+        node = frame.f_locals.get('self') if origin['template'] is None else None
+        template = getattr(node, 'origin', None)
+        token = getattr(node, 'token', None)
+        if template is not None and token is not None and token.lineno is not None:
+            origin['template'] = f'{template.template_name or template.name}:{token.lineno}'
+        filename = frame.f_code.co_filename
+        if origin['code'] is None and not filename.startswith(LIBRARY_PATHS):
+            origin['code'] = f'{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return origin
+
+
+class QueryRecorder:
+    def __init__(self, slowest, repeat_threshold):
+        self.slowest = slowest
+        self.repeat_threshold = repeat_threshold
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+        self.shapes = Counter()
+        self.repeats = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            self.statements.append((elapsed, sql))
+            if len(self.statements) > 4 * self.slowest:
+                self.statements = sorted(self.statements, reverse=True)[:self.slowest]
+            shape = query_shape(sql)
+            self.shapes[shape] += 1
+            if self.shapes[shape] == self.repeat_threshold:
+                self.repeats[shape] = query_origin()
+
+    def summary(self):
+        return {
+            'queries': self.count,
+            'sql_ms': round(self.duration * 1000, 2),
+            'slowest': [{'ms': round(elapsed * 1000, 2), 'sql': sql}
+                        for elapsed, sql in sorted(self.statements, reverse=True)[:self.slowest]],
+            'repeated': [{'count': self.shapes[shape], **origin, 'sql': shape}
+                         for shape, origin in self.repeats.items()],
+        }
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = getattr(settings, 'SQL_INSTRUMENTATION_SAMPLE_RATE', 0.0)
+        if rate <= 0 or random.random() >= rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(
+            getattr(settings, 'SQL_INSTRUMENTATION_SLOWEST', 5),
+            getattr(settings, 'SQL_INSTRUMENTATION_REPEAT_THRESHOLD', 5),
+        )
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        summary = recorder.summary()
+        match = request.resolver_match
+        summary.update({
+            'view': match.view_name if match else None,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+        })
+        log = logger.warning if summary['repeated'] else logger.info
+        log(json.dumps(summary))
+
+        timings = [f'db;desc="{recorder.count} queries";dur={summary["sql_ms"]}',
+                   f'app;dur={summary["total_ms"]}']
+        if summary['repeated']:
+            timings.append(f'n1;desc="{len(summary["repeated"])} repeated query shapes"')
+        response['Server-Timing'] = ', '.join(
+            timings + ([response['Server-Timing']] if response.has_header('Server-Timing') else [])
+        )
+        return response
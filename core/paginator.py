@@ -0,0 +1,48 @@
+"""
+Changelist pagination for big tables.
+
+Counting every row of a million-row table takes longer than rendering the
+page, and the admin counts on every changelist load. EstimatedCountPaginator
+asks the database for its row estimate instead, as long as the changelist
+is unfiltered and the estimate is at least ADMIN_ESTIMATED_COUNT_THRESHOLD
+rows. Filtered and small changelists are still counted exactly.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+def estimated_row_count(model, using='default'):
+    """The number of rows in model's table according to the database, or None"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s', [table]
+            )
+        else:
+            # SQLite keeps no row count, but the largest id is one index
+            # seek away and only overshoots by the rows deleted since
+            return model._default_manager.using(using).aggregate(last=Max('pk'))['last'] or 0
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 10000):
+                return estimate
+        return super().count
+
@@ -0,0 +1,150 @@
+"""
+Result caches for the search and autocomplete endpoints.
+
+Entries are keyed on the normalized query (plus any filters) and stored
+under the catalog version, a number in the Django cache that is bumped
+whenever a skill, category, user, profile, department or branch changes
+(see core.signals). Bumping makes every older entry unreachable at once,
+so invalidation never has to find keys. Offered skill edits don't bump
+the version; they show up in user search within CACHE_TIMEOUT seconds.
+
+Each process keeps up to SEARCH_CACHE_SIZE entries per endpoint in an
+LRU and checks the version at most every SEARCH_CACHE_CHECK_INTERVAL
+seconds. With SEARCH_CACHE_SHARED = True local misses are looked up in
+the Django cache before the result is computed. Hit and miss counters
+are served by the search cache stats API.
+
+The version and the shared tier only reach other processes through a
+shared CACHES backend. The default LocMemCache is per process, so there
+a bump clears only the process that made the change; the others serve
+their entries until CACHE_TIMEOUT expires them.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'search_results:version'
+SHARED_KEY = 'search_results:{name}:{version}:{digest}'
+CACHE_TIMEOUT = 300
+
+_caches = {}
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached result here, and in every process that
+    shares the Django cache; see the module docstring.
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+    for result_cache in _caches.values():
+        # This process sees the new version straight away
+        result_cache._checked_at = 0.0
+
+
+def cache_stats():
+    return {name: result_cache.stats() for name, result_cache in _caches.items()}
+
+
+class ResultCache:
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        _caches[name] = self
+
+    @property
+    def shared(self):
+        return getattr(settings, 'SEARCH_CACHE_SHARED', False)
+
+    @property
+    def max_entries(self):
+        return getattr(settings, 'SEARCH_CACHE_SIZE', 1000)
+
+    def _current_version(self):
+        now = time.monotonic()
+        if now - self._checked_at >= getattr(settings, 'SEARCH_CACHE_CHECK_INTERVAL', 1.0):
+            self._checked_at = now
+            version = cache.get(VERSION_KEY, 0)
+            if version != self._version:
+                with self._lock:
+                    self._entries.clear()
+                    self._version = version
+        return self._version
+
+    def _store(self, key, value, version):
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[key] = (time.monotonic() + CACHE_TIMEOUT, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """
+        The cached result for `key`, a tuple of the normalized query and
+        filters, or compute() stored under it. Results must be picklable
+        when the shared tier is on.
+        """
+        version = self._current_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        shared_key = None
+        if self.shared:
+            digest = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+            shared_key = SHARED_KEY.format(name=self.name, version=version, digest=digest)
+            value = cache.get(shared_key)
+            if value is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                self._store(key, value, version)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        value = compute()
+        if shared_key is not None:
+            cache.set(shared_key, value, CACHE_TIMEOUT)
+        self._store(key, value, version)
+        return value
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'version': self._version,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self._checked_at = 0.0
+
+
+skill_search_cache = ResultCache('skill_search')
+user_search_cache = ResultCache('user_search')
+autocomplete_cache = ResultCache('skill_autocomplete')
@@ -0,0 +1,31 @@
+"""
+Bump the search result cache version when anything searchable changes.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from accounts.models import UserProfile
+from skills.models import Skill, SkillCategory
+from .models import Department, Branch
+from .result_cache import bump_catalog_version
+
+
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+@receiver(post_save, sender=SkillCategory)
+@receiver(post_delete, sender=SkillCategory)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+def catalog_changed(sender, instance, update_fields=None, **kwargs):
+    if sender is User and update_fields and set(update_fields) <= {'last_login'}:
+        # Every login saves the user
+        return
+    transaction.on_commit(bump_catalog_version)
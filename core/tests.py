@@ -1,3 +1,398 @@
-from django.test import TestCase
+"""
+Query and render-time budgets for every page and API.
 
-# Create your tests here.
+setUpTestData loads a mid-sized campus with generate_campus_data and
+rebuild_matches, and each URL in core, skills, skill_sessions, accounts
+and the API is requested as the student with the most sessions. A view
+fails when it runs more queries than its budget, answers with another
+status than expected or takes longer than its render budget, which is
+multiplied by QUERY_BUDGET_TIME_SCALE from the environment on slow
+machines. QUERY_BUDGET_CHECK_TIMES=0 only reports render times, flagging
+slow views in the table. Views listed in BROKEN are skipped with the
+reason they can't render.
+
+Every URL is requested twice, the first time inside a rolled-back
+transaction. The budgets therefore measure warm in-process caches, and
+views that change data see the same rows both times.
+
+The results are printed as a table after the run. When QUERY_BUDGET_REPORT
+names a file they are also appended to it as CSV, one row per view per
+run, to follow the trend from release to release.
+
+QueryInstrumentationTests cover the sampled SQL instrumentation in
+core.middleware.
+"""
+import csv
+import gc
+import json
+import os
+import sys
+import time
+from datetime import date
+from importlib import import_module
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from accounts.models import Notification
+from skill_sessions.models import SkillSwapRequest, SkillSwapSession, SessionReview
+from skills.canonical import resolver
+from skills.models import OfferedSkill, DesiredSkill, SkillMatch
+from .middleware import QueryInstrumentationMiddleware, query_shape
+from .paginator import EstimatedCountPaginator
+
+TIME_SCALE = float(os.environ.get('QUERY_BUDGET_TIME_SCALE', '1'))
+CHECK_TIMES = os.environ.get('QUERY_BUDGET_CHECK_TIMES', '1') != '0'
+
+# URL name: (queries, render milliseconds)
+BUDGETS = {
+    'core:home': (3, 50),
+    'core:dashboard': (3, 50),
+    'core:requests': (9, 150),
+    'core:mark_notification_read': (0, 25),
+    'core:mark_all_notifications_read': (0, 25),
+
+    'skills:skill_list': (5, 150),
+    'skills:skill_detail': (5, 150),
+    'skills:add_skill': (4, 150),
+    'skills:offered_list': (4, 150),
+    'skills:offered_toggle': (4, 50),
+    'skills:desired_add': (4, 150),
+    'skills:desired_edit': (5, 150),
+    'skills:desired_toggle': (4, 25),
+    'skills:match_dismiss': (4, 25),
+    'skills:skill_autocomplete': (2, 25),
+
+    'skill_sessions:request_cancel': (4, 50),
+    'skill_sessions:session_list': (6, 150),
+    'skill_sessions:session_management': (6, 150),
+    'skill_sessions:approve_session': (9, 50),
+    'skill_sessions:reject_session': (5, 50),
+    'skill_sessions:session_cancel': (4, 50),
+    'skill_sessions:session_start': (4, 50),
+    'skill_sessions:session_end': (9, 25),
+
+    'accounts:register': (4, 150),
+    'accounts:login': (3, 50),
+    'accounts:logout': (4, 25),
+    'accounts:forgot_password': (3, 50),
+    'accounts:verify_otp': (1, 25),
+    'accounts:reset_password': (1, 25),
+    'accounts:get_branches': (2, 25),
+
+    'api:notification_list': (3, 25),
+    'api:unread_count': (3, 25),
+    'api:request_counts': (4, 50),
+    'api:user_search': (2, 25),
+    'api:skill_search': (2, 25),
+    'api:search_cache_stats': (2, 25),
+    'api:matching_suggestions': (2, 25),
+    'api:similar_students': (4, 50),
+    'api:send_request': (2, 25),
+}
+
+# Views that can't render yet: URL name -> why. Each gets a budget once it works.
+BROKEN = {
+    'core:user_profile': 'missing template core/user_profile.html',
+    'core:search': 'missing template core/search.html',
+    'core:notifications': 'missing template core/notifications.html',
+    'skills:category_list': 'missing template skills/category_list.html',
+    'skills:offered_add': 'missing template skills/offered_form.html',
+    'skills:offered_edit': 'missing template skills/offered_form.html',
+    'skills:offered_delete': 'missing template skills/offered_confirm_delete.html',
+    'skills:desired_list': 'missing template skills/desired_list.html',
+    'skills:desired_delete': 'missing template skills/desired_confirm_delete.html',
+    'skills:match_list': 'missing template skills/match_list.html',
+    'skill_sessions:request_list': 'missing template skill_sessions/request_list.html',
+    'skill_sessions:sent_requests': 'missing template skill_sessions/sent_requests.html',
+    'skill_sessions:received_requests': 'missing template skill_sessions/received_requests.html',
+    'skill_sessions:send_request': 'missing template skill_sessions/send_request.html',
+    'skill_sessions:request_detail': 'missing template skill_sessions/request_detail.html',
+    'skill_sessions:upcoming_sessions': 'missing template skill_sessions/upcoming_sessions.html',
+    'skill_sessions:session_history': 'missing template skill_sessions/session_history.html',
+    'skill_sessions:session_detail': 'missing template skill_sessions/session_detail.html',
+    'skill_sessions:session_edit': 'missing template skill_sessions/session_form.html',
+    'skill_sessions:review_create': 'missing template skill_sessions/review_form.html',
+    'skill_sessions:review_edit': 'missing template skill_sessions/review_form.html',
+    'skill_sessions:review_list': 'missing template skill_sessions/review_list.html',
+    'skill_sessions:calendar': 'missing template skill_sessions/calendar.html',
+    'skill_sessions:schedule_session': 'missing template skill_sessions/schedule_session.html',
+    'accounts:profile': 'missing template accounts/profile.html',
+    'accounts:profile_view': 'missing template accounts/profile.html',
+    'accounts:profile_edit': 'missing template accounts/profile_edit.html',
+    'accounts:profile_complete': 'missing template accounts/profile_complete.html',
+    'accounts:password_change': 'missing template accounts/password_change.html',
+    'accounts:password_change_done': 'missing template accounts/password_change_done.html',
+    'accounts:verify_email': 'missing template accounts/verify_email.html',
+    'accounts:email_verification_sent': 'missing template accounts/email_verification_sent.html',
+    'skills:category_detail': 'the URL passes category_id but the DetailView looks for pk',
+    'skill_sessions:request_respond': 'RequestResponseForm is a plain Form but the UpdateView passes instance=',
+}
+
+# URL name: {kwarg: fixture attribute holding the object whose pk fills it}
+URL_KWARGS = {
+    'core:user_profile': {'user_id': 'other_user'},
+    'core:mark_notification_read': {'notification_id': 'notification'},
+    'skills:skill_detail': {'pk': 'skill'},
+    'skills:category_detail': {'category_id': 'category'},
+    'skills:offered_edit': {'pk': 'offered'},
+    'skills:offered_delete': {'pk': 'offered'},
+    'skills:offered_toggle': {'pk': 'offered'},
+    'skills:desired_edit': {'pk': 'desired'},
+    'skills:desired_delete': {'pk': 'desired'},
+    'skills:desired_toggle': {'pk': 'desired'},
+    'skills:match_dismiss': {'pk': 'match'},
+    'skill_sessions:send_request': {'user_id': 'other_user'},
+    'skill_sessions:request_detail': {'pk': 'sent_request'},
+    'skill_sessions:request_respond': {'pk': 'received_request'},
+    'skill_sessions:request_cancel': {'pk': 'sent_request'},
+    'skill_sessions:approve_session': {'session_id': 'received_request'},
+    'skill_sessions:reject_session': {'session_id': 'received_request'},
+    'skill_sessions:session_detail': {'pk': 'scheduled_session'},
+    'skill_sessions:session_edit': {'pk': 'scheduled_session'},
+    'skill_sessions:session_cancel': {'pk': 'scheduled_session'},
+    'skill_sessions:session_start': {'pk': 'scheduled_session'},
+    'skill_sessions:session_end': {'pk': 'ongoing_session'},
+    'skill_sessions:review_create': {'session_id': 'completed_session'},
+    'skill_sessions:review_edit': {'pk': 'review'},
+    'skill_sessions:schedule_session': {'request_id': 'received_request'},
+    'accounts:profile_view': {'user_id': 'other_user'},
+    'api:send_request': {'user_id': 'other_user'},
+}
+
+# URL name: query string
+URL_QUERIES = {
+    'skills:skill_autocomplete': 'term=py',
+    'api:user_search': 'q=python',
+    'api:skill_search': 'q=python',
+    'accounts:get_branches': 'department_id=1',
+}
+
+# Views that only act on POST
+POST_URLS = {'skill_sessions:approve_session', 'skill_sessions:reject_session', 'accounts:logout', 'api:send_request'}
+
+# Responses other than a success or redirect that a view is expected to give
+EXPECTED_STATUS = {'api:search_cache_stats': 403}
+
+# Session, user, count and page, plus the filter sidebars of the busiest changelists
+ADMIN_CHANGELIST_QUERIES = 7
+
+URL_MODULES = ['core.urls', 'skills.urls', 'skill_sessions.urls', 'accounts.urls', 'core.api_urls']
+
+
+class QueryBudgetTests(TestCase):
+    results = []
+
+    @classmethod
+    def setUpTestData(cls):
+        out = StringIO()
+        call_command('generate_campus_data', users=150, skills=120, requests_per_user=4, seed=7, stdout=out)
+        call_command('rebuild_matches', stdout=out)
+        cls.user = User.objects.annotate(
+            sessions=Count('teaching_sessions', distinct=True) + Count('learning_sessions', distinct=True)
+        ).filter(is_superuser=False).order_by('-sessions', 'id').first()
+        user = cls.user
+        sessions = SkillSwapSession.objects.for_participant(user)
+        cls.other_user = User.objects.exclude(id=user.id).filter(is_superuser=False).order_by('id').first()
+        cls.notification = Notification.objects.filter(recipient=user).first()
+        cls.offered = OfferedSkill.objects.filter(user=user).first()
+        cls.desired = DesiredSkill.objects.filter(user=user).first()
+        cls.skill = cls.offered.skill
+        cls.category = cls.skill.category
+        cls.match = SkillMatch.objects.filter(Q(teacher=user) | Q(learner=user)).first()
+        cls.sent_request = SkillSwapRequest.objects.filter(requester=user).first()
+        cls.received_request = SkillSwapRequest.objects.filter(recipient=user, status='pending').first()
+        cls.scheduled_session = sessions.filter(status='scheduled').first()
+        cls.ongoing_session = sessions.filter(status='in_progress').first() or cls.scheduled_session
+        cls.completed_session = sessions.filter(status='completed').exclude(reviews__reviewer=user).first()
+        cls.review = SessionReview.objects.filter(reviewer=user).first()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if not cls.results:
+            return
+        rows = sorted(cls.results)
+        width = max(len(row[0]) for row in rows)
+        lines = [f'\n{"view":<{width}}  status  queries  budget      ms  budget']
+        for name, status, queries, query_budget, elapsed, time_budget in rows:
+            slow = ' slow' if elapsed > time_budget else ''
+            lines.append(f'{name:<{width}}  {status:>6}  {queries:>7}  {query_budget:>6}  {elapsed:>6.1f}  {time_budget:>6.0f}{slow}')
+        slow_views = sum(1 for row in rows if row[4] > row[5])
+        if slow_views:
+            lines.append(f'{slow_views} view(s) over their render budget')
+        sys.stderr.write('\n'.join(lines) + '\n')
+        report = os.environ.get('QUERY_BUDGET_REPORT')
+        if report:
+            new_file = not os.path.exists(report)
+            with open(report, 'a', newline='') as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(['date', 'view', 'status', 'queries', 'query_budget', 'ms', 'ms_budget'])
+                today = date.today().isoformat()
+                for name, status, queries, query_budget, elapsed, time_budget in rows:
+                    writer.writerow([today, name, status, queries, query_budget, round(elapsed, 1), time_budget])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def request(self, name):
+        kwargs = {kwarg: getattr(self, attribute).pk for kwarg, attribute in URL_KWARGS.get(name, {}).items()}
+        url = reverse(name, kwargs=kwargs)
+        if name in URL_QUERIES:
+            url = f'{url}?{URL_QUERIES[name]}'
+        send = self.client.post if name in POST_URLS else self.client.get
+        return send(url)
+
+    def check_budget(self, name):
+        query_budget, time_budget = BUDGETS[name]
+        time_budget *= TIME_SCALE
+        with transaction.atomic():
+            self.request(name)
+            transaction.set_rollback(True)
+        self.client.force_login(self.user)
+
+        # Like timeit, keep collector pauses out of the measured request
+        gc.collect()
+        gc.disable()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = self.request(name)
+                elapsed = (time.perf_counter() - start) * 1000
+        finally:
+            gc.enable()
+        self.results.append((name, response.status_code, len(queries), query_budget, elapsed, time_budget))
+
+        if name in EXPECTED_STATUS:
+            self.assertEqual(response.status_code, EXPECTED_STATUS[name], name)
+        else:
+            self.assertLess(response.status_code, 400, name)
+        self.assertLessEqual(
+            len(queries), query_budget,
+            f'{name} ran {len(queries)} queries, budget {query_budget}:\n'
+            + '\n'.join(query['sql'] for query in queries.captured_queries),
+        )
+        if CHECK_TIMES:
+            self.assertLessEqual(elapsed, time_budget, f'{name} took {elapsed:.0f}ms, budget {time_budget:.0f}ms')
+
+    def test_every_url_has_a_budget(self):
+        names = set()
+        for module in URL_MODULES:
+            urls = import_module(module)
+            names.update(f'{urls.app_name}:{pattern.name}' for pattern in urls.urlpatterns
+                         if isinstance(pattern, URLPattern))
+        self.assertEqual(names - set(BUDGETS) - set(BROKEN), set())
+        self.assertEqual(set(BROKEN) & set(BUDGETS), set())
+
+    def test_admin_changelists(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.edu', 'pw'))
+        for model in admin.site._registry:
+            with self.subTest(model=model._meta.label), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist'))
+                self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(
+                len(queries), ADMIN_CHANGELIST_QUERIES,
+                '\n'.join(query['sql'] for query in queries.captured_queries),
+            )
+
+    def test_estimated_count_paginator(self):
+        notifications = Notification.objects.order_by('-created_at')
+        Notification.objects.filter(pk=notifications.order_by('pk').first().pk).delete()
+        estimate = notifications.aggregate(last=Max('pk'))['last']
+        self.assertGreater(estimate, notifications.count())
+        with override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1):
+            self.assertEqual(EstimatedCountPaginator(notifications, 100).count, estimate)
+            # A filtered list is always counted
+            unread = notifications.filter(is_read=False)
+            self.assertEqual(EstimatedCountPaginator(unread, 100).count, unread.count())
+        self.assertEqual(EstimatedCountPaginator(notifications, 100).count, notifications.count())
+
+
+class GenerateCampusDataTests(TestCase):
+    models = [User, OfferedSkill, DesiredSkill, SkillSwapRequest, SkillSwapSession, SessionReview, Notification]
+
+    def generate(self, now):
+        """Rows of every generated model after a run at `now`, rolled back afterwards"""
+        with patch('django.utils.timezone.now', return_value=now), transaction.atomic():
+            call_command('generate_campus_data', users=30, skills=20, seed=11, stdout=StringIO())
+            # The password hash has a random salt
+            rows = {
+                model.__name__: list(model.objects.order_by('pk').values_list(*[
+                    field.attname for field in model._meta.concrete_fields if field.name != 'password'
+                ]))
+                for model in self.models
+            }
+            transaction.set_rollback(True)
+        resolver.invalidate()
+        return rows
+
+    def test_same_seed_generates_the_same_campus(self):
+        # Fix the clock so the dates the command derives from it compare equal
+        now = timezone.now()
+        first, second = self.generate(now), self.generate(now)
+        self.assertEqual({name: len(rows) for name, rows in first.items()},
+                         {name: len(rows) for name, rows in second.items()})
+        self.assertGreater(len(first['SessionReview']), 0)
+        for name in first:
+            self.assertEqual(first[name], second[name], name)
+
+
+class QueryInstrumentationTests(TestCase):
+    def run_middleware(self, view, rate):
+        request = RequestFactory().get('/instrumented/')
+        with override_settings(SQL_INSTRUMENTATION_SAMPLE_RATE=rate):
+            return QueryInstrumentationMiddleware(view)(request)
+
+    def test_query_shape_collapses_parameter_lists(self):
+        self.assertEqual(query_shape('SELECT 1 FROM t WHERE id IN (%s, %s, %s) AND x = %s'),
+                         'SELECT 1 FROM t WHERE id IN (%s, ...) AND x = %s')
+        self.assertEqual(query_shape('WHERE id IN (%s,%s)'), query_shape('WHERE id IN (%s, %s, %s, %s)'))
+
+    def test_sampled_request_reports_repeated_shapes(self):
+        def view(request):
+            self.assertEqual(len(connection.execute_wrappers), 1)
+            for count in range(2, 8):
+                list(Notification.objects.filter(pk__in=range(count)))
+            return HttpResponse()
+
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            response = self.run_middleware(view, 1)
+        self.assertRegex(response['Server-Timing'], r'^db;desc="6 queries";dur=[\d.]+, app;dur=[\d.]+, n1;')
+        summary = json.loads(logs.records[0].getMessage())
+        self.assertEqual(summary['queries'], 6)
+        [repeated] = summary['repeated']
+        self.assertEqual(repeated['count'], 6)
+        self.assertIn('IN (%s, ...)', repeated['sql'])
+        self.assertTrue(repeated['code'].startswith(os.path.join('core', 'tests.py') + ':'), repeated['code'])
+
+    def test_unsampled_request_is_not_wrapped(self):
+        def view(request):
+            self.assertEqual(connection.execute_wrappers, [])
+            return HttpResponse()
+
+        with self.assertNoLogs('core.middleware'):
+            response = self.run_middleware(view, 0)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+def budget_test(name):
+    def test(self):
+        if name in BROKEN:
+            self.skipTest(BROKEN[name])
+        self.check_budget(name)
+    return test
+
+
+for _name in [*BUDGETS, *BROKEN]:
+    setattr(QueryBudgetTests, f'test_{_name.replace(":", "_")}', budget_test(_name))
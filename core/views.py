@@ -1,8 +1,9 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.db import models
-from skill_sessions.models import SkillSwapRequest, SkillSwapSession
+from django.core.paginator import Paginator
+from skill_sessions.dashboard import request_counts, request_stats, session_dashboard
+from skill_sessions.models import SkillSwapRequest
 
 def home(request):
     return render(request, "core/home.html")
@@ -17,46 +18,46 @@ class DashboardView:
     def as_view(cls):
         return lambda r: render(r, "core/dashboard.html")
 
+REQUESTS_PER_PAGE = 10
+
+
+def paginate_requests(request, queryset, param, count):
+    """One page of `queryset`, with the count taken from the request aggregate"""
+    paginator = Paginator(queryset, REQUESTS_PER_PAGE)
+    paginator.count = count
+    return paginator.get_page(request.GET.get(param))
+
+
 class RequestsView:
     @classmethod
     def as_view(cls):
         @login_required
         def requests_view(request):
+            counts = request_counts(request.user)
+            
             # Get received requests for the current user
-            received_requests = SkillSwapRequest.objects.filter(
+            received_requests = paginate_requests(request, SkillSwapRequest.objects.filter(
                 recipient=request.user
             ).select_related(
                 'requester', 'offered_skill__skill'
-            ).order_by('-created_at')
+            ).order_by('-created_at'), 'received_page', counts['received']['total'])
             
             # Get sent requests by the current user
-            sent_requests = SkillSwapRequest.objects.filter(
+            sent_requests = paginate_requests(request, SkillSwapRequest.objects.filter(
                 requester=request.user
             ).select_related(
                 'recipient', 'offered_skill__skill'
-            ).order_by('-created_at')
-            
-            # Get active sessions for the current user
-            active_sessions = SkillSwapSession.objects.filter(
-                models.Q(teacher=request.user) | models.Q(learner=request.user),
-                status__in=['scheduled', 'in_progress']
-            ).select_related(
-                'teacher', 'learner', 'skill'
-            ).order_by('scheduled_date')
+            ).order_by('-created_at'), 'sent_page', counts['sent']['total'])
             
-            # Calculate stats
-            stats = {
-                'total_requests': received_requests.count() + sent_requests.count(),
-                'pending_requests': received_requests.filter(status='pending').count() + sent_requests.filter(status='pending').count(),
-                'accepted_requests': received_requests.filter(status='accepted').count() + sent_requests.filter(status='accepted').count(),
-                'active_sessions': active_sessions.count(),
-            }
+            # Active sessions and session counts
+            dashboard = session_dashboard(request.user, statuses=('scheduled', 'in_progress'))
             
             context = {
                 'received_requests': received_requests,
                 'sent_requests': sent_requests,
-                'active_sessions': active_sessions,
-                'stats': stats,
+                'active_sessions': dashboard['active_sessions'],
+                'stats': request_stats(counts, dashboard['active_count']),
+                'active_tab': 'sent' if 'sent_page' in request.GET else 'received',
             }
             
             return render(request, "core/requests.html", context)
@@ -1,8 +1,10 @@
 from django.contrib import admin
+
+from core.admin import LargeTableAdminMixin
 from .models import SkillSwapRequest, SkillSwapSession, SessionReview, SessionReminder
 
 @admin.register(SkillSwapRequest)
-class SkillSwapRequestAdmin(admin.ModelAdmin):
+class SkillSwapRequestAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('requester', 'recipient', 'offered_skill', 'status', 
                    'proposed_duration', 'proposed_format', 'created_at', 'expires_at')
     list_filter = ('status', 'proposed_format', 'created_at', 'expires_at')
@@ -28,12 +30,17 @@ class SkillSwapRequestAdmin(admin.ModelAdmin):
     
     actions = ['mark_as_expired']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'requester', 'recipient', 'offered_skill__user', 'offered_skill__skill'
+        )
+    
     def mark_as_expired(self, request, queryset):
         queryset.filter(status='pending').update(status='expired')
     mark_as_expired.short_description = "Mark selected pending requests as expired"
 
 @admin.register(SkillSwapSession)
-class SkillSwapSessionAdmin(admin.ModelAdmin):
+class SkillSwapSessionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('teacher', 'learner', 'skill', 'scheduled_date', 'duration_minutes', 
                    'format', 'status', 'actual_duration')
     list_filter = ('status', 'format', 'scheduled_date')
@@ -60,9 +67,12 @@ class SkillSwapSessionAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('teacher', 'learner', 'skill__category')
 
 @admin.register(SessionReview)
-class SessionReviewAdmin(admin.ModelAdmin):
+class SessionReviewAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('reviewer', 'reviewee', 'session', 'overall_rating', 
                    'would_recommend', 'is_public', 'is_flagged', 'created_at')
     list_filter = ('overall_rating', 'would_recommend', 'is_public', 'is_flagged', 
@@ -91,6 +101,11 @@ class SessionReviewAdmin(admin.ModelAdmin):
     
     actions = ['flag_for_moderation', 'unflag_reviews', 'make_public', 'make_private']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'reviewer', 'reviewee', 'session__teacher', 'session__learner', 'session__skill'
+        )
+    
     def flag_for_moderation(self, request, queryset):
         queryset.update(is_flagged=True)
     flag_for_moderation.short_description = "Flag selected reviews for moderation"
@@ -108,11 +123,13 @@ class SessionReviewAdmin(admin.ModelAdmin):
     make_private.short_description = "Make selected reviews private"
 
 @admin.register(SessionReminder)
-class SessionReminderAdmin(admin.ModelAdmin):
+class SessionReminderAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('session', 'user', 'reminder_time', 'is_sent', 'created_at')
     list_filter = ('is_sent', 'reminder_time', 'created_at')
     search_fields = ('session__teacher__username', 'session__learner__username', 'user__username')
     readonly_fields = ('created_at',)
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('session', 'user')
+        return super().get_queryset(request).select_related(
+            'session__teacher', 'session__learner', 'session__skill', 'user'
+        )
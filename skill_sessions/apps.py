@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SkillSessionsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "skill_sessions"
+
+    def ready(self):
+        from . import signals  # noqa: F401
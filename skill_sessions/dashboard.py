@@ -0,0 +1,83 @@
+"""
+Context shared by the session list, session management and requests pages.
+
+A user's sessions are fetched once, with the skill and both participants'
+profiles joined and review authors prefetched, then split by status in
+Python. The per-status counts come from one conditional aggregate, so the
+pages cost the same handful of queries however many sessions a user has.
+Request counts work the same way: one aggregate over the requests a user
+sent or received, split by direction and status.
+"""
+from django.db.models import Count, Q
+
+from .models import SkillSwapRequest, SkillSwapSession
+
+LISTED_STATUSES = ('scheduled', 'in_progress', 'completed')
+
+
+def session_counts(user):
+    """{status: number of the user's sessions}, plus 'total'"""
+    return SkillSwapSession.objects.for_participant(user).aggregate(
+        total=Count('id'),
+        **{status: Count('id', filter=Q(status=status))
+           for status, _ in SkillSwapSession.STATUS_CHOICES},
+    )
+
+
+def request_counts(user):
+    """{'received': {status: n, 'total': n}, 'sent': {...}} for the user's requests"""
+    filters = {'received': Q(recipient=user), 'sent': Q(requester=user)}
+    row = SkillSwapRequest.objects.for_participant(user).aggregate(**{
+        f'{direction}__{status}': Count('id', filter=condition & Q(status=status))
+        for direction, condition in filters.items()
+        for status, _ in SkillSwapRequest.STATUS_CHOICES
+    }, **{f'{direction}__total': Count('id', filter=condition) for direction, condition in filters.items()})
+    counts = {direction: {} for direction in filters}
+    for name, value in row.items():
+        direction, status = name.split('__')
+        counts[direction][status] = value
+    return counts
+
+
+def request_stats(counts, active_sessions):
+    """The requests page header"""
+    return {
+        'total_requests': counts['received']['total'] + counts['sent']['total'],
+        'pending_requests': counts['received']['pending'] + counts['sent']['pending'],
+        'accepted_requests': counts['received']['accepted'] + counts['sent']['accepted'],
+        'active_sessions': active_sessions,
+    }
+
+
+def session_dashboard(user, statuses=LISTED_STATUSES):
+    """Sessions in `statuses` split by status, the user's pending requests and the counts"""
+    sessions = list(
+        SkillSwapSession.objects.for_participant(user).filter(status__in=statuses)
+        .select_related('skill', 'request', 'teacher__profile', 'learner__profile')
+        .with_review_status(user)
+        .order_by('scheduled_date')
+    )
+    by_status = {status: [] for status in LISTED_STATUSES}
+    for session in sessions:
+        by_status[session.status].append(session)
+    by_status['completed'].sort(key=lambda session: session.ended_at or session.scheduled_date, reverse=True)
+
+    pending_requests = list(
+        SkillSwapRequest.objects.filter(recipient=user, status='pending')
+        .select_related('requester__profile', 'offered_skill__skill')
+        .order_by('-created_at')
+    )
+    counts = session_counts(user)
+    return {
+        'upcoming_sessions': by_status['scheduled'],
+        'ongoing_sessions': by_status['in_progress'],
+        'completed_sessions': by_status['completed'],
+        'active_sessions': by_status['scheduled'] + by_status['in_progress'],
+        'pending_requests': pending_requests,
+        'session_counts': counts,
+        'upcoming_count': counts['scheduled'],
+        'ongoing_count': counts['in_progress'],
+        'completed_count': counts['completed'],
+        'active_count': counts['scheduled'] + counts['in_progress'],
+        'pending_count': len(pending_requests),
+    }
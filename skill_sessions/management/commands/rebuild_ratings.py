@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skill_sessions.ratings import rebuild_ratings, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Recompute session counts and rating averages on profiles and offered skills from sessions and reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Number of rows recomputed per transaction')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = rebuild_ratings(chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recomputed ratings for {stats['profiles']} profiles and {stats['offered']} offered skills "
+                f"in {elapsed:.2f}s"
+            )
+        )
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skill_sessions', '0003_alter_sessionreminder_table_and_more'),
+        ('skills', '0010_desiredskill_desired_active_skill_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='skillswaprequest',
+            index=models.Index(fields=['recipient', 'status', 'created_at'], name='request_recipient_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='skillswaprequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['expires_at'], name='request_pending_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='skillswapsession',
+            index=models.Index(fields=['teacher', 'status', 'scheduled_date'], name='session_teacher_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='skillswapsession',
+            index=models.Index(fields=['learner', 'status', 'scheduled_date'], name='session_learner_status_idx'),
+        ),
+    ]
@@ -4,6 +4,19 @@ from skills.models import OfferedSkill, DesiredSkill
 from django.utils import timezone
 from datetime import timedelta
 
+class SkillSwapRequestQuerySet(models.QuerySet):
+    def for_participant(self, user):
+        """Requests the user sent or received"""
+        return self.filter(models.Q(requester=user) | models.Q(recipient=user))
+    
+    def pending(self):
+        return self.filter(status='pending')
+    
+    def expired(self):
+        """Pending requests past their expiry date, found through request_pending_expiry_idx"""
+        return self.filter(status='pending', expires_at__lt=timezone.now())
+
+
 class SkillSwapRequest(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -36,9 +49,16 @@ class SkillSwapRequest(models.Model):
     responded_at = models.DateTimeField(null=True, blank=True)
     response_message = models.TextField(blank=True)
     
+    objects = SkillSwapRequestQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         db_table = 'swaprequest'
+        indexes = [
+            models.Index(fields=['recipient', 'status', 'created_at'], name='request_recipient_status_idx'),
+            models.Index(fields=['expires_at'], condition=models.Q(status='pending'),
+                         name='request_pending_expiry_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.expires_at:
@@ -54,6 +74,42 @@ class SkillSwapRequest(models.Model):
     def can_be_responded_to(self):
         return self.status == 'pending' and not self.is_expired()
 
+HISTORY_STATUSES = ('completed', 'cancelled', 'no_show')
+
+
+class SkillSwapSessionQuerySet(models.QuerySet):
+    """
+    for_participant() ORs the teacher and learner columns rather than
+    building a UNION, which Django can't filter or annotate any further.
+    SQLite runs the OR as a union of two index searches (MULTI-INDEX OR),
+    one on session_teacher_status_idx and one on session_learner_status_idx,
+    and carries status and scheduled_date conditions into both.
+    """
+    def for_participant(self, user):
+        """Sessions the user teaches or attends"""
+        return self.filter(models.Q(teacher=user) | models.Q(learner=user))
+    
+    def upcoming(self):
+        """Scheduled sessions that haven't started, soonest first"""
+        return self.filter(status='scheduled', scheduled_date__gte=timezone.now()).order_by('scheduled_date')
+    
+    def history(self):
+        """Finished sessions, most recent first"""
+        return self.filter(status__in=HISTORY_STATUSES).order_by('-scheduled_date')
+    
+    def with_review_status(self, user):
+        """Annotate has_reviews, reviewed_by_me and avg_rating (overall, None if unreviewed)"""
+        reviews = SessionReview.objects.filter(session=models.OuterRef('pk'))
+        average = reviews.order_by().values('session').annotate(
+            avg=models.Avg('overall_rating')
+        ).values('avg')
+        return self.annotate(
+            has_reviews=models.Exists(reviews),
+            reviewed_by_me=models.Exists(reviews.filter(reviewer=user)),
+            avg_rating=models.Subquery(average, output_field=models.FloatField()),
+        )
+
+
 class SkillSwapSession(models.Model):
     STATUS_CHOICES = [
         ('scheduled', 'Scheduled'),
@@ -93,9 +149,15 @@ class SkillSwapSession(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = SkillSwapSessionQuerySet.as_manager()
+    
     class Meta:
         ordering = ['scheduled_date']
         db_table = 'swapsession'
+        indexes = [
+            models.Index(fields=['teacher', 'status', 'scheduled_date'], name='session_teacher_status_idx'),
+            models.Index(fields=['learner', 'status', 'scheduled_date'], name='session_learner_status_idx'),
+        ]
     
     def __str__(self):
         return f"Session: {self.teacher.username} teaching {self.skill.name} to {self.learner.username}"
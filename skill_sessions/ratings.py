@@ -0,0 +1,132 @@
+"""
+Running rating and session totals on profiles and offered skills.
+
+UserProfile keeps a rating sum and count per role next to its average,
+and OfferedSkill does the same for reviews of the teacher's sessions in
+that skill. A new, edited or deleted review and a completed session each
+become one UPDATE per row that adds to the totals with F() expressions
+and recomputes the average from them in the same statement, so
+concurrent reviews cannot overwrite each other and nothing rescans the
+review table. rebuild_ratings() recomputes every total set-wise, in
+chunks of rows, for the initial backfill and for repairs.
+
+The UPDATEs bypass OfferedSkill's signals, so both queue a teacher index
+refresh for the skills whose averages they changed.
+"""
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import GreaterThan
+
+from accounts.models import UserProfile
+from skills.models import OfferedSkill
+from skills.signals import schedule_index_refresh
+from .models import SkillSwapSession, SessionReview
+
+CHUNK_SIZE = 1000
+
+
+def _average(rating_sum, rating_count):
+    return Case(
+        When(GreaterThan(rating_count, 0), then=Cast(rating_sum, FloatField()) / rating_count),
+        default=Value(0.0),
+    )
+
+
+def _add_ratings(prefix, delta, count_delta):
+    """UPDATE kwargs adding delta to the `prefix`rating_sum column and count_delta to its count"""
+    rating_sum = F(f'{prefix}rating_sum') + delta
+    rating_count = F(f'{prefix}rating_count') + count_delta
+    return {f'{prefix}rating_sum': rating_sum, f'{prefix}rating_count': rating_count}, _average(rating_sum, rating_count)
+
+
+def record_rating(review, delta, count_delta):
+    """Add `delta` to the reviewee's rating totals and `count_delta` to the number of ratings"""
+    session = review.session
+    if review.reviewee_id == session.teacher_id:
+        totals, average = _add_ratings('teacher_', delta, count_delta)
+        UserProfile.objects.filter(user_id=review.reviewee_id).update(**totals, average_rating_as_teacher=average)
+        totals, average = _add_ratings('', delta, count_delta)
+        OfferedSkill.objects.filter(user_id=session.teacher_id, skill_id=session.skill_id).update(
+            **totals, average_rating=average
+        )
+        schedule_index_refresh(session.skill_id)
+    else:
+        totals, average = _add_ratings('learner_', delta, count_delta)
+        UserProfile.objects.filter(user_id=review.reviewee_id).update(**totals, average_rating_as_learner=average)
+
+
+def record_completed_session(session):
+    """Count a newly completed session for both participants and the teacher's offered skill"""
+    UserProfile.objects.filter(user_id=session.teacher_id).update(total_sessions_taught=F('total_sessions_taught') + 1)
+    UserProfile.objects.filter(user_id=session.learner_id).update(
+        total_sessions_learned=F('total_sessions_learned') + 1
+    )
+    OfferedSkill.objects.filter(user_id=session.teacher_id, skill_id=session.skill_id).update(
+        total_sessions=F('total_sessions') + 1
+    )
+
+
+def _count(queryset, group):
+    return Coalesce(Subquery(
+        queryset.order_by().values(group).annotate(count=Count('id')).values('count'), output_field=IntegerField()
+    ), 0)
+
+
+def _sum(queryset, group):
+    return Coalesce(Subquery(
+        queryset.order_by().values(group).annotate(total=Sum('overall_rating')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def _profile_totals():
+    completed = SkillSwapSession.objects.filter(status='completed')
+    as_teacher = SessionReview.objects.filter(reviewee_id=OuterRef('user_id'), session__teacher_id=OuterRef('user_id'))
+    as_learner = SessionReview.objects.filter(reviewee_id=OuterRef('user_id'), session__learner_id=OuterRef('user_id'))
+    return {
+        'total_sessions_taught': _count(completed.filter(teacher_id=OuterRef('user_id')), 'teacher_id'),
+        'total_sessions_learned': _count(completed.filter(learner_id=OuterRef('user_id')), 'learner_id'),
+        'teacher_rating_sum': _sum(as_teacher, 'reviewee_id'),
+        'teacher_rating_count': _count(as_teacher, 'reviewee_id'),
+        'learner_rating_sum': _sum(as_learner, 'reviewee_id'),
+        'learner_rating_count': _count(as_learner, 'reviewee_id'),
+    }
+
+
+def _offered_totals():
+    sessions = SkillSwapSession.objects.filter(teacher_id=OuterRef('user_id'), skill_id=OuterRef('skill_id'))
+    reviews = SessionReview.objects.filter(
+        reviewee_id=OuterRef('user_id'), session__teacher_id=OuterRef('user_id'), session__skill_id=OuterRef('skill_id')
+    )
+    return {
+        'total_sessions': _count(sessions.filter(status='completed'), 'teacher_id'),
+        'rating_sum': _sum(reviews, 'reviewee_id'),
+        'rating_count': _count(reviews, 'reviewee_id'),
+    }
+
+
+def _rebuild(queryset, totals, averages, chunk_size):
+    """Recompute `totals`, then `averages` from them, for each chunk of primary keys"""
+    updated = 0
+    last = queryset.order_by('-pk').values_list('pk', flat=True).first() or 0
+    for start in range(0, last + 1, chunk_size):
+        with transaction.atomic():
+            chunk = queryset.filter(pk__gte=start, pk__lt=start + chunk_size)
+            updated += chunk.update(**totals)
+            chunk.update(**averages)
+    return updated
+
+
+def rebuild_ratings(chunk_size=CHUNK_SIZE):
+    """Recompute every profile's and offered skill's totals and averages; returns the rows updated"""
+    profiles = _rebuild(UserProfile.objects.all(), _profile_totals(), {
+        'average_rating_as_teacher': _average(F('teacher_rating_sum'), F('teacher_rating_count')),
+        'average_rating_as_learner': _average(F('learner_rating_sum'), F('learner_rating_count')),
+    }, chunk_size)
+    offered = _rebuild(OfferedSkill.objects.all(), _offered_totals(), {
+        'average_rating': _average(F('rating_sum'), F('rating_count')),
+    }, chunk_size)
+    for skill_id in OfferedSkill.objects.order_by().values_list('skill_id', flat=True).distinct():
+        schedule_index_refresh(skill_id)
+    return {'profiles': profiles, 'offered': offered}
@@ -0,0 +1,49 @@
+"""
+Keep profile and offered skill rating totals in step with reviews.
+
+Each saved or deleted review adds its rating, or the change to it, to the
+reviewee's totals inside the transaction that writes the review (see
+skill_sessions.ratings). A review loaded with its rating deferred reads
+the stored rating before it is changed or deleted.
+"""
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import SessionReview
+from .ratings import record_rating
+
+
+@receiver(post_init, sender=SessionReview)
+def remember_rating(sender, instance, **kwargs):
+    # Read from __dict__ so deferred loads don't trigger a query
+    instance._loaded_rating = instance.__dict__.get('overall_rating')
+
+
+@receiver(pre_save, sender=SessionReview)
+def load_deferred_rating(sender, instance, update_fields=None, **kwargs):
+    if (instance._loaded_rating is None and not instance._state.adding
+            and (update_fields is None or 'overall_rating' in update_fields)):
+        instance._loaded_rating = SessionReview.objects.filter(pk=instance.pk).values_list(
+            'overall_rating', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=SessionReview)
+def review_saved(sender, instance, created, **kwargs):
+    if created:
+        record_rating(instance, instance.overall_rating, 1)
+    elif instance._loaded_rating is not None and instance.overall_rating != instance._loaded_rating:
+        record_rating(instance, instance.overall_rating - instance._loaded_rating, 0)
+    instance._loaded_rating = instance.overall_rating
+
+
+@receiver(pre_delete, sender=SessionReview)
+def load_rating_before_delete(sender, instance, **kwargs):
+    if instance._loaded_rating is None:
+        instance.refresh_from_db(fields=['overall_rating'])
+        instance._loaded_rating = instance.overall_rating
+
+
+@receiver(post_delete, sender=SessionReview)
+def review_deleted(sender, instance, **kwargs):
+    record_rating(instance, -instance._loaded_rating, -1)
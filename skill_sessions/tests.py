@@ -1,3 +1,259 @@
+from datetime import timedelta
+
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from skills.models import Skill, SkillCategory, OfferedSkill
+from skills.teacher_index import teacher_index
+from .dashboard import session_dashboard
+from .ratings import rebuild_ratings
+from .models import SkillSwapRequest, SkillSwapSession, SessionReview
+
+
+def query_plan(queryset):
+    """SQLite's EXPLAIN QUERY PLAN details for a queryset"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def make_user(username):
+    user = User.objects.create_user(username, password='pw')
+    UserProfile.objects.create(user=user, university_email=f'{username}@example.edu')
+    return user
+
+
+class SessionDashboardQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+        category = SkillCategory.objects.create(name='Programming')
+        cls.skill = Skill.objects.create(name='Python', category=category)
+        cls.partners = [make_user(f'partner{i}') for i in range(6)]
+        cls.offered = {
+            partner: OfferedSkill.objects.create(user=partner, skill=cls.skill, proficiency_level='expert')
+            for partner in cls.partners
+        }
+
+    def add_sessions(self, count):
+        now = timezone.now()
+        statuses = ['scheduled', 'in_progress', 'completed', 'cancelled']
+        for i in range(count):
+            partner = self.partners[i % len(self.partners)]
+            offered = self.offered[partner]
+            request = SkillSwapRequest.objects.create(requester=self.user, recipient=partner, offered_skill=offered)
+            session = SkillSwapSession.objects.create(
+                request=request, teacher=partner, learner=self.user, skill=self.skill,
+                scheduled_date=now + timedelta(days=i - count // 2), format='online',
+                status=statuses[i % len(statuses)],
+                ended_at=now if statuses[i % len(statuses)] == 'completed' else None,
+            )
+            if session.status == 'completed':
+                SessionReview.objects.create(
+                    session=session, reviewer=self.user, reviewee=partner, overall_rating=5,
+                    communication_rating=5, knowledge_rating=5, punctuality_rating=5, review_text='Great',
+                )
+            SkillSwapRequest.objects.create(requester=partner, recipient=self.user, offered_skill=offered)
+
+    def test_builder_query_budget(self):
+        self.add_sessions(12)
+        # sessions with their review status, pending requests, status counts
+        with self.assertNumQueries(3):
+            context = session_dashboard(self.user)
+            for session in context['upcoming_sessions'] + context['completed_sessions']:
+                session.learner.profile.profile_picture
+                session.teacher.profile.profile_picture
+                session.skill.name
+            for request in context['pending_requests']:
+                request.requester.profile.profile_picture
+                request.offered_skill.skill.name
+        self.assertEqual(context['upcoming_count'], 3)
+        self.assertEqual(context['completed_count'], 3)
+        self.assertEqual(context['session_counts']['cancelled'], 3)
+        self.assertEqual(context['pending_count'], 12)
+        self.assertTrue(all(session.reviewed_by_me for session in context['completed_sessions']))
+        self.assertTrue(all(session.avg_rating == 5 for session in context['completed_sessions']))
+        self.assertFalse(any(session.has_reviews for session in context['upcoming_sessions']))
+
+    def assertPageBudget(self, url_name, queries):
+        """The page costs `queries` queries however many sessions the user has"""
+        self.client.force_login(self.user)
+        for count in (4, 16):
+            self.add_sessions(count)
+            with self.assertNumQueries(queries):
+                self.assertEqual(self.client.get(reverse(url_name)).status_code, 200)
+
+    # Each page budget includes the auth session, the user and their profile
+
+    def test_session_list_budget(self):
+        self.assertPageBudget('skill_sessions:session_list', 6)
+
+    def test_session_management_budget(self):
+        self.assertPageBudget('skill_sessions:session_management', 6)
+
+    def test_requests_page_budget(self):
+        self.assertPageBudget('core:requests', 9)
+
+    def test_request_counts_api(self):
+        self.client.force_login(self.user)
+        self.add_sessions(8)
+        # auth session, user, request counts, session counts
+        with self.assertNumQueries(4):
+            data = self.client.get(reverse('api:request_counts')).json()
+        self.assertEqual(data['received']['pending'], 8)
+        self.assertEqual(data['sent']['pending'], 8)
+        self.assertEqual(data['stats']['total_requests'], 16)
+        self.assertEqual(data['stats']['active_sessions'], 4)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class ParticipantIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('owner')
+
+    def assertUsesIndexes(self, queryset, *indexes):
+        plan = query_plan(queryset)
+        for index in indexes:
+            self.assertTrue(any(f'USING INDEX {index} ' in step for step in plan), plan)
+        return ' '.join(plan)
+
+    def test_upcoming_searches_both_participant_indexes(self):
+        plan = self.assertUsesIndexes(
+            SkillSwapSession.objects.for_participant(self.user).upcoming(),
+            'session_teacher_status_idx', 'session_learner_status_idx',
+        )
+        self.assertIn('status=? AND scheduled_date>?', plan)
+
+    def test_history_searches_both_participant_indexes(self):
+        self.assertUsesIndexes(
+            SkillSwapSession.objects.for_participant(self.user).history(),
+            'session_teacher_status_idx', 'session_learner_status_idx',
+        )
+
+    def test_received_requests_use_recipient_index(self):
+        self.assertUsesIndexes(
+            SkillSwapRequest.objects.filter(recipient=self.user).pending().order_by('-created_at'),
+            'request_recipient_status_idx',
+        )
+
+    def test_expired_requests_use_partial_index(self):
+        self.assertUsesIndexes(SkillSwapRequest.objects.expired(), 'request_pending_expiry_idx')
+
+
+class RatingTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = make_user('teacher')
+        cls.learner = make_user('learner')
+        category = SkillCategory.objects.create(name='Programming')
+        cls.skill = Skill.objects.create(name='Python', category=category)
+        cls.offered = OfferedSkill.objects.create(user=cls.teacher, skill=cls.skill, proficiency_level='expert')
+
+    def add_session(self, status='in_progress'):
+        request = SkillSwapRequest.objects.create(
+            requester=self.learner, recipient=self.teacher, offered_skill=self.offered
+        )
+        return SkillSwapSession.objects.create(
+            request=request, teacher=self.teacher, learner=self.learner, skill=self.skill,
+            scheduled_date=timezone.now(), format='online', status=status,
+        )
+
+    def review(self, session, reviewer, reviewee, rating):
+        return SessionReview.objects.create(
+            session=session, reviewer=reviewer, reviewee=reviewee, overall_rating=rating,
+            communication_rating=rating, knowledge_rating=rating, punctuality_rating=rating, review_text='Fine',
+        )
+
+    def totals(self):
+        teacher = UserProfile.objects.get(user=self.teacher)
+        learner = UserProfile.objects.get(user=self.learner)
+        offered = OfferedSkill.objects.get(pk=self.offered.pk)
+        return {
+            'taught': teacher.total_sessions_taught,
+            'learned': learner.total_sessions_learned,
+            'teacher_average': teacher.average_rating_as_teacher,
+            'learner_average': learner.average_rating_as_learner,
+            'offered_sessions': offered.total_sessions,
+            'offered_average': offered.average_rating,
+            'offered_ratings': offered.rating_count,
+        }
+
+    def test_reviews_update_running_averages(self):
+        first, second = self.add_session('completed'), self.add_session('completed')
+        # Two UPDATEs per review of the teacher, one per review of the learner
+        with self.assertNumQueries(3):
+            review = self.review(first, self.learner, self.teacher, 4)
+        self.review(second, self.learner, self.teacher, 5)
+        self.review(first, self.teacher, self.learner, 3)
+        totals = self.totals()
+        self.assertEqual(totals['teacher_average'], 4.5)
+        self.assertEqual(totals['offered_average'], 4.5)
+        self.assertEqual(totals['offered_ratings'], 2)
+        self.assertEqual(totals['learner_average'], 3)
+
+        review.overall_rating = 2
+        review.save()
+        self.assertEqual(self.totals()['teacher_average'], 3.5)
+        review.delete()
+        self.assertEqual(self.totals()['teacher_average'], 5)
+        self.assertEqual(self.totals()['offered_ratings'], 1)
+
+    def test_reviews_loaded_without_rating(self):
+        first, second = self.add_session('completed'), self.add_session('completed')
+        kept = self.review(first, self.learner, self.teacher, 4)
+        self.review(second, self.learner, self.teacher, 2)
+
+        review = SessionReview.objects.defer('overall_rating').get(pk=kept.pk)
+        review.overall_rating = 5
+        review.save()
+        self.assertEqual(self.totals()['teacher_average'], 3.5)
+
+        SessionReview.objects.defer('overall_rating').get(pk=kept.pk).delete()
+        totals = self.totals()
+        self.assertEqual((totals['teacher_average'], totals['offered_ratings']), (2, 1))
+
+    def test_reviews_refresh_teacher_index_ratings(self):
+        teacher_index.clear()
+        self.assertEqual(list(teacher_index.entry(self.skill.id).ratings), [0.0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.review(self.add_session('completed'), self.learner, self.teacher, 4)
+        self.assertEqual(list(teacher_index.entry(self.skill.id).ratings), [4.0])
+
+        OfferedSkill.objects.filter(pk=self.offered.pk).update(average_rating=0)
+        teacher_index.clear()
+        self.assertEqual(list(teacher_index.entry(self.skill.id).ratings), [0.0])
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_ratings()
+        self.assertEqual(list(teacher_index.entry(self.skill.id).ratings), [4.0])
+
+    def test_end_session_counts_once(self):
+        session = self.add_session()
+        self.client.force_login(self.teacher)
+        for _ in range(2):
+            self.client.post(reverse('skill_sessions:session_end', kwargs={'pk': session.pk}))
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'completed')
+        totals = self.totals()
+        self.assertEqual((totals['taught'], totals['learned'], totals['offered_sessions']), (1, 1, 1))
+
+    def test_rebuild_agrees_with_running_totals(self):
+        session = self.add_session()
+        self.client.force_login(self.learner)
+        self.client.post(reverse('skill_sessions:session_end', kwargs={'pk': session.pk}))
+        self.review(session, self.learner, self.teacher, 4)
+        self.review(self.add_session('completed'), self.teacher, self.learner, 2)
+        running = self.totals()
+        UserProfile.objects.update(total_sessions_taught=9, average_rating_as_teacher=1, teacher_rating_count=9)
+        OfferedSkill.objects.update(average_rating=0, rating_sum=0, rating_count=0)
 
-# Create your tests here.
+        self.assertEqual(rebuild_ratings(chunk_size=1), {'profiles': 2, 'offered': 1})
+        # add_session('completed') bypasses end_session, so only the rebuild counts it
+        self.assertEqual(self.totals(), {**running, 'taught': 2, 'learned': 2, 'offered_sessions': 2})
@@ -4,8 +4,8 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 from django.urls import reverse_lazy
+from django.db import transaction
 from django.utils import timezone
-from django.db import models
 
 from .models import SkillSwapRequest, SkillSwapSession, SessionReview
 from .forms import SkillSwapRequestForm, RequestResponseForm, SessionScheduleForm, SessionReviewForm
@@ -64,11 +64,7 @@ class RequestDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'request'
     
     def get_queryset(self):
-        return SkillSwapRequest.objects.filter(
-            requester=self.request.user
-        ) | SkillSwapRequest.objects.filter(
-            recipient=self.request.user
-        )
+        return SkillSwapRequest.objects.for_participant(self.request.user)
 
 
 class RequestResponseView(LoginRequiredMixin, UpdateView):
@@ -116,34 +112,12 @@ class SessionListView(LoginRequiredMixin, ListView):
     context_object_name = 'sessions'
     
     def get_queryset(self):
-        return SkillSwapSession.objects.filter(
-            teacher=self.request.user
-        ) | SkillSwapSession.objects.filter(
-            learner=self.request.user
-        )
+        return SkillSwapSession.objects.for_participant(self.request.user)
     
     def get_context_data(self, **kwargs):
+        from .dashboard import session_dashboard
         context = super().get_context_data(**kwargs)
-        user = self.request.user
-        
-        # Get all sessions for the user
-        all_sessions = SkillSwapSession.objects.filter(
-            teacher=user
-        ) | SkillSwapSession.objects.filter(
-            learner=user
-        )
-        
-        # Categorize sessions
-        context['upcoming_sessions'] = all_sessions.filter(status='scheduled').order_by('scheduled_date')
-        context['ongoing_sessions'] = all_sessions.filter(status='in_progress').order_by('scheduled_date')
-        context['completed_sessions'] = all_sessions.filter(status='completed').order_by('-ended_at')
-        
-        # Get pending requests that need approval (requests sent to this user)
-        context['pending_requests'] = SkillSwapRequest.objects.filter(
-            recipient=user,
-            status='pending'
-        ).select_related('requester', 'offered_skill__skill').order_by('-created_at')
-        
+        context.update(session_dashboard(self.request.user))
         return context
 
 
@@ -153,15 +127,8 @@ class UpcomingSessionListView(LoginRequiredMixin, ListView):
     context_object_name = 'sessions'
     
     def get_queryset(self):
-        return SkillSwapSession.objects.filter(
-            scheduled_date__gte=timezone.now()
-        ).filter(
-            teacher=self.request.user
-        ) | SkillSwapSession.objects.filter(
-            scheduled_date__gte=timezone.now()
-        ).filter(
-            learner=self.request.user
-        )
+        sessions = SkillSwapSession.objects.for_participant(self.request.user).upcoming()
+        return sessions.select_related('skill', 'teacher', 'learner').with_review_status(self.request.user)
 
 
 class SessionHistoryView(LoginRequiredMixin, ListView):
@@ -170,15 +137,8 @@ class SessionHistoryView(LoginRequiredMixin, ListView):
     context_object_name = 'sessions'
     
     def get_queryset(self):
-        return SkillSwapSession.objects.filter(
-            scheduled_date__lt=timezone.now()
-        ).filter(
-            teacher=self.request.user
-        ) | SkillSwapSession.objects.filter(
-            scheduled_date__lt=timezone.now()
-        ).filter(
-            learner=self.request.user
-        )
+        sessions = SkillSwapSession.objects.for_participant(self.request.user).history()
+        return sessions.select_related('skill', 'teacher', 'learner').with_review_status(self.request.user)
 
 
 class SessionDetailView(LoginRequiredMixin, DetailView):
@@ -187,11 +147,7 @@ class SessionDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'session'
     
     def get_queryset(self):
-        return SkillSwapSession.objects.filter(
-            teacher=self.request.user
-        ) | SkillSwapSession.objects.filter(
-            learner=self.request.user
-        )
+        return SkillSwapSession.objects.for_participant(self.request.user)
 
 
 class SessionUpdateView(LoginRequiredMixin, UpdateView):
@@ -201,16 +157,12 @@ class SessionUpdateView(LoginRequiredMixin, UpdateView):
     success_url = reverse_lazy('skill_sessions:session_list')
     
     def get_queryset(self):
-        return SkillSwapSession.objects.filter(
-            teacher=self.request.user
-        ) | SkillSwapSession.objects.filter(
-            learner=self.request.user
-        )
+        return SkillSwapSession.objects.for_participant(self.request.user)
 
 
 @login_required
 def cancel_session(request, pk):
-    session = get_object_or_404(SkillSwapSession, pk=pk)
+    session = get_object_or_404(SkillSwapSession.objects.for_participant(request.user), pk=pk)
     session.status = 'cancelled'
     session.save()
     return redirect('skill_sessions:session_list')
@@ -218,7 +170,7 @@ def cancel_session(request, pk):
 
 @login_required
 def start_session(request, pk):
-    session = get_object_or_404(SkillSwapSession, pk=pk)
+    session = get_object_or_404(SkillSwapSession.objects.for_participant(request.user), pk=pk)
     session.status = 'in_progress'
     session.started_at = timezone.now()
     session.save()
@@ -227,10 +179,17 @@ def start_session(request, pk):
 
 @login_required
 def end_session(request, pk):
-    session = get_object_or_404(SkillSwapSession, pk=pk)
-    session.status = 'completed'
-    session.ended_at = timezone.now()
-    session.save()
+    from .ratings import record_completed_session
+
+    session = get_object_or_404(SkillSwapSession.objects.for_participant(request.user), pk=pk)
+    now = timezone.now()
+    with transaction.atomic():
+        # Only the request that actually completes the session counts it
+        completed = SkillSwapSession.objects.filter(pk=session.pk).exclude(status='completed').update(
+            status='completed', ended_at=now, updated_at=now
+        )
+        if completed:
+            record_completed_session(session)
     return redirect('skill_sessions:session_detail', pk=pk)
 
 
@@ -280,11 +239,8 @@ class CalendarView(LoginRequiredMixin, ListView):
     context_object_name = 'sessions'
     
     def get_queryset(self):
-        return SkillSwapSession.objects.filter(
-            teacher=self.request.user
-        ) | SkillSwapSession.objects.filter(
-            learner=self.request.user
-        )
+        sessions = SkillSwapSession.objects.for_participant(self.request.user)
+        return sessions.select_related('skill', 'teacher', 'learner').with_review_status(self.request.user)
 
 
 class ScheduleSessionView(LoginRequiredMixin, CreateView):
@@ -309,33 +265,18 @@ class SessionManagementView(LoginRequiredMixin, ListView):
     
     def get_queryset(self):
         # Get all sessions where user is involved (either as teacher or learner)
-        return SkillSwapSession.objects.filter(
-            models.Q(teacher=self.request.user) | models.Q(learner=self.request.user)
-        ).select_related('skill', 'teacher', 'learner', 'request')
+        return SkillSwapSession.objects.for_participant(self.request.user).select_related(
+            'skill', 'teacher', 'learner', 'request'
+        )
     
     def get_context_data(self, **kwargs):
+        from .dashboard import session_dashboard
         context = super().get_context_data(**kwargs)
-        user = self.request.user
-        
-        # Get all sessions where user is involved
-        all_sessions = SkillSwapSession.objects.filter(
-            models.Q(teacher=user) | models.Q(learner=user)
-        ).select_related('skill', 'teacher', 'learner', 'request')
-        
-        # Categorize sessions
-        completed_sessions = all_sessions.filter(status='completed')
-        ongoing_sessions = all_sessions.filter(status='in_progress')
-        upcoming_sessions = all_sessions.filter(status='scheduled', scheduled_date__gt=timezone.now())
-        
-        # Get pending approval sessions (requests that haven't been responded to)
-        pending_requests = SkillSwapRequest.objects.filter(
-            recipient=user,
-            status='pending'
-        ).select_related('requester', 'offered_skill')
+        context.update(session_dashboard(self.request.user))
         
         # Convert pending requests to session-like objects for display
         pending_sessions = []
-        for request in pending_requests:
+        for request in context['pending_requests']:
             # Create a mock session object for display purposes
             mock_session = type('MockSession', (), {
                 'id': request.id,
@@ -347,17 +288,7 @@ class SessionManagementView(LoginRequiredMixin, ListView):
                 'status': 'pending_approval'
             })()
             pending_sessions.append(mock_session)
-        
-        context.update({
-            'completed_sessions': completed_sessions,
-            'ongoing_sessions': ongoing_sessions,
-            'upcoming_sessions': upcoming_sessions,
-            'pending_sessions': pending_sessions,
-            'completed_count': completed_sessions.count(),
-            'ongoing_count': ongoing_sessions.count(),
-            'upcoming_count': upcoming_sessions.count(),
-            'pending_count': len(pending_sessions),
-        })
+        context['pending_sessions'] = pending_sessions
         
         return context
 
@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import SkillCategory, Skill, OfferedSkill, DesiredSkill, SkillMatch
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from core.admin import LargeTableAdminMixin
+from .models import SkillCategory, Skill, SkillAlias, OfferedSkill, DesiredSkill, SkillMatch, SwapCycle, SwapCycleLeg, AffinityMatrix
+from .search import filter_skills, fts_available
 
 @admin.register(SkillCategory)
 class SkillCategoryAdmin(admin.ModelAdmin):
@@ -8,27 +13,63 @@ class SkillCategoryAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description')
     readonly_fields = ('created_at',)
     
+    def get_queryset(self, request):
+        skills = Skill.objects.filter(category_id=OuterRef('pk')).order_by().values('category_id').annotate(
+            count=Count('id')
+        ).values('count')
+        return super().get_queryset(request).annotate(
+            skills_count=Coalesce(Subquery(skills, output_field=IntegerField()), Value(0))
+        )
+    
     def skills_count(self, obj):
-        return obj.skills.count()
+        return obj.skills_count
     skills_count.short_description = 'Number of Skills'
+    skills_count.admin_order_field = 'skills_count'
 
 @admin.register(Skill)
-class SkillAdmin(admin.ModelAdmin):
+class SkillAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'category', 'is_popular', 'offered_count', 'desired_count', 'created_at')
     list_filter = ('category', 'is_popular', 'created_at')
     search_fields = ('name', 'description', 'category__name')
     readonly_fields = ('created_at',)
     
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not fts_available():
+            return super().get_search_results(request, queryset, search_term)
+        return filter_skills(queryset, search_term), False
+    
+    def get_queryset(self, request):
+        # A correlated count runs for the displayed page only; offered_count
+        # is already a maintained column
+        learners = DesiredSkill.objects.filter(skill_id=OuterRef('pk'), is_active=True).order_by().values(
+            'skill_id'
+        ).annotate(count=Count('id')).values('count')
+        return super().get_queryset(request).select_related('category').annotate(
+            desired_count=Coalesce(Subquery(learners, output_field=IntegerField()), Value(0))
+        )
+    
     def offered_count(self, obj):
-        return obj.offered_by_users.filter(is_active=True).count()
+        return obj.offered_count
     offered_count.short_description = 'Offered By'
+    offered_count.admin_order_field = 'offered_count'
     
     def desired_count(self, obj):
-        return obj.desired_by_users.filter(is_active=True).count()
+        return obj.desired_count
     desired_count.short_description = 'Desired By'
+    desired_count.admin_order_field = 'desired_count'
+
+@admin.register(SkillAlias)
+class SkillAliasAdmin(admin.ModelAdmin):
+    list_display = ('name', 'skill', 'normalized_name', 'created_at')
+    search_fields = ('name', 'skill__name')
+    raw_id_fields = ('skill',)
+    readonly_fields = ('normalized_name', 'created_at')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('skill__category')
 
 @admin.register(OfferedSkill)
-class OfferedSkillAdmin(admin.ModelAdmin):
+class OfferedSkillAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'skill', 'proficiency_level', 'teaching_preference', 
                    'years_of_experience', 'average_rating', 'total_sessions', 'is_active')
     list_filter = ('proficiency_level', 'teaching_preference', 'is_active', 'created_at')
@@ -51,9 +92,12 @@ class OfferedSkillAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'skill__category')
 
 @admin.register(DesiredSkill)
-class DesiredSkillAdmin(admin.ModelAdmin):
+class DesiredSkillAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'skill', 'urgency', 'current_level', 'target_level', 
                    'learning_preference', 'is_active')
     list_filter = ('urgency', 'current_level', 'target_level', 'learning_preference', 
@@ -73,9 +117,12 @@ class DesiredSkillAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'skill__category')
 
 @admin.register(SkillMatch)
-class SkillMatchAdmin(admin.ModelAdmin):
+class SkillMatchAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('teacher', 'learner', 'offered_skill', 'desired_skill', 
                    'compatibility_score', 'is_mutual', 'is_dismissed', 'created_at')
     list_filter = ('is_mutual', 'is_dismissed', 'created_at')
@@ -85,5 +132,33 @@ class SkillMatchAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related(
-            'teacher', 'learner', 'offered_skill__skill', 'desired_skill__skill'
+            'teacher', 'learner', 'offered_skill__user', 'offered_skill__skill',
+            'desired_skill__user', 'desired_skill__skill'
         )
+
+class SwapCycleLegInline(admin.TabularInline):
+    model = SwapCycleLeg
+    extra = 0
+    fields = ('position', 'match')
+    readonly_fields = ('position', 'match')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'match__teacher', 'match__learner', 'match__offered_skill__skill'
+        )
+
+@admin.register(SwapCycle)
+class SwapCycleAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'size', 'score', 'created_at')
+    list_filter = ('size', 'created_at')
+    readonly_fields = ('size', 'score', 'created_at')
+    inlines = (SwapCycleLegInline,)
+
+@admin.register(AffinityMatrix)
+class AffinityMatrixAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'interactions', 'built_at')
+    fields = ('kind', 'interactions', 'built_at')
+    readonly_fields = ('kind', 'interactions', 'built_at')
+    
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,181 @@
+"""
+Department and branch affinity.
+
+Affinity says how readily students of two departments (or two branches)
+swap skills, from 0 to 1. It is learned from accepted swap requests and
+completed sessions by build_affinity() and stored packed in
+AffinityMatrix. Every department and branch also gets PRIOR_INTERACTIONS
+swaps with itself, so without any history the matrices are the identity
+and matching keeps its old "same branch, then same department" bonus.
+
+The matrices are loaded once per process; build_affinity() reloads them
+in its own process and other processes pick them up on restart.
+"""
+import math
+import threading
+from array import array
+from collections import Counter, namedtuple
+
+from django.db.models import Count
+
+from core.models import Department, Branch
+from skill_sessions.models import SkillSwapRequest, SkillSwapSession
+from .models import AffinityMatrix
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+PRIOR_INTERACTIONS = 10
+
+Affinity = namedtuple('Affinity', ['departments', 'branches'])
+
+_lock = threading.Lock()
+_affinity = None
+
+
+class Matrix:
+    """
+    Square affinity matrix over department or branch ids. Position 0
+    stands for "none" and has no affinity with anything. An id the matrix
+    was built without, such as a department created since, is added on
+    first use with affinity 1 to itself only, like one without history.
+    """
+
+    def __init__(self, ids, values):
+        self._lock = threading.Lock()
+        self.ids = list(ids)
+        self.index = {id_: position for position, id_ in enumerate(self.ids, start=1)}
+        size = len(self.ids)
+        self.rows = [[0.0] * (size + 1)] + [
+            [0.0] + list(values[row * size:(row + 1) * size]) for row in range(size)
+        ]
+        self.array = np.asarray(self.rows, dtype=np.float64) if np is not None else None
+
+    @classmethod
+    def identity(cls, ids):
+        ids = list(ids)
+        return cls(ids, [1.0 if row == column else 0.0 for row in ids for column in ids])
+
+    def _add(self, id_):
+        """Give an unknown id the next position; returns it"""
+        with self._lock:
+            if id_ not in self.index:
+                position = len(self.rows)
+                rows = [row + [0.0] for row in self.rows]
+                rows.append([0.0] * position + [1.0])
+                self.rows = rows
+                if self.array is not None:
+                    self.array = np.asarray(rows, dtype=np.float64)
+                self.ids = self.ids + [id_]
+                self.index[id_] = position
+            return self.index[id_]
+
+    def position(self, id_):
+        if id_ is None:
+            return 0
+        position = self.index.get(id_)
+        return position if position is not None else self._add(id_)
+
+    def positions(self, ids):
+        return [self.position(id_) for id_ in ids]
+
+    def value(self, a, b):
+        a, b = self.position(a), self.position(b)
+        return self.rows[a][b]
+
+
+def _interactions(field):
+    """Counter of (teacher's id, learner's id) for a profile field"""
+    counts = Counter()
+    sources = [
+        (SkillSwapRequest.objects.filter(status='accepted'), 'recipient', 'requester'),
+        (SkillSwapSession.objects.filter(status='completed'), 'teacher', 'learner'),
+    ]
+    for queryset, teacher, learner in sources:
+        teacher_field = f'{teacher}__profile__{field}_id'
+        learner_field = f'{learner}__profile__{field}_id'
+        for a, b, count in queryset.order_by().values(teacher_field, learner_field).annotate(
+            count=Count('id')
+        ).values_list(teacher_field, learner_field, 'count'):
+            if a is not None and b is not None:
+                counts[(a, b)] += count
+    return counts
+
+
+def compute_matrix(ids, counts):
+    """
+    Row-major affinities for `ids` from interaction counts: the symmetric
+    count matrix (plus the prior on the diagonal) divided by the square
+    root of both row totals, which keeps every value within [0, 1].
+    """
+    position = {id_: k for k, id_ in enumerate(ids)}
+    size = len(ids)
+    matrix = [[0.0] * size for _ in range(size)]
+    for k in range(size):
+        matrix[k][k] = float(PRIOR_INTERACTIONS)
+    for (a, b), count in counts.items():
+        if a in position and b in position:
+            matrix[position[a]][position[b]] += count
+            # A swap within one department is one interaction, not one each way
+            if a != b:
+                matrix[position[b]][position[a]] += count
+    totals = [sum(row) for row in matrix]
+    return [matrix[i][j] / math.sqrt(totals[i] * totals[j]) for i in range(size) for j in range(size)]
+
+
+def build_affinity():
+    """Recompute and store both matrices; returns {kind: interactions}"""
+    kinds = {
+        'department': list(Department.objects.order_by('id').values_list('id', flat=True)),
+        'branch': list(Branch.objects.order_by('id').values_list('id', flat=True)),
+    }
+    stats = {}
+    for kind, ids in kinds.items():
+        counts = _interactions(kind)
+        AffinityMatrix.objects.update_or_create(kind=kind, defaults={
+            'ids': array('q', ids).tobytes(),
+            'values': array('f', compute_matrix(ids, counts)).tobytes(),
+            'interactions': sum(counts.values()),
+        })
+        stats[kind] = sum(counts.values())
+    reload_affinity()
+    return stats
+
+
+def _unpack(stored):
+    ids = array('q')
+    ids.frombytes(bytes(stored.ids))
+    values = array('f')
+    values.frombytes(bytes(stored.values))
+    return Matrix(ids, values)
+
+
+def load_affinity():
+    """Stored matrices, or identity matrices when none have been built"""
+    stored = {matrix.kind: matrix for matrix in AffinityMatrix.objects.all()}
+    if 'department' in stored:
+        departments = _unpack(stored['department'])
+    else:
+        departments = Matrix.identity(Department.objects.order_by('id').values_list('id', flat=True))
+    if 'branch' in stored:
+        branches = _unpack(stored['branch'])
+    else:
+        branches = Matrix.identity(Branch.objects.order_by('id').values_list('id', flat=True))
+    return Affinity(departments, branches)
+
+
+def get_affinity():
+    global _affinity
+    if _affinity is None:
+        with _lock:
+            if _affinity is None:
+                _affinity = load_affinity()
+    return _affinity
+
+
+def reload_affinity():
+    global _affinity
+    with _lock:
+        _affinity = None
@@ -0,0 +1,185 @@
+"""
+In-memory skill autocomplete.
+
+Skills are ranked by popularity (active offers plus active wishes), then
+name. Every word start of a skill name ("machine learning", "learning")
+goes into a sorted array that is searched with bisect; the best skills
+for prefixes of up to PRECOMPUTED_PREFIX characters are computed up
+front, and longer prefixes covering more than HEAVY_RANGE entries are
+remembered after their first scan. When prefixes don't fill the page, a
+trigram index adds names that are close to the query, so small typos
+still find their skill.
+
+Each process builds the index once (wsgi.py and asgi.py warm it at
+start-up) and rebuilds it in a background thread once it is
+SKILL_AUTOCOMPLETE_TTL seconds old, which is also how popularity catches
+up with offers and wishes, or when the version stored in the cache
+changes. Saving or deleting a Skill changes the version, checked at most
+every SKILL_AUTOCOMPLETE_CHECK_INTERVAL seconds. Without a shared CACHES
+backend the version lives in a per-process LocMemCache, so other
+processes only see the new skill once their index expires.
+"""
+import heapq
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.models import Count
+
+from .models import Skill, OfferedSkill, DesiredSkill
+
+Suggestion = namedtuple('Suggestion', ['id', 'name', 'popularity'])
+
+VERSION_KEY = 'skill_autocomplete:version'
+PRECOMPUTED_PREFIX = 3
+HEAVY_RANGE = 1000
+MAX_RESULTS = 50
+# Trigrams shared by more skills than this are too common to help
+MAX_POSTING = 5000
+MIN_SIMILARITY = 0.3
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def load_suggestions():
+    popularity = Counter()
+    for model in (OfferedSkill, DesiredSkill):
+        popularity.update(dict(
+            model.objects.filter(is_active=True).order_by().values('skill_id').annotate(
+                count=Count('id')
+            ).values_list('skill_id', 'count')
+        ))
+    return [Suggestion(skill_id, name, popularity[skill_id])
+            for skill_id, name in Skill.objects.order_by().values_list('id', 'name')]
+
+
+class AutocompleteIndex:
+    def __init__(self, suggestions):
+        # A skill's position in this list is its rank
+        self.skills = sorted(suggestions, key=lambda s: (-s.popularity, s.name.casefold(), s.id))
+
+        entries = []
+        self.trigram_counts = array('H')
+        postings = defaultdict(lambda: array('l'))
+        for rank, skill in enumerate(self.skills):
+            words = normalize(skill.name).split()
+            entries.extend((' '.join(words[k:]), rank) for k in range(len(words)))
+            name_trigrams = trigrams(' '.join(words))
+            self.trigram_counts.append(min(len(name_trigrams), 65535))
+            for trigram in name_trigrams:
+                postings[trigram].append(rank)
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.ranks = array('l', (rank for _, rank in entries))
+        self.postings = dict(postings)
+
+        top = defaultdict(set)
+        for key, rank in entries:
+            for length in range(min(len(key), PRECOMPUTED_PREFIX) + 1):
+                top[key[:length]].add(rank)
+        self.top = {prefix: heapq.nsmallest(MAX_RESULTS, ranks) for prefix, ranks in top.items()}
+
+    def prefix_ranks(self, prefix, limit):
+        if len(prefix) <= PRECOMPUTED_PREFIX or prefix in self.top:
+            return self.top.get(prefix, [])[:limit]
+        start = bisect_left(self.keys, prefix)
+        stop = bisect_left(self.keys, prefix + '\uffff', start)
+        if stop - start <= HEAVY_RANGE:
+            return heapq.nsmallest(limit, set(self.ranks[start:stop]))
+        self.top[prefix] = heapq.nsmallest(MAX_RESULTS, set(self.ranks[start:stop]))
+        return self.top[prefix][:limit]
+
+    def fuzzy_ranks(self, query, limit, exclude):
+        query_trigrams = trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            posting = self.postings.get(trigram)
+            if posting is not None and len(posting) <= MAX_POSTING:
+                shared.update(posting)
+        scored = []
+        for rank, count in shared.items():
+            if rank in exclude:
+                continue
+            similarity = count / (len(query_trigrams) + self.trigram_counts[rank] - count)
+            if similarity >= MIN_SIMILARITY:
+                scored.append((-similarity, rank))
+        return [rank for _, rank in heapq.nsmallest(limit, scored)]
+
+    def complete(self, term, limit=10):
+        limit = min(limit, MAX_RESULTS)
+        query = normalize(term)
+        ranks = self.prefix_ranks(query, limit)
+        if len(ranks) < limit and len(query) >= 3:
+            ranks = ranks + self.fuzzy_ranks(query, limit - len(ranks), set(ranks))
+        return [self.skills[rank] for rank in ranks]
+
+
+class SkillAutocomplete:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._checked_at = 0.0
+        self._built_at = 0.0
+
+    def _current(self):
+        now = time.monotonic()
+        interval = getattr(settings, 'SKILL_AUTOCOMPLETE_CHECK_INTERVAL', 1.0)
+        if self._index is not None and now - self._checked_at < interval:
+            return self._index
+        self._checked_at = now
+        version = cache.get(VERSION_KEY, 0)
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._build(version)
+            return self._index
+        expired = now - self._built_at >= getattr(settings, 'SKILL_AUTOCOMPLETE_TTL', 300)
+        if (expired or version != self._version) and self._lock.acquire(blocking=False):
+            # Keep serving the old index while a new one is built
+            threading.Thread(target=self._rebuild, args=(version,), daemon=True).start()
+        return self._index
+
+    def _build(self, version):
+        self._index = AutocompleteIndex(load_suggestions())
+        self._version = version
+        self._built_at = time.monotonic()
+
+    def _rebuild(self, version):
+        try:
+            self._build(version)
+        finally:
+            self._lock.release()
+            connection.close()
+
+    def complete(self, term, limit=10):
+        """Suggestions for what the user has typed so far, best first"""
+        return self._current().complete(term, limit)
+
+    def warm(self):
+        try:
+            self._current()
+        except DatabaseError:
+            # Not migrated yet; the first request builds the index instead
+            pass
+
+    def invalidate(self):
+        """Rebuild this index, and the others sharing its cache; see the module docstring"""
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        self._checked_at = 0.0
+
+
+autocomplete = SkillAutocomplete()
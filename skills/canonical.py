@@ -0,0 +1,212 @@
+"""
+Canonical skills.
+
+Every skill name has a key: NFKC-normalized, case-folded words with the
+punctuation dropped (except + and #, for C++ and C#). Skill.normalized_name
+holds the key and is unique, and SkillAlias maps extra keys ("python3",
+"js") onto a skill. A skill whose key was already taken when it was saved,
+or whose key has become some other skill's alias, is a duplicate. Its
+normalized_name is NULL or an alias key, and it waits for
+merge_duplicate_skills to fold it into the canonical skill. Until then
+the matching engine treats it as that skill.
+
+ALIASES lists common alternative spellings. The first time their target
+skill is created, add_builtin_aliases() stores them as SkillAlias rows,
+and until then the resolver applies them itself.
+
+The resolver caches aliases, duplicates and every key it has looked up in
+each process, and drops them once they are SKILL_RESOLVER_TTL seconds old
+or when a version in the Django cache changes, which happens whenever a
+Skill or SkillAlias is saved or deleted. The version is checked at most
+every SKILL_RESOLVER_CHECK_INTERVAL seconds. Without a shared CACHES
+backend it lives in a per-process LocMemCache, so until their copies
+expire other processes can miss new skills and aliases or still name a
+skill a merge has deleted; get_or_create() checks for the latter.
+"""
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import Skill, SkillAlias, SkillCategory
+
+VERSION_KEY = 'skill_resolver:version'
+DEFAULT_CATEGORY = 'Other'
+
+# Alias key -> key of the skill it names
+ALIASES = {
+    'python3': 'python',
+    'py': 'python',
+    'js': 'javascript',
+    'ts': 'typescript',
+    'golang': 'go',
+    'cpp': 'c++',
+    'reactjs': 'react',
+    'ml': 'machine learning',
+    'dl': 'deep learning',
+    'ui': 'ui design',
+}
+
+
+def skill_key(name):
+    text = unicodedata.normalize('NFKC', name).casefold()
+    return ' '.join(re.findall(r'[\w+#]+', text))[:100]
+
+
+def display_name(name):
+    return ' '.join(name.split())[:100]
+
+
+def add_builtin_aliases(skills):
+    """
+    Store the ALIASES naming any of `skills` as SkillAlias rows; aliases
+    already stored are left alone. Returns the number created.
+    """
+    targets = {skill.normalized_name: skill.id for skill in skills if skill.normalized_name}
+    return len(SkillAlias.objects.bulk_create([
+        SkillAlias(name=alias, normalized_name=alias, skill_id=targets[target])
+        for alias, target in ALIASES.items() if target in targets
+    ], ignore_conflicts=True))
+
+
+def find_duplicates():
+    """{duplicate skill id: canonical skill id}"""
+    aliases = dict(SkillAlias.objects.values_list('normalized_name', 'skill_id'))
+    duplicates = {}
+    unkeyed = {}
+    for skill_id, name, key in Skill.objects.filter(
+        Q(normalized_name__isnull=True) | Q(normalized_name__in=list(aliases))
+    ).order_by().values_list('id', 'name', 'normalized_name'):
+        if key is not None:
+            if aliases[key] != skill_id:
+                duplicates[skill_id] = aliases[key]
+        elif skill_key(name) in aliases:
+            duplicates[skill_id] = aliases[skill_key(name)]
+        elif skill_key(name):
+            unkeyed[skill_id] = skill_key(name)
+    if unkeyed:
+        owners = dict(Skill.objects.filter(normalized_name__in=set(unkeyed.values())).values_list(
+            'normalized_name', 'id'
+        ))
+        duplicates.update({skill_id: owners[key] for skill_id, key in unkeyed.items() if key in owners})
+    # An alias may point at a skill that is itself a duplicate
+    for skill_id, canonical_id in duplicates.items():
+        seen = {skill_id}
+        while canonical_id in duplicates and canonical_id not in seen:
+            seen.add(canonical_id)
+            canonical_id = duplicates[canonical_id]
+        duplicates[skill_id] = canonical_id
+    return duplicates
+
+
+class ResolverState:
+    def __init__(self):
+        self.aliases = dict(SkillAlias.objects.values_list('normalized_name', 'skill_id'))
+        self.duplicates = find_duplicates()
+        self.equivalents = defaultdict(list)
+        for skill_id, canonical_id in self.duplicates.items():
+            self.equivalents[canonical_id].append(skill_id)
+        # Looked-up keys, including misses (None)
+        self.keys = {}
+
+
+class SkillResolver:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+        self._version = None
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+
+    def _current(self):
+        now = time.monotonic()
+        interval = getattr(settings, 'SKILL_RESOLVER_CHECK_INTERVAL', 1.0)
+        if self._state is not None and now - self._checked_at < interval:
+            return self._state
+        self._checked_at = now
+        version = cache.get(VERSION_KEY, 0)
+        expired = now - self._loaded_at >= getattr(settings, 'SKILL_RESOLVER_TTL', 300)
+        if self._state is None or version != self._version or expired:
+            with self._lock:
+                self._state = ResolverState()
+                self._version = version
+                self._loaded_at = now
+        return self._state
+
+    def resolve_many(self, names):
+        """{name: canonical skill id} for the names that match a skill"""
+        state = self._current()
+        keys = {name: skill_key(name) for name in names}
+        # A built-in alias whose row isn't stored yet still names its target
+        lookups = {name: [key] if key in state.aliases or key not in ALIASES else [ALIASES[key], key]
+                   for name, key in keys.items() if key}
+        missing = {key for candidates in lookups.values() for key in candidates
+                   if key not in state.aliases and key not in state.keys}
+        if missing:
+            found = dict(Skill.objects.filter(normalized_name__in=missing).values_list('normalized_name', 'id'))
+            state.keys.update({key: found.get(key) for key in missing})
+        resolved = {}
+        for name, candidates in lookups.items():
+            for key in candidates:
+                skill_id = state.aliases.get(key) or state.keys.get(key)
+                if skill_id is not None:
+                    resolved[name] = state.duplicates.get(skill_id, skill_id)
+                    break
+        return resolved
+
+    def resolve(self, name):
+        """Canonical skill id for a name, or None"""
+        return self.resolve_many([name]).get(name)
+
+    def duplicates(self):
+        """{duplicate skill id: canonical skill id}, usually empty"""
+        return self._current().duplicates
+
+    def canonical_id(self, skill_id):
+        return self._current().duplicates.get(skill_id, skill_id)
+
+    def equivalent_ids(self, skill_id):
+        """The canonical skill for skill_id and its duplicates awaiting a merge"""
+        state = self._current()
+        canonical_id = state.duplicates.get(skill_id, skill_id)
+        return [canonical_id] + state.equivalents.get(canonical_id, [])
+
+    def get_or_create(self, name, category=None):
+        """(skill, created) for what a user typed; new skills go under `category` or Other"""
+        skill_id = self.resolve(name)
+        if skill_id is not None:
+            skill = Skill.objects.filter(id=skill_id).first()
+            if skill is not None:
+                return skill, False
+            # Merged away since this process cached it
+            self._state = None
+            return self.get_or_create(name, category)
+        if category is None:
+            category, _ = SkillCategory.objects.get_or_create(name=DEFAULT_CATEGORY, defaults={'is_active': True})
+        try:
+            with transaction.atomic():
+                skill = Skill.objects.create(name=display_name(name), category=category)
+        except IntegrityError:
+            # Someone else created it first
+            self.invalidate()
+            skill_id = self.resolve(name)
+            if skill_id is None:
+                raise
+            return Skill.objects.get(id=skill_id), False
+        self._current().keys[skill.normalized_name] = skill.id
+        return skill, True
+
+    def invalidate(self):
+        """Drop the cached lookups here and in the processes sharing the cache"""
+        cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+        self._checked_at = 0.0
+
+
+resolver = SkillResolver()
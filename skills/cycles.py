@@ -0,0 +1,165 @@
+"""
+Mutual matches and multi-party swap cycles.
+
+The "can teach" graph has an edge teacher → learner for every live
+SkillMatch. Two users are a mutual match when the edge exists both ways;
+three or four users form a swap cycle when A teaches B, B teaches C and
+C teaches A (or D first).
+
+Cycle search is bounded: every user keeps only their best outgoing edges,
+a cycle is only searched from its lowest user id, and a path is only
+extended through users that can still get back to the start in time.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q
+
+from .models import SkillMatch, SwapCycle, SwapCycleLeg
+
+MAX_CYCLE_LENGTH = 4
+MAX_OUT_DEGREE = 8
+MAX_CYCLES_PER_USER = 3
+
+
+def update_mutual_flags(user_ids=None):
+    """Set SkillMatch.is_mutual in one UPDATE, optionally only for some users"""
+    reverse = SkillMatch.objects.filter(
+        teacher_id=OuterRef('learner_id'), learner_id=OuterRef('teacher_id'), is_dismissed=False
+    )
+    matches = SkillMatch.objects.all()
+    if user_ids is not None:
+        matches = matches.filter(Q(teacher_id__in=user_ids) | Q(learner_id__in=user_ids))
+    return matches.update(is_mutual=Exists(reverse))
+
+
+def dismissal_changed(match):
+    """
+    Reset the mutual flags around a match that was dismissed or restored,
+    and drop the swap cycles a dismissed match was a leg of. A restored
+    match rejoins cycles at the next rebuild_swap_cycles().
+    """
+    from .suggestions import invalidate_suggestions
+
+    user_ids = {match.teacher_id, match.learner_id}
+    with transaction.atomic():
+        update_mutual_flags(user_ids)
+        if match.is_dismissed:
+            cycles = SwapCycle.objects.filter(legs__match_id=match.pk)
+            user_ids.update(SwapCycleLeg.objects.filter(
+                cycle__in=cycles
+            ).values_list('match__teacher_id', flat=True))
+            cycles.delete()
+    invalidate_suggestions(user_ids)
+
+
+def load_edges():
+    """Best live match per (teacher, learner) as {(teacher, learner): (score, match_id)}"""
+    edges = {}
+    for match_id, teacher_id, learner_id, score in SkillMatch.objects.filter(
+        is_dismissed=False
+    ).order_by().values_list('id', 'teacher_id', 'learner_id', 'compatibility_score'):
+        key = (teacher_id, learner_id)
+        if key not in edges or (score, -match_id) > (edges[key][0], -edges[key][1]):
+            edges[key] = (score, match_id)
+    return edges
+
+
+def find_swap_cycles(edges, max_length=MAX_CYCLE_LENGTH, max_degree=MAX_OUT_DEGREE):
+    """
+    Return every cycle of 3..max_length users (as tuples starting at the
+    lowest user id) in the graph pruned to `max_degree` edges per teacher.
+    """
+    outgoing = defaultdict(list)
+    for (teacher_id, learner_id), (score, _) in edges.items():
+        outgoing[teacher_id].append((score, -learner_id))
+    incoming = defaultdict(set)
+    for teacher_id, ranked in outgoing.items():
+        ranked.sort(reverse=True)
+        outgoing[teacher_id] = [-negated for _, negated in ranked[:max_degree]]
+        for learner_id in outgoing[teacher_id]:
+            incoming[learner_id].add(teacher_id)
+
+    cycles = []
+    for start in sorted(outgoing):
+        # Users who can teach `start` close a cycle; with four users the
+        # third one must be able to reach one of them
+        closers = {user for user in incoming[start] if user > start}
+        if not closers:
+            continue
+        if max_length >= 4:
+            two_back = {user for closer in closers for user in incoming[closer] if user > start}
+        else:
+            two_back = set()
+
+        for second in outgoing[start]:
+            if second <= start:
+                continue
+            for third in outgoing[second]:
+                if third <= start or third == second:
+                    continue
+                if third in closers:
+                    cycles.append((start, second, third))
+                if third in two_back:
+                    for fourth in outgoing[third]:
+                        if fourth in closers and fourth != second:
+                            cycles.append((start, second, third, fourth))
+    return cycles
+
+
+def select_cycles(cycles, edges, per_user=MAX_CYCLES_PER_USER):
+    """
+    Score cycles by their average match score and keep the best ones,
+    with no user taking part in more than `per_user` cycles.
+    """
+    scored = []
+    for cycle in cycles:
+        legs = [edges[(cycle[k], cycle[(k + 1) % len(cycle)])] for k in range(len(cycle))]
+        score = round(sum(leg[0] for leg in legs) / len(legs), 2)
+        scored.append((-score, cycle, [leg[1] for leg in legs]))
+    scored.sort()
+
+    taken = defaultdict(int)
+    selected = []
+    for negated_score, cycle, match_ids in scored:
+        if any(taken[user] >= per_user for user in cycle):
+            continue
+        for user in cycle:
+            taken[user] += 1
+        selected.append((cycle, -negated_score, match_ids))
+    return selected
+
+
+def rebuild_swap_cycles(max_length=MAX_CYCLE_LENGTH, max_degree=MAX_OUT_DEGREE,
+                        per_user=MAX_CYCLES_PER_USER):
+    """Replace every stored swap cycle with a fresh search over SkillMatch"""
+    from .suggestions import invalidate_suggestions
+
+    edges = load_edges()
+    selected = select_cycles(find_swap_cycles(edges, max_length, max_degree), edges, per_user)
+
+    with transaction.atomic():
+        SwapCycle.objects.all().delete()
+        cycles = SwapCycle.objects.bulk_create(
+            [SwapCycle(size=len(cycle), score=score) for cycle, score, _ in selected]
+        )
+        SwapCycleLeg.objects.bulk_create(
+            [
+                SwapCycleLeg(cycle=swap_cycle, match_id=match_id, position=position)
+                for swap_cycle, (_, _, match_ids) in zip(cycles, selected)
+                for position, match_id in enumerate(match_ids)
+            ],
+            batch_size=2000,
+        )
+    invalidate_suggestions()
+    return len(selected)
+
+
+def cycles_for_user(user):
+    """Complete swap cycles the user takes part in, best first"""
+    return SwapCycle.objects.annotate(
+        leg_count=Count('legs')
+    ).filter(
+        leg_count=F('size'),
+        pk__in=SwapCycleLeg.objects.filter(match__teacher=user).values('cycle_id'),
+    ).prefetch_related('legs__match__teacher', 'legs__match__learner', 'legs__match__offered_skill__skill')
@@ -0,0 +1,39 @@
+"""
+Counts behind the skill browse page.
+
+Skill.offered_count holds the number of active teachers per skill so the
+catalog can be sorted by popularity through an index. It is refreshed
+alongside the teacher index whenever offered skills change (see
+skills.signals); bulk loaders that bypass signals call
+update_offered_counts() themselves. Category facet counts are one
+aggregate over the categories.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Skill, SkillCategory, OfferedSkill
+
+
+def update_offered_counts(skill_ids=None):
+    """Recount active teachers for the given skills, or for every skill"""
+    teachers = OfferedSkill.objects.filter(
+        skill_id=OuterRef('pk'), is_active=True, user__is_active=True
+    ).order_by().values('skill_id').annotate(count=Count('id')).values('count')
+    skills = Skill.objects.all() if skill_ids is None else Skill.objects.filter(id__in=list(skill_ids))
+    return skills.update(offered_count=Coalesce(Subquery(teachers, output_field=IntegerField()), Value(0)))
+
+
+def category_facets(skills=None):
+    """
+    Active categories annotated with skill_count, the number of skills in
+    `skills` (a Skill queryset, default every skill) that fall in each one
+    """
+    skills = Skill.objects.all() if skills is None else skills
+    # A correlated count per category walks the category_id index instead
+    # of grouping a join over the whole catalog
+    counts = skills.filter(category_id=OuterRef('pk')).order_by().values('category_id').annotate(
+        count=Count('id')
+    ).values('count')
+    return SkillCategory.objects.filter(is_active=True).annotate(
+        skill_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+    ).order_by('name')
@@ -24,7 +24,8 @@ class OfferedSkillForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         from .models import Skill
-        self.fields['skill'].queryset = Skill.objects.all()
+        # Skill labels include the category name
+        self.fields['skill'].queryset = Skill.objects.select_related('category')
         self.fields['skill'].required = False
     
     def clean(self):
@@ -37,13 +38,11 @@ class OfferedSkillForm(forms.ModelForm):
             raise forms.ValidationError('Please select a skill or enter a new skill.')
         
         if new_skill:
-            from .models import Skill, SkillCategory
-            # Assign to a default category if needed
-            default_category, _ = SkillCategory.objects.get_or_create(name='Other', defaults={'is_active': True})
-            skill_obj, created = Skill.objects.get_or_create(
-                name=new_skill.strip(),
-                defaults={'category': default_category}
-            )
+            from .canonical import resolver, skill_key
+            if not skill_key(new_skill):
+                raise forms.ValidationError('Please enter a skill name with letters or numbers.')
+            # "python", "Python " and "Python3" all resolve to the same skill
+            skill_obj, created = resolver.get_or_create(new_skill)
             cleaned_data['skill'] = skill_obj
         
         if cleaned_data.get('skill') and user:
@@ -64,6 +63,10 @@ class DesiredSkillForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'rows': 4}),
         }
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['skill'].queryset = self.fields['skill'].queryset.select_related('category')
+    
     def clean(self):
         cleaned_data = super().clean()
         skill = cleaned_data.get('skill')
@@ -0,0 +1,249 @@
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import statistics
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from skills.cycles import rebuild_swap_cycles
+from skills.matching import rebuild_matches, compute_matches, load_offered, load_desired
+from skills.models import OfferedSkill, DesiredSkill, SkillMatch
+from skills.scoring import get_scorer
+from skills.suggestions import build_suggestions
+from skills.teacher_index import teacher_index
+
+LEVELS = [code for code, _ in OfferedSkill.PROFICIENCY_LEVELS]
+URGENCIES = [code for code, _ in DesiredSkill.URGENCY_LEVELS]
+
+
+class QueryCounter:
+    """connection.execute_wrapper that counts every SQL statement"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM (Linux 4.0+)
+    try:
+        Path('/proc/self/clear_refs').write_text('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    try:
+        for line in Path('/proc/self/status').read_text().splitlines():
+            if line.startswith('VmHWM:'):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and can't be reset
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def worker_peak_rss_mb():
+    # Largest worker process reaped so far; it can't be reset either, so
+    # it only tells a phase apart when that phase raised it
+    return round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+
+
+def summarize(durations):
+    durations = sorted(durations)
+    return {
+        'operations': len(durations),
+        'seconds': round(sum(durations), 4),
+        'mean_ms': round(statistics.fmean(durations) * 1000, 3),
+        'p95_ms': round(durations[int(0.95 * (len(durations) - 1))] * 1000, 3),
+        'max_ms': round(durations[-1] * 1000, 3),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Time full match rebuilds, incremental refreshes and suggestion queries on generated '
+            'campuses of several sizes, optionally comparing against a baseline JSON file')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Comma separated numbers of users to benchmark')
+        parser.add_argument('--operations', type=int, default=200,
+                            help='Incremental edits and suggestion queries timed per size')
+        parser.add_argument('--workers', default='1',
+                            help='Comma separated worker process counts to time match scoring with; the '
+                                 'full rebuild uses the first, and its writes always run in this process')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for data and sampling')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against results previously written with --output')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed slowdown against the baseline (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The matching benchmark runs against SQLite only.')
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+            workers = [int(count) for count in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes and --workers must be comma separated lists of numbers.')
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        results = {
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'scorer': type(get_scorer()).__name__,
+                'seed': options['seed'],
+                'operations': options['operations'],
+                'cpus': os.cpu_count(),
+            },
+            'sizes': {},
+        }
+        for size in sizes:
+            self.stdout.write(f'Benchmarking {size} users...')
+            results['sizes'][str(size)] = self.run_size(size, options['seed'], options['operations'], workers)
+            for phase, stats in results['sizes'][str(size)].items():
+                self.stdout.write(
+                    f"  {phase:<20} {stats['seconds']:>9.3f}s {stats['queries']:>8} queries "
+                    f"{stats['peak_rss_mb']:>8.1f} MB peak RSS "
+                    f"{stats['worker_peak_rss_mb']:>8.1f} MB in workers"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = self.compare(results, baseline, options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def run_size(self, size, seed, operations, workers):
+        """Generate a campus in a throwaway SQLite file and time every phase on it"""
+        test_settings = connection.settings_dict['TEST']
+        test_name = test_settings['NAME']
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                test_settings['NAME'] = str(Path(directory) / f'benchmark_{size}.sqlite3')
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                teacher_index.clear()
+                try:
+                    stats = {}
+                    stats['dataset'] = self.measure(call_command, 'generate_campus_data', users=size,
+                                                    seed=seed, stdout=StringIO())
+                    stats['rebuild'] = self.measure(rebuild_matches, workers=workers[0])
+                    stats['rebuild'].update(matches=SkillMatch.objects.count())
+                    # Scoring alone is what the workers share, the upsert stays in this process
+                    offered, desired = load_offered(), load_desired()
+                    for count in workers:
+                        stats[f'scoring_x{count}'] = self.measure(compute_matches, offered, desired, workers=count)
+                    stats['cycles'] = self.measure(rebuild_swap_cycles)
+                    stats['incremental'] = self.measure_incremental(random.Random(seed), operations)
+                    stats['suggestions'] = self.measure_suggestions(random.Random(seed), operations)
+                    return stats
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+                    teacher_index.clear()
+        finally:
+            test_settings['NAME'] = test_name
+
+    def measure(self, func, *args, **kwargs):
+        counter = QueryCounter()
+        reset_peak_rss()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            func(*args, **kwargs)
+        return {
+            'seconds': round(time.perf_counter() - start, 4),
+            'queries': counter.count,
+            'peak_rss_mb': peak_rss_mb(),
+            'worker_peak_rss_mb': worker_peak_rss_mb(),
+        }
+
+    def measure_operations(self, operations):
+        """Time each callable in `operations` separately"""
+        counter = QueryCounter()
+        durations = []
+        reset_peak_rss()
+        with connection.execute_wrapper(counter):
+            for operation in operations:
+                start = time.perf_counter()
+                operation()
+                durations.append(time.perf_counter() - start)
+        stats = summarize(durations) if durations else {'operations': 0, 'seconds': 0.0}
+        stats.update(queries=counter.count, peak_rss_mb=peak_rss_mb(), worker_peak_rss_mb=worker_peak_rss_mb())
+        return stats
+
+    def measure_incremental(self, rng, count):
+        """
+        Edit offered and desired skills through save() so the signal
+        handlers refresh the matches on commit, like a profile edit does.
+        """
+        offered_ids = list(OfferedSkill.objects.filter(is_active=True).values_list('id', flat=True))
+        desired_ids = list(DesiredSkill.objects.filter(is_active=True).values_list('id', flat=True))
+        picked = ([(OfferedSkill, pk) for pk in rng.sample(offered_ids, min(count // 2, len(offered_ids)))]
+                  + [(DesiredSkill, pk) for pk in rng.sample(desired_ids, min(count - count // 2, len(desired_ids)))])
+        rng.shuffle(picked)
+
+        def edit(model, pk):
+            def operation():
+                with transaction.atomic():
+                    instance = model.objects.get(pk=pk)
+                    if model is OfferedSkill:
+                        instance.proficiency_level = rng.choice(LEVELS)
+                    else:
+                        instance.urgency = rng.choice(URGENCIES)
+                    instance.save()
+            return operation
+
+        return self.measure_operations([edit(model, pk) for model, pk in picked])
+
+    def measure_suggestions(self, rng, count):
+        """Uncached first pages of suggestions for users who have matches"""
+        from django.contrib.auth.models import User
+
+        user_ids = sorted(set(SkillMatch.objects.values_list('learner_id', flat=True)))
+        users = list(User.objects.filter(id__in=rng.sample(user_ids, min(count, len(user_ids)))))
+        return self.measure_operations([lambda user=user: build_suggestions(user) for user in users])
+
+    def compare(self, results, baseline, tolerance):
+        """Human readable regressions; phases missing from the baseline are skipped"""
+        regressions = []
+        for size, phases in results['sizes'].items():
+            for phase, stats in phases.items():
+                previous = baseline.get('sizes', {}).get(size, {}).get(phase)
+                if not previous:
+                    continue
+                if stats['seconds'] > previous['seconds'] * (1 + tolerance):
+                    regressions.append(
+                        f"{size} users, {phase}: {stats['seconds']:.3f}s vs {previous['seconds']:.3f}s"
+                    )
+                if stats['queries'] > previous['queries']:
+                    regressions.append(
+                        f"{size} users, {phase}: {stats['queries']} queries vs {previous['queries']}"
+                    )
+        return regressions
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skills.affinity import build_affinity
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the department and branch affinity matrices from accepted requests and completed sessions'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = build_affinity()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Built affinity from {stats['department']} department and {stats['branch']} branch "
+                f"interactions in {elapsed:.2f}s. Run rebuild_matches to rescore existing matches."
+            )
+        )
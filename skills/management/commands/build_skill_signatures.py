@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skills.similarity import rebuild_signatures, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the MinHash signatures behind "students like you" recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Number of rows written per bulk insert')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        users = rebuild_signatures(chunk_size=options['chunk_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Built skill signatures for {users} users in {elapsed:.2f}s'))
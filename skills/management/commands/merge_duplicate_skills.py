@@ -0,0 +1,122 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+
+from skill_sessions.models import SkillSwapRequest, SkillSwapSession
+from skills.canonical import find_duplicates, resolver, skill_key
+from skills.facets import update_offered_counts
+from skills.models import Skill, SkillAlias, OfferedSkill, DesiredSkill
+from skills.similarity import refresh_signatures
+from skills.teacher_index import teacher_index
+
+# Skills remapped per UPDATE ... CASE statement
+BATCH_SIZE = 500
+
+
+def remap(queryset, field, mapping):
+    """Point `field` at mapping[old id] for every row of queryset, in set-based updates"""
+    items = list(mapping.items())
+    updated = 0
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = dict(items[start:start + BATCH_SIZE])
+        updated += queryset.filter(**{f'{field}__in': list(batch)}).update(**{field: Case(
+            *[When(**{field: old}, then=Value(new)) for old, new in batch.items()],
+            output_field=IntegerField(),
+        )})
+    return updated
+
+
+class Command(BaseCommand):
+    help = 'Merge skills whose names normalize to the same key, or to an alias of another skill'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the duplicates that would be merged')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        duplicates = self.find_all_duplicates(claim=not options['dry_run'])
+        if not duplicates:
+            self.stdout.write(self.style.SUCCESS('No duplicate skills found'))
+            return
+
+        names = Skill.objects.in_bulk(set(duplicates) | set(duplicates.values()))
+        for duplicate_id, canonical_id in sorted(duplicates.items()):
+            self.stdout.write(f'  {names[duplicate_id].name!r} -> {names[canonical_id].name!r}')
+        if options['dry_run']:
+            self.stdout.write(f'{len(duplicates)} duplicate skills would be merged')
+            return
+
+        with transaction.atomic():
+            stats = self.merge(duplicates, names)
+        canonical_ids = set(duplicates.values())
+        update_offered_counts(canonical_ids)
+        for skill_id in canonical_ids:
+            teacher_index.refresh_skill(skill_id)
+        refresh_signatures(stats.pop('users'))
+        resolver.invalidate()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Merged {len(duplicates)} duplicate skills into {len(canonical_ids)}: moved "
+                f"{stats['offered']} offered and {stats['desired']} desired skills and "
+                f"{stats['sessions']} sessions, dropped {stats['dropped']} repeated entries "
+                f"in {elapsed:.2f}s"
+            )
+        )
+        self.stdout.write('Run rebuild_matches to re-rank matches for the merged skills.')
+
+    def find_all_duplicates(self, claim):
+        """
+        find_duplicates(), plus skills left without a key whose key nobody
+        owns: the oldest of them claims it and the rest merge into it
+        """
+        duplicates = find_duplicates()
+        unkeyed = {}
+        for skill_id, name in Skill.objects.filter(normalized_name__isnull=True).exclude(
+            id__in=list(duplicates)
+        ).order_by('id').values_list('id', 'name'):
+            key = skill_key(name)
+            if key:
+                unkeyed.setdefault(key, []).append(skill_id)
+        for key, skill_ids in unkeyed.items():
+            if claim:
+                Skill.objects.filter(id=skill_ids[0]).update(normalized_name=key)
+            duplicates.update({skill_id: skill_ids[0] for skill_id in skill_ids[1:]})
+        return duplicates
+
+    def merge(self, duplicates, names):
+        stats = {'dropped': 0, 'users': set()}
+        for model, label, request_field in ((OfferedSkill, 'offered', 'offered_skill'),
+                                            (DesiredSkill, 'desired', 'desired_skill')):
+            rows = model.objects.filter(
+                skill_id__in=set(duplicates) | set(duplicates.values())
+            ).order_by('id').values_list('id', 'user_id', 'skill_id')
+            # A user keeps one entry per canonical skill, preferring the one
+            # already on it; swap requests follow the kept entry
+            kept = {}
+            for row_id, user_id, skill_id in sorted(rows, key=lambda row: (row[2] in duplicates, row[0])):
+                kept.setdefault((user_id, duplicates.get(skill_id, skill_id)), row_id)
+            dropped = {row_id: kept[(user_id, duplicates.get(skill_id, skill_id))]
+                       for row_id, user_id, skill_id in rows
+                       if kept[(user_id, duplicates.get(skill_id, skill_id))] != row_id}
+            remap(SkillSwapRequest.objects.all(), f'{request_field}_id', dropped)
+            stats['dropped'] += model.objects.filter(id__in=list(dropped)).delete()[1].get(model._meta.label, 0)
+            stats[label] = remap(model.objects.all(), 'skill_id', duplicates)
+            stats['users'].update(user_id for _, user_id, skill_id in rows if skill_id in duplicates)
+
+        stats['sessions'] = remap(SkillSwapSession.objects.all(), 'skill_id', duplicates)
+        remap(SkillAlias.objects.all(), 'skill_id', duplicates)
+
+        # Keep the old spellings resolving to the merged skill
+        SkillAlias.objects.bulk_create([
+            SkillAlias(name=names[duplicate_id].name, normalized_name=skill_key(names[duplicate_id].name),
+                       skill_id=canonical_id)
+            for duplicate_id, canonical_id in duplicates.items()
+            if skill_key(names[duplicate_id].name) != names[canonical_id].normalized_name
+        ], ignore_conflicts=True)
+        Skill.objects.filter(id__in=list(duplicates)).delete()
+        return stats
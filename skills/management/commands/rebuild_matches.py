@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skills.cycles import rebuild_swap_cycles
+from skills.matching import rebuild_matches, MAX_MATCHES_PER_DESIRED, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Rebuild all skill matches from active offered and desired skills'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=MAX_MATCHES_PER_DESIRED,
+                            help='Maximum number of teachers matched to each desired skill')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Number of matches loaded into the database per batch')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of processes scoring matches in parallel')
+        parser.add_argument('--skip-cycles', action='store_true',
+                            help='Do not search for multi-party swap cycles')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding skill matches...')
+        start = time.perf_counter()
+
+        stats = rebuild_matches(limit=options['limit'], chunk_size=options['chunk_size'],
+                                workers=options['workers'])
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {stats['matches']} matches from {stats['offered']} offered and "
+                f"{stats['desired']} desired skills, removed {stats['deleted']} stale matches "
+                f"in {elapsed:.2f}s"
+            )
+        )
+
+        if not options['skip_cycles']:
+            start = time.perf_counter()
+            cycles = rebuild_swap_cycles()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(self.style.SUCCESS(f'Found {cycles} swap cycles in {elapsed:.2f}s'))
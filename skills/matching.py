@@ -0,0 +1,366 @@
+"""
+Skill matching engine.
+
+Active offered and desired skills are loaded as plain value tuples, joined
+through an in-memory inverted index keyed on canonical skill id (see
+skills.canonical) and scored. A full rebuild writes only the differences
+from the stored matches (sync_matches); incremental refreshes upsert
+their rows (write_matches). Learners of skills with many teachers are only
+scored against teachers from departments with some affinity to theirs.
+
+Scoring is split into units of at most UNIT_PAIRS pairs (one skill, or a
+slice of one skill's learners). With workers > 1 the units are ranked in
+a forked process pool; the units and their order don't depend on the
+number of workers, so neither does the result.
+"""
+import multiprocessing
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .affinity import get_affinity
+from .canonical import resolver
+from .cycles import update_mutual_flags
+from .models import OfferedSkill, DesiredSkill, SkillMatch
+from .suggestions import invalidate_suggestions
+from .scoring import get_scorer, O_ID, O_USER, O_SKILL, O_DEPARTMENT, D_ID, D_USER, D_SKILL, D_DEPARTMENT
+
+PROFILE_FIELDS = ('user__profile__department_id', 'user__profile__branch_id',
+                  'user__profile__prefer_online', 'user__profile__prefer_in_person')
+OFFERED_FIELDS = ('id', 'user_id', 'skill_id', 'proficiency_level', 'years_of_experience',
+                  'teaching_preference', 'average_rating') + PROFILE_FIELDS
+DESIRED_FIELDS = ('id', 'user_id', 'skill_id', 'current_level', 'target_level',
+                  'urgency', 'learning_preference') + PROFILE_FIELDS
+
+# Keep only the best teachers for each desired skill
+MAX_MATCHES_PER_DESIRED = 25
+CHUNK_SIZE = 2000
+
+# Department pre-filter for skills with at least PREFILTER_MIN_TEACHERS teachers
+PREFILTER_MIN_TEACHERS = 1000
+MIN_CANDIDATE_AFFINITY = 0.05
+MIN_CANDIDATES = 100
+
+# Teacher × learner pairs ranked per unit of work
+UNIT_PAIRS = 5000000
+
+# Groups being ranked by a process pool; forked workers inherit them
+_pool_groups = None
+_pool_lock = threading.Lock()
+
+MATCH_UNIQUE_FIELDS = ['teacher', 'learner', 'offered_skill', 'desired_skill']
+MATCH_UPDATE_FIELDS = ['compatibility_score', 'updated_at']
+# Columns written by write_matches, in the order of its row tuples
+MATCH_INSERT_FIELDS = MATCH_UNIQUE_FIELDS + ['compatibility_score', 'is_mutual', 'is_dismissed',
+                                             'created_at', 'updated_at']
+
+
+def load_offered(**filters):
+    return list(OfferedSkill.objects.filter(
+        is_active=True, user__is_active=True, **filters
+    ).order_by().values_list(*OFFERED_FIELDS))
+
+
+def load_desired(**filters):
+    return list(DesiredSkill.objects.filter(
+        is_active=True, user__is_active=True, **filters
+    ).order_by().values_list(*DESIRED_FIELDS))
+
+
+def build_index(rows, skill_column, aliases=None):
+    """Group rows by skill id, or by aliases.get(skill id, skill id)"""
+    index = defaultdict(list)
+    if aliases:
+        for row in rows:
+            index[aliases.get(row[skill_column], row[skill_column])].append(row)
+        return index
+    for row in rows:
+        index[row[skill_column]].append(row)
+    return index
+
+
+def candidate_teachers(teachers, department_id, affinity=None):
+    """
+    The teachers of one skill worth scoring for learners from a department.
+    Small skills, learners without a department and departments with too
+    few close teachers get every teacher; teachers without a department
+    are always kept.
+    """
+    if len(teachers) < PREFILTER_MIN_TEACHERS or department_id is None:
+        return teachers
+    departments = (affinity or get_affinity()).departments
+    close = {None} | {other for other in departments.ids
+                      if departments.value(other, department_id) >= MIN_CANDIDATE_AFFINITY}
+    candidates = [row for row in teachers if row[O_DEPARTMENT] in close]
+    return candidates if len(candidates) >= MIN_CANDIDATES else teachers
+
+
+def candidate_groups(teachers, learners, affinity=None):
+    """(teachers, learners) groups to rank; large skills are split by learner department"""
+    if len(teachers) < PREFILTER_MIN_TEACHERS:
+        return [(teachers, learners)]
+    return [(candidate_teachers(teachers, department_id, affinity), group)
+            for department_id, group in build_index(learners, D_DEPARTMENT).items()]
+
+
+def match_groups(offered_rows, desired_rows, affinity=None):
+    """
+    (teachers, learners) groups to rank for every skill, in skill id order.
+    Duplicate skills awaiting a merge are grouped with their canonical skill.
+    """
+    duplicates = resolver.duplicates()
+    teachers_by_skill = build_index(offered_rows, O_SKILL, duplicates)
+    groups = []
+    for skill_id, learners in sorted(build_index(desired_rows, D_SKILL, duplicates).items()):
+        teachers = teachers_by_skill.get(skill_id)
+        if teachers:
+            groups.extend(candidate_groups(teachers, learners, affinity))
+    return groups
+
+
+def split_units(groups, unit_pairs=UNIT_PAIRS):
+    """(group index, start, stop) slices of each group's learners"""
+    units = []
+    for index, (teachers, learners) in enumerate(groups):
+        step = max(1, unit_pairs // len(teachers))
+        units.extend((index, start, min(start + step, len(learners)))
+                     for start in range(0, len(learners), step))
+    return units
+
+
+def rank_unit(groups, unit, limit, scorer):
+    index, start, stop = unit
+    teachers, learners = groups[index]
+    learners = learners[start:stop]
+    return [
+        (teachers[i][O_USER], learners[j][D_USER], teachers[i][O_ID], learners[j][D_ID], score)
+        for i, j, score in scorer.rank(scorer.prepare_offered(teachers), scorer.prepare_desired(learners), limit)
+    ]
+
+
+def _rank_pool_unit(unit, limit, scorer):
+    return rank_unit(_pool_groups, unit, limit, scorer)
+
+
+def compute_matches(offered_rows, desired_rows, limit=MAX_MATCHES_PER_DESIRED, scorer=None, workers=1):
+    """
+    Return (teacher_id, learner_id, offered_id, desired_id, score) tuples
+    for the best `limit` teachers of every desired skill.
+    """
+    global _pool_groups
+
+    scorer = scorer or get_scorer()
+    groups = match_groups(offered_rows, desired_rows, scorer.affinity)
+    units = split_units(groups)
+
+    # Workers are forked so they share the rows instead of unpickling them
+    if workers > 1 and len(units) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        with _pool_lock:
+            _pool_groups = groups
+            try:
+                with ProcessPoolExecutor(min(workers, len(units)),
+                                         mp_context=multiprocessing.get_context('fork')) as executor:
+                    ranked = list(executor.map(_rank_pool_unit, units,
+                                               [limit] * len(units), [scorer] * len(units)))
+            finally:
+                _pool_groups = None
+    else:
+        ranked = (rank_unit(groups, unit, limit, scorer) for unit in units)
+
+    return [match for unit_matches in ranked for match in unit_matches]
+
+
+def write_matches(matches, chunk_size=CHUNK_SIZE):
+    """
+    Upsert match tuples into SkillMatch, keeping dismissal flags intact.
+
+    The rows go straight to executemany(); building a SkillMatch per row
+    for bulk_create() took most of a full rebuild.
+    """
+    meta = SkillMatch._meta
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    fields = [meta.get_field(name) for name in MATCH_INSERT_FIELDS]
+    sql = 'INSERT INTO {} ({}) VALUES ({}) {}'.format(
+        connection.ops.quote_name(meta.db_table),
+        ', '.join(connection.ops.quote_name(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+        connection.ops.on_conflict_suffix_sql(
+            fields, OnConflict.UPDATE,
+            [meta.get_field(name).column for name in MATCH_UPDATE_FIELDS],
+            [meta.get_field(name).column for name in MATCH_UNIQUE_FIELDS],
+        ),
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(matches), chunk_size):
+            cursor.executemany(sql, [
+                (teacher_id, learner_id, offered_id, desired_id, score, False, False, now, now)
+                for teacher_id, learner_id, offered_id, desired_id, score in matches[start:start + chunk_size]
+            ])
+
+
+def sync_matches(matches, chunk_size=CHUNK_SIZE):
+    """
+    Make SkillMatch hold exactly the given match tuples and return how many
+    rows were deleted.
+
+    The tuples are loaded into an indexed temporary table. Set-wise
+    statements then delete rows missing from it, rescore rows whose score
+    changed and insert new pairs. Unchanged rows, usually most of them,
+    are never written, and dismissal flags stay intact.
+    """
+    qn = connection.ops.quote_name
+    table = qn(SkillMatch._meta.db_table)
+    key_columns = [qn(SkillMatch._meta.get_field(name).column) for name in MATCH_UNIQUE_FIELDS]
+    same_pair = ' AND '.join(f'new.{column} = {table}.{column}' for column in key_columns)
+    score = qn(SkillMatch._meta.get_field('compatibility_score').column)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE TEMPORARY TABLE new_match ({}, score double precision NOT NULL)'.format(
+            ', '.join(f'{column} bigint NOT NULL' for column in key_columns)
+        ))
+        try:
+            for start in range(0, len(matches), chunk_size):
+                cursor.executemany(
+                    'INSERT INTO new_match VALUES (%s, %s, %s, %s, %s)', matches[start:start + chunk_size]
+                )
+            cursor.execute('CREATE UNIQUE INDEX new_match_pair ON new_match ({})'.format(', '.join(key_columns)))
+
+            cursor.execute(f'DELETE FROM {table} WHERE NOT EXISTS (SELECT 1 FROM new_match new WHERE {same_pair})')
+            deleted = cursor.rowcount
+            cursor.execute(
+                f'UPDATE {table} SET {score} = (SELECT new.score FROM new_match new WHERE {same_pair}), '
+                f'{qn(SkillMatch._meta.get_field("updated_at").column)} = %s '
+                f'WHERE EXISTS (SELECT 1 FROM new_match new WHERE {same_pair} AND new.score <> {table}.{score})',
+                [now],
+            )
+            columns = ', '.join(qn(SkillMatch._meta.get_field(name).column) for name in MATCH_INSERT_FIELDS)
+            new_columns = ', '.join(f'new.{column}' for column in key_columns)
+            # In key order, so the unique index is filled from left to right
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT {new_columns}, new.score, %s, %s, %s, %s FROM new_match new '
+                f'WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {same_pair}) ORDER BY {new_columns}',
+                [False, False, now, now],
+            )
+        finally:
+            cursor.execute('DROP TABLE new_match')
+    return deleted
+
+
+def rebuild_matches(limit=MAX_MATCHES_PER_DESIRED, chunk_size=CHUNK_SIZE, workers=1):
+    """
+    Recompute every match from scratch, scoring in `workers` processes.
+
+    sync_matches() writes only the differences from the stored matches;
+    mutual flags are then reset. Swap cycles are rebuilt separately by
+    skills.cycles.
+    """
+    offered_rows = load_offered()
+    desired_rows = load_desired()
+    matches = compute_matches(offered_rows, desired_rows, limit, workers=workers)
+
+    with transaction.atomic():
+        deleted = sync_matches(matches, chunk_size)
+        update_mutual_flags()
+    invalidate_suggestions()
+
+    return {
+        'offered': len(offered_rows),
+        'desired': len(desired_rows),
+        'matches': len(matches),
+        'deleted': deleted,
+    }
+
+
+def refresh_matches(user_id, skill_id, refill_desired_ids=(), limit=MAX_MATCHES_PER_DESIRED,
+                    chunk_size=CHUNK_SIZE):
+    """
+    Recompute the matches one user takes part in for one skill.
+
+    The user's own desired skill is re-ranked against every teacher of the
+    skill. Their offered skill is scored against every learner and only
+    enters a learner's list if it beats that learner's weakest match.
+    Learners listed in `refill_desired_ids` (or who were matched with the
+    user before) are re-ranked in full so they don't end up short.
+    """
+    started = timezone.now()
+    skill_ids = resolver.equivalent_ids(skill_id)
+    offered_rows = load_offered(skill_id__in=skill_ids)
+    desired_rows = load_desired(skill_id__in=skill_ids)
+    own_offered = next((row for row in offered_rows if row[O_USER] == user_id), None)
+
+    # Matches that mention the user for this skill; filtering through the
+    # counterpart's row also catches rows the user has moved to another skill
+    user_scope = (Q(teacher_id=user_id, desired_skill__skill_id__in=skill_ids) |
+                  Q(learner_id=user_id, offered_skill__skill_id__in=skill_ids))
+
+    rerank_ids = set(refill_desired_ids)
+    rerank_ids.update(SkillMatch.objects.filter(
+        teacher_id=user_id, desired_skill__skill_id__in=skill_ids
+    ).values_list('desired_skill_id', flat=True))
+    rerank_rows = [row for row in desired_rows
+                   if row[D_USER] == user_id or row[D_ID] in rerank_ids]
+    rerank_ids = {row[D_ID] for row in rerank_rows}
+
+    matches = compute_matches(offered_rows, rerank_rows, limit)
+    evicted = []
+
+    if own_offered is not None:
+        scorer = get_scorer()
+        # Same department pre-filter as compute_matches
+        departments = {row[D_DEPARTMENT] for row in desired_rows}
+        reachable = {department_id for department_id in departments
+                     if own_offered in candidate_teachers(offered_rows, department_id)}
+        candidates = [row for row in desired_rows
+                      if row[D_ID] not in rerank_ids and row[D_USER] != user_id
+                      and row[D_DEPARTMENT] in reachable]
+        scores = scorer.score(
+            scorer.prepare_offered([own_offered]), scorer.prepare_desired(candidates),
+            [0] * len(candidates), range(len(candidates)),
+        )
+
+        current = defaultdict(list)
+        for desired_id, match_id, offered_id, score in SkillMatch.objects.filter(
+            desired_skill__skill_id__in=skill_ids
+        ).values_list('desired_skill_id', 'id', 'offered_skill_id', 'compatibility_score'):
+            current[desired_id].append((score, -offered_id, match_id))
+
+        for desired, score in zip(candidates, scores):
+            score = float(score)
+            if score < 0:
+                continue
+            ranked = current[desired[D_ID]]
+            if len(ranked) >= limit:
+                weakest = min(ranked)
+                if (score, -own_offered[O_ID]) <= weakest[:2]:
+                    continue
+                evicted.append(weakest[2])
+            matches.append((user_id, desired[D_USER], own_offered[O_ID], desired[D_ID], score))
+
+    with transaction.atomic():
+        write_matches(matches, chunk_size)
+        stale = SkillMatch.objects.filter(
+            user_scope | Q(desired_skill_id__in=rerank_ids),
+            updated_at__lt=started,
+        )
+        if evicted:
+            stale = stale | SkillMatch.objects.filter(id__in=evicted)
+        # Everyone on either end of a written or deleted row may have
+        # gained or lost the reverse edge of a mutual match
+        affected = {user_id}
+        for teacher_id, learner_id, _, _, _ in matches:
+            affected.update((teacher_id, learner_id))
+        for teacher_id, learner_id in stale.values_list('teacher_id', 'learner_id'):
+            affected.update((teacher_id, learner_id))
+        deleted, _ = stale.delete()
+        update_mutual_flags(affected)
+
+    invalidate_suggestions(affected)
+
+    return {'matches': len(matches), 'deleted': deleted}
@@ -0,0 +1,12 @@
+from .signals import deferred_refreshes
+
+
+class DeferredRefreshMiddleware:
+    """Run the match, teacher index and signature refreshes a request queues once, after its view"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with deferred_refreshes():
+            return self.get_response(request)
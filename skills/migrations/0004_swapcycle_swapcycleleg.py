@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0003_alter_desiredskill_table_alter_offeredskill_table_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SwapCycle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField(default=0.0, help_text="Average compatibility of the cycle's matches")),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'swapcycle',
+                'ordering': ['-score', '-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SwapCycleLeg',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('cycle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='legs', to='skills.swapcycle')),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cycle_legs', to='skills.skillmatch')),
+            ],
+            options={
+                'db_table': 'swapcycleleg',
+                'ordering': ['position'],
+                'unique_together': {('cycle', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0004_swapcycle_swapcycleleg'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AffinityMatrix',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('department', 'Department'), ('branch', 'Branch')], max_length=20, unique=True)),
+                ('ids', models.BinaryField(help_text='Row/column ids as packed int64')),
+                ('values', models.BinaryField(help_text='Row-major affinities as packed float32')),
+                ('interactions', models.PositiveIntegerField(default=0, help_text='Accepted requests and completed sessions counted')),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'affinitymatrix',
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0005_affinitymatrix'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkillSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature', models.BinaryField(help_text='MinHash values as packed uint32')),
+                ('skill_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='skill_signature', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'skillsignature',
+            },
+        ),
+        migrations.CreateModel(
+            name='SkillSignatureBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skill_signature_buckets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'skillsignaturebucket',
+            },
+        ),
+    ]
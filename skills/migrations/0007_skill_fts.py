@@ -0,0 +1,98 @@
+# Generated manually: SQLite FTS5 index over skills, kept in sync by triggers
+
+from django.db import migrations
+
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE skill_fts USING fts5(
+        name, description, category,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER skill_fts_insert AFTER INSERT ON {skill} BEGIN
+        INSERT INTO skill_fts (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                (SELECT name FROM {category} WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER skill_fts_update AFTER UPDATE OF name, description, category_id ON {skill} BEGIN
+        DELETE FROM skill_fts WHERE rowid = old.id;
+        INSERT INTO skill_fts (rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                (SELECT name FROM {category} WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER skill_fts_delete AFTER DELETE ON {skill} BEGIN
+        DELETE FROM skill_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER skill_fts_category AFTER UPDATE OF name ON {category} BEGIN
+        UPDATE skill_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM {skill} WHERE category_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO skill_fts (rowid, name, description, category)
+    SELECT s.id, s.name, s.description, c.name
+    FROM {skill} s JOIN {category} c ON c.id = s.category_id
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS skill_fts_category',
+    'DROP TRIGGER IF EXISTS skill_fts_delete',
+    'DROP TRIGGER IF EXISTS skill_fts_update',
+    'DROP TRIGGER IF EXISTS skill_fts_insert',
+    'DROP TABLE IF EXISTS skill_fts',
+]
+
+
+def fts5_available(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Builds can also ship FTS5 without the compile option flag
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+            cursor.execute('DROP TABLE temp.fts5_probe')
+            return True
+        except Exception:
+            return False
+
+
+def create_skill_fts(apps, schema_editor):
+    """Other backends fall back to icontains lookups in skills.search"""
+    if not fts5_available(schema_editor.connection):
+        return
+    tables = {
+        'skill': schema_editor.quote_name(apps.get_model('skills', 'Skill')._meta.db_table),
+        'category': schema_editor.quote_name(apps.get_model('skills', 'SkillCategory')._meta.db_table),
+    }
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement.format(**tables))
+
+
+def drop_skill_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0006_skillsignature'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_skill_fts, drop_skill_fts),
+    ]
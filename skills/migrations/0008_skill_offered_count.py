@@ -0,0 +1,64 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:39
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def add_offered_count_column(apps, schema_editor):
+    Skill = apps.get_model('skills', 'Skill')
+    field = Skill._meta.get_field('offered_count')
+    if schema_editor.connection.vendor != 'sqlite':
+        schema_editor.add_field(Skill, field)
+        return
+    # Django rebuilds SQLite tables to add NOT NULL columns, which would
+    # drop the skill_fts and user_fts triggers on this table
+    definition, _ = schema_editor.column_sql(Skill, field)
+    check = field.db_parameters(schema_editor.connection)['check']
+    schema_editor.execute('ALTER TABLE {} ADD COLUMN {} {} DEFAULT 0 CHECK ({})'.format(
+        schema_editor.quote_name(Skill._meta.db_table), schema_editor.quote_name(field.column), definition, check,
+    ))
+
+
+def remove_offered_count_column(apps, schema_editor):
+    Skill = apps.get_model('skills', 'Skill')
+    schema_editor.remove_field(Skill, Skill._meta.get_field('offered_count'))
+
+
+def count_teachers(apps, schema_editor):
+    Skill = apps.get_model('skills', 'Skill')
+    OfferedSkill = apps.get_model('skills', 'OfferedSkill')
+    teachers = OfferedSkill.objects.filter(
+        skill_id=OuterRef('pk'), is_active=True, user__is_active=True
+    ).order_by().values('skill_id').annotate(count=Count('id')).values('count')
+    Skill.objects.update(offered_count=Coalesce(Subquery(teachers, output_field=IntegerField()), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0007_skill_fts'),
+        ('accounts', '0006_user_fts'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='skill',
+                    name='offered_count',
+                    field=models.PositiveIntegerField(default=0, editable=False),
+                ),
+            ],
+        ),
+        migrations.RunPython(add_offered_count_column, remove_offered_count_column),
+        migrations.RunPython(count_teachers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='skill',
+            index=models.Index(fields=['-offered_count', 'name'], name='skill_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='skill',
+            index=models.Index(fields=['-created_at'], name='skill_recent_idx'),
+        ),
+    ]
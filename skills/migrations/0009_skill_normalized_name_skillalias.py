@@ -0,0 +1,94 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:44
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of skills.canonical.ALIASES, added for the skills that exist;
+# later skills get theirs when they are created
+ALIASES = {
+    'python3': 'python',
+    'py': 'python',
+    'js': 'javascript',
+    'ts': 'typescript',
+    'golang': 'go',
+    'cpp': 'c++',
+    'reactjs': 'react',
+    'ml': 'machine learning',
+    'dl': 'deep learning',
+    'ui': 'ui design',
+}
+
+
+def skill_key(name):
+    # Frozen copy of skills.canonical.skill_key
+    text = unicodedata.normalize('NFKC', name).casefold()
+    return ' '.join(re.findall(r'[\w+#]+', text))[:100]
+
+
+def fill_normalized_names(apps, schema_editor):
+    """Key every skill; later skills with a taken key are left NULL for merge_duplicate_skills"""
+    Skill = apps.get_model('skills', 'Skill')
+    owners = {}
+    for skill_id, name in Skill.objects.order_by('id').values_list('id', 'name').iterator(chunk_size=10000):
+        key = skill_key(name)
+        if key and key not in owners:
+            owners[key] = skill_id
+    table = schema_editor.quote_name(Skill._meta.db_table)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {table} SET normalized_name = %s WHERE id = %s', list(owners.items())
+        )
+
+
+def add_aliases(apps, schema_editor):
+    Skill = apps.get_model('skills', 'Skill')
+    SkillAlias = apps.get_model('skills', 'SkillAlias')
+    skills = dict(Skill.objects.filter(normalized_name__in=set(ALIASES.values())).values_list('normalized_name', 'id'))
+    taken = set(Skill.objects.filter(normalized_name__in=list(ALIASES)).values_list('normalized_name', flat=True))
+    SkillAlias.objects.bulk_create([
+        SkillAlias(name=alias, normalized_name=alias, skill_id=skills[target])
+        for alias, target in ALIASES.items() if target in skills and alias not in taken
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0008_skill_offered_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkillAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('normalized_name', models.CharField(editable=False, max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Skill aliases',
+                'db_table': 'skillalias',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='skill',
+            name='normalized_name',
+            field=models.CharField(editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(fill_normalized_names, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='skill',
+            constraint=models.UniqueConstraint(condition=models.Q(('normalized_name__isnull', False)), fields=('normalized_name',), name='skill_normalized_name_unique'),
+        ),
+        migrations.AddField(
+            model_name='skillalias',
+            name='skill',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='skills.skill'),
+        ),
+        migrations.RunPython(add_aliases, migrations.RunPython.noop),
+    ]
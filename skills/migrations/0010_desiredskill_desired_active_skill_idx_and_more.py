@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0009_skill_normalized_name_skillalias'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='desiredskill',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['skill', 'user'], name='desired_active_skill_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offeredskill',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['skill', 'user'], name='offered_active_skill_idx'),
+        ),
+    ]
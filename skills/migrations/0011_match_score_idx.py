@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0010_desiredskill_desired_active_skill_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='skillmatch',
+            index=models.Index(fields=['compatibility_score', 'created_at'], name='match_score_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+FIELDS = ['rating_sum', 'rating_count']
+
+
+def add_rating_total_columns(apps, schema_editor):
+    OfferedSkill = apps.get_model('skills', 'OfferedSkill')
+    for name in FIELDS:
+        field = OfferedSkill._meta.get_field(name)
+        if schema_editor.connection.vendor != 'sqlite':
+            schema_editor.add_field(OfferedSkill, field)
+            continue
+        # Django rebuilds SQLite tables to add NOT NULL columns, which would
+        # drop the user_fts triggers on this table
+        definition, _ = schema_editor.column_sql(OfferedSkill, field)
+        check = field.db_parameters(schema_editor.connection)['check']
+        schema_editor.execute('ALTER TABLE {} ADD COLUMN {} {} DEFAULT 0 CHECK ({})'.format(
+            schema_editor.quote_name(OfferedSkill._meta.db_table), schema_editor.quote_name(field.column), definition, check,
+        ))
+
+
+def remove_rating_total_columns(apps, schema_editor):
+    OfferedSkill = apps.get_model('skills', 'OfferedSkill')
+    for name in FIELDS:
+        schema_editor.remove_field(OfferedSkill, OfferedSkill._meta.get_field(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skills', '0011_match_score_idx'),
+        ('accounts', '0006_user_fts'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='offeredskill',
+                    name=name,
+                    field=models.PositiveIntegerField(default=0, editable=False),
+                )
+                for name in FIELDS
+            ],
+        ),
+        migrations.RunPython(add_rating_total_columns, remove_rating_total_columns),
+    ]
@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -23,15 +24,72 @@ class Skill(models.Model):
     category = models.ForeignKey(SkillCategory, on_delete=models.CASCADE, related_name='skills')
     description = models.TextField(blank=True)
     is_popular = models.BooleanField(default=False)
+    # Active teachers, kept up to date by skills.facets
+    offered_count = models.PositiveIntegerField(default=0, editable=False)
+    # skills.canonical.skill_key(name); NULL for duplicates awaiting a merge
+    normalized_name = models.CharField(max_length=100, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['category__name', 'name']
         unique_together = ['name', 'category']
+        indexes = [
+            models.Index(fields=['-offered_count', 'name'], name='skill_popular_idx'),
+            models.Index(fields=['-created_at'], name='skill_recent_idx'),
+        ]
+        constraints = [
+            # The condition makes SQLite add a plain unique index rather
+            # than rebuild the table, which would drop the FTS triggers
+            models.UniqueConstraint(fields=['normalized_name'], condition=models.Q(normalized_name__isnull=False),
+                                    name='skill_normalized_name_unique'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.category.name})"
+    
+    def clean(self):
+        from .canonical import skill_key
+        key = skill_key(self.name)
+        taken = (Skill.objects.filter(normalized_name=key).exclude(pk=self.pk).exists()
+                 or SkillAlias.objects.filter(normalized_name=key).exclude(skill_id=self.pk).exists())
+        if key and taken:
+            raise ValidationError({'name': f'"{self.name}" is already a skill or an alias of one.'})
+    
+    def save(self, *args, **kwargs):
+        from .canonical import skill_key
+        # Duplicates keep their NULL key until they are merged
+        if self.pk is None or self.normalized_name is not None:
+            self.normalized_name = skill_key(self.name) or None
+        super().save(*args, **kwargs)
+
+class SkillAlias(models.Model):
+    """Another name for a skill, such as "js" for JavaScript"""
+    skill = models.ForeignKey(Skill, on_delete=models.CASCADE, related_name='aliases')
+    name = models.CharField(max_length=100)
+    normalized_name = models.CharField(max_length=100, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = "Skill aliases"
+        db_table = 'skillalias'
+    
+    def __str__(self):
+        return f"{self.name} -> {self.skill.name}"
+    
+    def clean(self):
+        from .canonical import skill_key
+        key = skill_key(self.name)
+        if not key:
+            raise ValidationError({'name': 'An alias needs letters or numbers.'})
+        if SkillAlias.objects.filter(normalized_name=key).exclude(pk=self.pk).exists():
+            raise ValidationError({'name': f'"{self.name}" is already an alias.'})
+    
+    def save(self, *args, **kwargs):
+        from .canonical import skill_key
+        self.normalized_name = skill_key(self.name)
+        super().save(*args, **kwargs)
 
 class OfferedSkill(models.Model):
     PROFICIENCY_LEVELS = [
@@ -59,11 +117,17 @@ class OfferedSkill(models.Model):
     # Rating for this specific skill teaching
     total_sessions = models.PositiveIntegerField(default=0)
     average_rating = models.FloatField(default=0.0)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         ordering = ['-created_at']
         unique_together = ['user', 'skill']
         db_table = 'offeredskill'
+        indexes = [
+            models.Index(fields=['skill', 'user'], condition=models.Q(is_active=True),
+                         name='offered_active_skill_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} offers {self.skill.name}"
@@ -95,6 +159,10 @@ class DesiredSkill(models.Model):
         ordering = ['-created_at']
         unique_together = ['user', 'skill']
         db_table = 'desiredskill'
+        indexes = [
+            models.Index(fields=['skill', 'user'], condition=models.Q(is_active=True),
+                         name='desired_active_skill_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} wants to learn {self.skill.name}"
@@ -115,6 +183,85 @@ class SkillMatch(models.Model):
         ordering = ['-compatibility_score', '-created_at']
         unique_together = ['teacher', 'learner', 'offered_skill', 'desired_skill']
         db_table = 'match'
+        indexes = [
+            # Read backwards for the default ordering, so a page of the
+            # admin changelist needs no sort over the whole table
+            models.Index(fields=['compatibility_score', 'created_at'], name='match_score_idx'),
+        ]
     
     def __str__(self):
         return f"Match: {self.teacher.username} → {self.learner.username} ({self.offered_skill.skill.name})"
+
+
+class SwapCycle(models.Model):
+    """A closed chain of three or four users where each can teach the next"""
+    size = models.PositiveSmallIntegerField()
+    score = models.FloatField(default=0.0, help_text="Average compatibility of the cycle's matches")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-score', '-created_at']
+        db_table = 'swapcycle'
+    
+    def __str__(self):
+        return f"Swap cycle of {self.size} ({self.score:.1f})"
+
+class SwapCycleLeg(models.Model):
+    """One teacher → learner step of a swap cycle"""
+    cycle = models.ForeignKey(SwapCycle, on_delete=models.CASCADE, related_name='legs')
+    match = models.ForeignKey(SkillMatch, on_delete=models.CASCADE, related_name='cycle_legs')
+    position = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        ordering = ['position']
+        unique_together = ['cycle', 'position']
+        db_table = 'swapcycleleg'
+    
+    def __str__(self):
+        return f"Leg {self.position} of {self.cycle}"
+
+class AffinityMatrix(models.Model):
+    """
+    How often students of one department (or branch) swap skills with
+    another's, packed as float32 values in [0, 1] for skills.affinity
+    """
+    KINDS = [
+        ('department', 'Department'),
+        ('branch', 'Branch'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KINDS, unique=True)
+    ids = models.BinaryField(help_text="Row/column ids as packed int64")
+    values = models.BinaryField(help_text="Row-major affinities as packed float32")
+    interactions = models.PositiveIntegerField(default=0, help_text="Accepted requests and completed sessions counted")
+    built_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'affinitymatrix'
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} affinity ({self.interactions} interactions)"
+
+class SkillSignature(models.Model):
+    """MinHash signature of the set of skills a user offers or wants to learn"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='skill_signature')
+    signature = models.BinaryField(help_text="MinHash values as packed uint32")
+    skill_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'skillsignature'
+    
+    def __str__(self):
+        return f"Skill signature of {self.user.username}"
+
+class SkillSignatureBucket(models.Model):
+    """One LSH band of a user's signature, hashed together with the band number"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='skill_signature_buckets')
+    bucket = models.BigIntegerField(db_index=True)
+    
+    class Meta:
+        db_table = 'skillsignaturebucket'
+    
+    def __str__(self):
+        return f"{self.user.username} in bucket {self.bucket}"
@@ -0,0 +1,257 @@
+"""
+Compatibility scoring for skill matches.
+
+Scores are on the 0-100 scale stored in SkillMatch.compatibility_score and
+are computed over batches of candidate (offered, desired) pairs. The NumPy
+scorer is used when NumPy is installed; PythonScorer produces exactly the
+same numbers one pair at a time and is handy in tests.
+
+The affinity feature looks the teacher's and learner's departments and
+branches up in the matrices from skills.affinity.
+
+The scorer class and the feature weights can be changed through the
+SKILL_MATCH_SCORER and SKILL_MATCH_WEIGHTS settings.
+"""
+import heapq
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .affinity import get_affinity
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+LEVEL_RANK = {'beginner': 0, 'intermediate': 1, 'advanced': 2, 'expert': 3}
+URGENCY_RANK = {'low': 0, 'medium': 1, 'high': 2, 'urgent': 3}
+FORMAT_MASK = {'online': 1, 'in_person': 2, 'both': 3}
+
+# Column positions in the value tuples loaded by skills.matching
+(O_ID, O_USER, O_SKILL, O_LEVEL, O_YEARS, O_FORMAT, O_RATING,
+ O_DEPARTMENT, O_BRANCH, O_PREFER_ONLINE, O_PREFER_IN_PERSON) = range(11)
+(D_ID, D_USER, D_SKILL, D_CURRENT, D_TARGET, D_URGENCY, D_FORMAT,
+ D_DEPARTMENT, D_BRANCH, D_PREFER_ONLINE, D_PREFER_IN_PERSON) = range(11)
+
+DEFAULT_WEIGHTS = {
+    'level': 35,        # teacher reaches the learner's target level
+    'experience': 15,   # years of experience, capped at 5
+    'rating': 15,       # teacher's rating for this skill
+    'urgency': 10,      # how soon the learner needs it
+    'format': 10,       # teaching preference covers the learning preference
+    'affinity': 10,     # branch or department affinity
+    'profile': 5,       # online/in-person profile preferences overlap
+}
+
+MAX_EXPERIENCE_YEARS = 5
+# Scale applied to each matrix before taking the larger of the two
+SAME_BRANCH_AFFINITY = 1.0
+SAME_DEPARTMENT_AFFINITY = 0.6
+
+# Cells scored at once when ranking a large skill
+BLOCK_SIZE = 250000
+
+NOT_A_MATCH = -1.0
+
+
+def _profile_mask(prefer_online, prefer_in_person):
+    # Users without a profile get the model defaults (both True)
+    online = 1 if prefer_online is None or prefer_online else 0
+    in_person = 2 if prefer_in_person is None or prefer_in_person else 0
+    return online | in_person
+
+
+def _columns(rows, fields):
+    return {name: [getter(row) for row in rows] for name, getter in fields.items()}
+
+
+OFFERED_COLUMNS = {
+    'id': lambda row: row[O_ID],
+    'user': lambda row: row[O_USER],
+    'level': lambda row: LEVEL_RANK.get(row[O_LEVEL], 0),
+    'years': lambda row: min(row[O_YEARS], MAX_EXPERIENCE_YEARS),
+    'format': lambda row: FORMAT_MASK.get(row[O_FORMAT], 3),
+    'rating': lambda row: float(row[O_RATING]),
+    'department': lambda row: row[O_DEPARTMENT],
+    'branch': lambda row: row[O_BRANCH],
+    'profile': lambda row: _profile_mask(row[O_PREFER_ONLINE], row[O_PREFER_IN_PERSON]),
+}
+
+DESIRED_COLUMNS = {
+    'id': lambda row: row[D_ID],
+    'user': lambda row: row[D_USER],
+    'current': lambda row: LEVEL_RANK.get(row[D_CURRENT], 0),
+    'target': lambda row: LEVEL_RANK.get(row[D_TARGET], 1),
+    'urgency': lambda row: URGENCY_RANK.get(row[D_URGENCY], 1),
+    'format': lambda row: FORMAT_MASK.get(row[D_FORMAT], 3),
+    'department': lambda row: row[D_DEPARTMENT],
+    'branch': lambda row: row[D_BRANCH],
+    'profile': lambda row: _profile_mask(row[D_PREFER_ONLINE], row[D_PREFER_IN_PERSON]),
+}
+
+
+class BaseScorer:
+    """
+    Scores candidate pairs given as parallel index sequences into the
+    prepared offered and desired columns. Ineligible pairs score NOT_A_MATCH.
+    Departments and branches are prepared as positions in the affinity
+    matrices.
+    """
+
+    def __init__(self, weights=None, affinity=None):
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self._affinity = affinity
+
+    @property
+    def affinity(self):
+        return self._affinity or get_affinity()
+
+    def _prepare(self, rows, fields):
+        columns = _columns(rows, fields)
+        affinity = self.affinity
+        columns['department'] = affinity.departments.positions(columns['department'])
+        columns['branch'] = affinity.branches.positions(columns['branch'])
+        return columns
+
+    def prepare_offered(self, rows):
+        return self._prepare(rows, OFFERED_COLUMNS)
+
+    def prepare_desired(self, rows):
+        return self._prepare(rows, DESIRED_COLUMNS)
+
+    def score(self, offered, desired, offered_idx, desired_idx):
+        raise NotImplementedError
+
+    def rank(self, offered, desired, limit):
+        """
+        Yield (offered_index, desired_index, score) for the best `limit`
+        teachers of every desired row. Ties go to the lower offered id.
+        """
+        raise NotImplementedError
+
+
+class PythonScorer(BaseScorer):
+    """Reference implementation, one pair at a time"""
+
+    def score_one(self, offered, desired, i, j):
+        w = self.weights
+        t_format, l_format = offered['format'][i], desired['format'][j]
+        if (offered['user'][i] == desired['user'][j]
+                or offered['level'][i] <= desired['current'][j]
+                or not t_format & l_format):
+            return NOT_A_MATCH
+
+        level = 1.0 if offered['level'][i] >= desired['target'][j] else 0.5
+        experience = offered['years'][i] / MAX_EXPERIENCE_YEARS
+        rating = offered['rating'][i] / 5
+        urgency = desired['urgency'][j] / 3
+        format_fit = 1.0 if (t_format & l_format) == l_format else 0.5
+        matrices = self.affinity
+        affinity = max(
+            SAME_BRANCH_AFFINITY * matrices.branches.rows[offered['branch'][i]][desired['branch'][j]],
+            SAME_DEPARTMENT_AFFINITY
+            * matrices.departments.rows[offered['department'][i]][desired['department'][j]],
+        )
+        profile = 1.0 if offered['profile'][i] & desired['profile'][j] else 0.0
+
+        total = (w['level'] * level + w['experience'] * experience + w['rating'] * rating
+                 + w['urgency'] * urgency + w['format'] * format_fit
+                 + w['affinity'] * affinity + w['profile'] * profile)
+        # Same rounding as numpy.round(total, 2)
+        return round(total * 100) / 100
+
+    def score(self, offered, desired, offered_idx, desired_idx):
+        return [self.score_one(offered, desired, i, j) for i, j in zip(offered_idx, desired_idx)]
+
+    def rank(self, offered, desired, limit):
+        offered_ids = offered['id']
+        for j in range(len(desired['id'])):
+            scored = []
+            for i in range(len(offered_ids)):
+                score = self.score_one(offered, desired, i, j)
+                if score >= 0:
+                    scored.append((score, -offered_ids[i], i))
+            for score, _, i in heapq.nlargest(limit, scored):
+                yield i, j, score
+
+
+class NumpyScorer(BaseScorer):
+    """Vectorised scorer; every feature is computed over whole pair arrays"""
+
+    def __init__(self, weights=None):
+        if np is None:
+            raise ImportError('NumpyScorer requires numpy')
+        super().__init__(weights)
+
+    def prepare_offered(self, rows):
+        columns = super().prepare_offered(rows)
+        return {name: np.asarray(values, dtype=np.float64 if name == 'rating' else np.int64)
+                for name, values in columns.items()}
+
+    def prepare_desired(self, rows):
+        columns = super().prepare_desired(rows)
+        return {name: np.asarray(values, dtype=np.int64) for name, values in columns.items()}
+
+    def score(self, offered, desired, offered_idx, desired_idx):
+        w = self.weights
+        i = np.asarray(offered_idx, dtype=np.intp)
+        j = np.asarray(desired_idx, dtype=np.intp)
+
+        t_level = offered['level'][i]
+        t_format = offered['format'][i]
+        l_format = desired['format'][j]
+        overlap = t_format & l_format
+        eligible = ((offered['user'][i] != desired['user'][j])
+                    & (t_level > desired['current'][j])
+                    & (overlap != 0))
+
+        level = np.where(t_level >= desired['target'][j], 1.0, 0.5)
+        experience = offered['years'][i] / MAX_EXPERIENCE_YEARS
+        rating = offered['rating'][i] / 5
+        urgency = desired['urgency'][j] / 3
+        format_fit = np.where(overlap == l_format, 1.0, 0.5)
+        matrices = self.affinity
+        affinity = np.maximum(
+            SAME_BRANCH_AFFINITY * matrices.branches.array[offered['branch'][i], desired['branch'][j]],
+            SAME_DEPARTMENT_AFFINITY
+            * matrices.departments.array[offered['department'][i], desired['department'][j]],
+        )
+        profile = np.where((offered['profile'][i] & desired['profile'][j]) != 0, 1.0, 0.0)
+
+        total = (w['level'] * level + w['experience'] * experience + w['rating'] * rating
+                 + w['urgency'] * urgency + w['format'] * format_fit
+                 + w['affinity'] * affinity + w['profile'] * profile)
+        total = np.rint(total * 100) / 100
+        return np.where(eligible, total, NOT_A_MATCH)
+
+    def rank(self, offered, desired, limit):
+        n_offered = len(offered['id'])
+        n_desired = len(desired['id'])
+        if not n_offered or not n_desired:
+            return
+        offered_ids = offered['id']
+        rows_per_block = max(1, BLOCK_SIZE // n_offered)
+        for start in range(0, n_desired, rows_per_block):
+            stop = min(start + rows_per_block, n_desired)
+            j = np.repeat(np.arange(start, stop), n_offered)
+            i = np.tile(np.arange(n_offered), stop - start)
+            scores = self.score(offered, desired, i, j).reshape(stop - start, n_offered)
+
+            # Sort each row by score descending, then offered id ascending
+            ids = np.broadcast_to(offered_ids, scores.shape)
+            order = np.lexsort((ids, -scores), axis=-1)[:, :limit]
+            best = np.take_along_axis(scores, order, axis=-1)
+            for row, (columns, values) in enumerate(zip(order.tolist(), best.tolist())):
+                for column, score in zip(columns, values):
+                    if score < 0:
+                        break
+                    yield column, start + row, score
+
+
+@lru_cache(maxsize=None)
+def get_scorer():
+    default = 'skills.scoring.NumpyScorer' if np is not None else 'skills.scoring.PythonScorer'
+    scorer_class = import_string(getattr(settings, 'SKILL_MATCH_SCORER', default))
+    return scorer_class(getattr(settings, 'SKILL_MATCH_WEIGHTS', None))
@@ -0,0 +1,93 @@
+"""
+Skill search.
+
+On SQLite the skill_fts FTS5 table (created and kept in sync by triggers
+in migration 0007) indexes skill names, descriptions and category names.
+Every search word is matched as a prefix and results are ranked with
+BM25, name matches weighing most. Other backends, or SQLite builds
+without FTS5, fall back to icontains lookups ranked by name.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Skill
+
+FTS_TABLE = 'skill_fts'
+# BM25 weights for the name, description and category columns
+BM25_WEIGHTS = (10.0, 1.0, 3.0)
+MAX_TERMS = 8
+
+_fts_tables = {}
+
+
+def fts_available():
+    """Whether skill_fts exists in the current database"""
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in _fts_tables:
+        _fts_tables[key] = (connection.vendor == 'sqlite'
+                            and FTS_TABLE in connection.introspection.table_names())
+    return _fts_tables[key]
+
+
+def search_terms(text):
+    return re.findall(r'\w+', text.lower())[:MAX_TERMS]
+
+
+def match_expression(terms):
+    """FTS5 query matching every term as a prefix"""
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def _fallback_filter(terms):
+    query = Q()
+    for term in terms:
+        query &= (Q(name__icontains=term) | Q(description__icontains=term)
+                  | Q(category__name__icontains=term))
+    return query
+
+
+def filter_skills(queryset, text):
+    """Narrow a Skill queryset to the search matches, keeping its ordering"""
+    terms = search_terms(text)
+    if not terms:
+        return queryset.none()
+    if fts_available():
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match_expression(terms)]
+        ))
+    return queryset.filter(_fallback_filter(terms))
+
+
+def search_skills(text, limit=10, queryset=None):
+    """Best matching skills, most relevant first"""
+    terms = search_terms(text)
+    if not terms:
+        return []
+    queryset = Skill.objects.all() if queryset is None else queryset
+
+    if not fts_available():
+        first = terms[0]
+        return list(queryset.filter(_fallback_filter(terms)).annotate(
+            relevance=Case(
+                When(name__iexact=first, then=Value(0)),
+                When(name__istartswith=first, then=Value(1)),
+                When(name__icontains=first, then=Value(2)),
+                default=Value(3),
+                output_field=IntegerField(),
+            )
+        ).order_by('relevance', 'name', 'id')[:limit])
+
+    # Rank in FTS5 and only load the skills that made the cut. Rows the
+    # queryset filters out are skipped, so over-fetch a little.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, %s, %s, %s), rowid LIMIT %s',
+            [match_expression(terms), *BM25_WEIGHTS, limit * 4],
+        )
+        ranked = [row[0] for row in cursor.fetchall()]
+    skills = queryset.in_bulk(ranked)
+    return [skills[skill_id] for skill_id in ranked if skill_id in skills][:limit]
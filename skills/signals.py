@@ -0,0 +1,212 @@
+"""
+Keep SkillMatch in step with edits to offered and desired skills.
+
+Changes are queued per (user, skill) and the matches are recomputed once
+the surrounding transaction commits, so several edits made together only
+trigger one refresh per pair. Offered skill changes also reload that
+skill's entry in the teacher index and its offered_count, and the user's
+similarity signature is recomputed once per transaction. ATOMIC_REQUESTS
+is off, so a plain save in a view commits at once; during a request
+DeferredRefreshMiddleware (skills.middleware) holds the queues instead
+and flushes them once after the view returns. The refreshes still run
+inside the request, but once per pair however many saves it made.
+
+Saving or deleting a Skill rebuilds the autocomplete index and Skill or
+SkillAlias changes reset the skill resolver, in every process sharing the
+cache (others catch up when their copies expire), and a new Skill gets
+the built-in aliases that name it. Dismissing or restoring a match
+recomputes the mutual flags and swap cycles around it.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import Skill, SkillAlias, OfferedSkill, DesiredSkill, SkillMatch
+
+_state = threading.local()
+
+
+def _pending():
+    if not hasattr(_state, 'pending'):
+        _state.pending = defaultdict(set)
+    return _state.pending
+
+
+def _pending_index_skills():
+    if not hasattr(_state, 'index_skills'):
+        _state.index_skills = set()
+    return _state.index_skills
+
+
+def _pending_signature_users():
+    if not hasattr(_state, 'signature_users'):
+        _state.signature_users = set()
+    return _state.signature_users
+
+
+def _schedule(flush):
+    # Inside deferred_refreshes() the queues are flushed when it exits
+    if not getattr(_state, 'deferring', False):
+        transaction.on_commit(flush)
+
+
+def flush_refreshes():
+    flush_match_refreshes()
+    flush_index_refreshes()
+    flush_signature_refreshes()
+
+
+@contextmanager
+def deferred_refreshes():
+    """Hold every refresh queued inside the block and run them once after it commits"""
+    _state.deferring = True
+    try:
+        yield
+    finally:
+        _state.deferring = False
+        transaction.on_commit(flush_refreshes)
+
+
+def schedule_match_refresh(user_id, skill_id, refill_desired_ids=()):
+    """Queue a match refresh for one user and skill until the next commit"""
+    _pending()[(user_id, skill_id)].update(refill_desired_ids)
+    _schedule(flush_match_refreshes)
+
+
+def flush_match_refreshes():
+    """Run every queued refresh; later on_commit callbacks find nothing to do"""
+    from .matching import refresh_matches
+
+    pending = _pending()
+    while pending:
+        (user_id, skill_id), refill_desired_ids = pending.popitem()
+        refresh_matches(user_id, skill_id, refill_desired_ids)
+
+
+def schedule_index_refresh(skill_id):
+    """Queue a teacher index reload for one skill until the next commit"""
+    _pending_index_skills().add(skill_id)
+    _schedule(flush_index_refreshes)
+
+
+def flush_index_refreshes():
+    from .facets import update_offered_counts
+    from .teacher_index import teacher_index
+
+    pending = _pending_index_skills()
+    if pending:
+        skill_ids = set(pending)
+        pending.clear()
+        for skill_id in skill_ids:
+            teacher_index.refresh_skill(skill_id)
+        update_offered_counts(skill_ids)
+
+
+def schedule_signature_refresh(user_id):
+    """Queue a similarity signature refresh for one user until the next commit"""
+    _pending_signature_users().add(user_id)
+    _schedule(flush_signature_refreshes)
+
+
+def flush_signature_refreshes():
+    from .similarity import refresh_signatures
+
+    pending = _pending_signature_users()
+    if pending:
+        user_ids = set(pending)
+        pending.clear()
+        refresh_signatures(user_ids)
+
+
+def reload_autocomplete():
+    from .autocomplete import autocomplete
+
+    autocomplete.invalidate()
+
+
+def reload_skill_resolver():
+    from .canonical import resolver
+
+    resolver.invalidate()
+
+
+@receiver(post_save, sender=Skill)
+@receiver(post_delete, sender=Skill)
+def skill_catalog_changed(sender, instance, **kwargs):
+    transaction.on_commit(reload_autocomplete)
+    transaction.on_commit(reload_skill_resolver)
+
+
+@receiver(post_save, sender=Skill)
+def add_aliases_for_new_skill(sender, instance, created, **kwargs):
+    from .canonical import add_builtin_aliases
+
+    if created:
+        add_builtin_aliases([instance])
+
+
+@receiver(post_save, sender=SkillAlias)
+@receiver(post_delete, sender=SkillAlias)
+def skill_alias_changed(sender, instance, **kwargs):
+    transaction.on_commit(reload_skill_resolver)
+
+
+@receiver(post_init, sender=OfferedSkill)
+@receiver(post_init, sender=DesiredSkill)
+def remember_skill(sender, instance, **kwargs):
+    # Read from __dict__ so deferred loads don't trigger a query
+    instance._loaded_skill_id = instance.__dict__.get('skill_id')
+
+
+@receiver(post_save, sender=OfferedSkill)
+@receiver(post_save, sender=DesiredSkill)
+def skill_saved(sender, instance, **kwargs):
+    skill_ids = [instance.skill_id]
+    previous_skill_id = getattr(instance, '_loaded_skill_id', None)
+    if previous_skill_id and previous_skill_id != instance.skill_id:
+        skill_ids.append(previous_skill_id)
+    instance._loaded_skill_id = instance.skill_id
+
+    for skill_id in skill_ids:
+        schedule_match_refresh(instance.user_id, skill_id)
+        if sender is OfferedSkill:
+            schedule_index_refresh(skill_id)
+    schedule_signature_refresh(instance.user_id)
+
+
+@receiver(pre_delete, sender=OfferedSkill)
+def remember_matched_learners(sender, instance, **kwargs):
+    # The cascade removes these matches, so note who needs a new teacher
+    instance._matched_desired_ids = list(
+        SkillMatch.objects.filter(offered_skill=instance).values_list('desired_skill_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=OfferedSkill)
+@receiver(post_delete, sender=DesiredSkill)
+def skill_deleted(sender, instance, **kwargs):
+    schedule_match_refresh(
+        instance.user_id, instance.skill_id, getattr(instance, '_matched_desired_ids', ())
+    )
+    if sender is OfferedSkill:
+        schedule_index_refresh(instance.skill_id)
+    schedule_signature_refresh(instance.user_id)
+
+
+@receiver(post_init, sender=SkillMatch)
+def remember_dismissal(sender, instance, **kwargs):
+    instance._loaded_dismissed = instance.__dict__.get('is_dismissed')
+
+
+@receiver(post_save, sender=SkillMatch)
+def match_saved(sender, instance, created, **kwargs):
+    from .cycles import dismissal_changed
+
+    if not created and instance.is_dismissed != instance._loaded_dismissed:
+        transaction.on_commit(partial(dismissal_changed, instance))
+    instance._loaded_dismissed = instance.is_dismissed
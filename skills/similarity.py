@@ -0,0 +1,144 @@
+"""
+"Students like you": neighbours by the skills they offer or want to learn.
+
+Every user's active skill ids form a set. The set is summarised by a
+MinHash signature of NUM_PERM values, where two signatures agree on a
+value with probability equal to the sets' Jaccard similarity. The
+signature is cut into BANDS bands of ROWS values; each band is hashed to a
+bucket, and users sharing any bucket become candidates. Candidates are
+ranked by how many signature values they share with the user, so a
+lookup only touches a few buckets instead of comparing against everyone.
+Four rows per band keep candidate lists in the tens: two users need a
+Jaccard similarity around 0.5 to have even odds of sharing a bucket.
+
+Signatures and buckets are stored in SkillSignature and
+SkillSignatureBucket. rebuild_signatures() recomputes all of them (the
+build_skill_signatures command) and refresh_signatures() only some users
+(called from skills.signals after skill edits). Lookups never write: a
+user without a signature yet has no similar students.
+"""
+import hashlib
+import random
+from array import array
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count
+
+from .models import OfferedSkill, DesiredSkill, SkillSignature, SkillSignatureBucket
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# h(x) = (a * x + b) mod PRIME, with fixed coefficients so every process
+# computes the same signatures
+PRIME = (1 << 31) - 1
+_coefficients = random.Random(20240611)
+HASHES = [(_coefficients.randrange(1, PRIME), _coefficients.randrange(PRIME)) for _ in range(NUM_PERM)]
+
+RESULTS = 10
+MAX_RESULTS = 50
+MAX_CANDIDATES = 200
+CHUNK_SIZE = 2000
+
+
+def minhash(skill_ids):
+    return [min((a * skill_id + b) % PRIME for skill_id in skill_ids) for a, b in HASHES]
+
+
+def band_buckets(signature):
+    """One signed 64-bit bucket id per band"""
+    buckets = []
+    for band in range(BANDS):
+        values = array('I', [band] + signature[band * ROWS:(band + 1) * ROWS])
+        digest = hashlib.blake2b(values.tobytes(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'little', signed=True))
+    return buckets
+
+
+def pack(signature):
+    return array('I', signature).tobytes()
+
+
+def unpack(data):
+    signature = array('I')
+    signature.frombytes(bytes(data))
+    return signature.tolist()
+
+
+def estimate_similarity(a, b):
+    """Estimated Jaccard similarity of the sets behind two signatures"""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+def load_skill_sets(user_ids=None):
+    """{user_id: set of active offered and desired skill ids}"""
+    sets = defaultdict(set)
+    for model in (OfferedSkill, DesiredSkill):
+        rows = model.objects.filter(is_active=True, user__is_active=True)
+        if user_ids is not None:
+            rows = rows.filter(user_id__in=user_ids)
+        for user_id, skill_id in rows.order_by().values_list('user_id', 'skill_id'):
+            sets[user_id].add(skill_id)
+    return sets
+
+
+def _write(skill_sets, chunk_size=CHUNK_SIZE):
+    signatures, buckets = [], []
+    for user_id in sorted(skill_sets):
+        signature = minhash(skill_sets[user_id])
+        signatures.append(SkillSignature(user_id=user_id, signature=pack(signature),
+                                         skill_count=len(skill_sets[user_id])))
+        buckets.extend(SkillSignatureBucket(user_id=user_id, bucket=bucket)
+                       for bucket in band_buckets(signature))
+    SkillSignature.objects.bulk_create(signatures, batch_size=chunk_size)
+    SkillSignatureBucket.objects.bulk_create(buckets, batch_size=chunk_size)
+    return len(signatures)
+
+
+def rebuild_signatures(chunk_size=CHUNK_SIZE):
+    """Recompute every user's signature; returns the number of users"""
+    skill_sets = load_skill_sets()
+    with transaction.atomic():
+        SkillSignatureBucket.objects.all().delete()
+        SkillSignature.objects.all().delete()
+        return _write(skill_sets, chunk_size)
+
+
+def refresh_signatures(user_ids):
+    """Recompute the signatures of some users after their skills changed"""
+    user_ids = set(user_ids)
+    skill_sets = load_skill_sets(user_ids)
+    with transaction.atomic():
+        SkillSignatureBucket.objects.filter(user_id__in=user_ids).delete()
+        SkillSignature.objects.filter(user_id__in=user_ids).delete()
+        return _write(skill_sets)
+
+
+def similar_students(user, limit=RESULTS):
+    """
+    Up to `limit` (user, similarity) pairs for the users whose skills look
+    most like this user's, most similar first.
+    """
+    stored = SkillSignature.objects.filter(user=user).values_list('signature', flat=True).first()
+    if stored is None:
+        return []
+    signature = unpack(stored)
+
+    candidates = SkillSignatureBucket.objects.filter(
+        bucket__in=band_buckets(signature), user__is_active=True
+    ).exclude(user=user).values('user_id').annotate(
+        shared=Count('id')
+    ).order_by('-shared', 'user_id').values_list('user_id', flat=True)[:MAX_CANDIDATES]
+
+    scored = sorted(
+        (-estimate_similarity(signature, unpack(other)), user_id)
+        for user_id, other in SkillSignature.objects.filter(
+            user_id__in=list(candidates)
+        ).values_list('user_id', 'signature')
+    )[:limit]
+
+    users = User.objects.select_related('profile__department').in_bulk([user_id for _, user_id in scored])
+    return [(users[user_id], -negated) for negated, user_id in scored]
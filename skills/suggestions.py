@@ -0,0 +1,151 @@
+"""
+Ranked match suggestions for the suggestions widget.
+
+A user's live matches (as learner or teacher) are ranked with a heap and
+served in keyset-paginated pages. Pages are cached per user under a
+version token that is replaced whenever that user's matches change, so
+invalidation never has to find the old keys.
+
+The tokens live in Django's default cache. Without a shared CACHES
+backend that is a per-process LocMemCache, so a change only reaches the
+process that made it; other processes serve their cached pages until
+CACHE_TIMEOUT expires them.
+"""
+import base64
+import heapq
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .cycles import cycles_for_user
+from .models import SkillMatch
+
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+MAX_CYCLES = 5
+CACHE_TIMEOUT = 300
+
+GLOBAL_VERSION_KEY = 'suggestions:version'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _user_version_key(user_id):
+    return f'suggestions:version:{user_id}'
+
+
+def invalidate_suggestions(user_ids=None):
+    """
+    Drop cached suggestions for some users, or for everyone, in the
+    default cache; see the module docstring for per-process caches.
+    """
+    if user_ids is None:
+        keys = [GLOBAL_VERSION_KEY]
+    else:
+        keys = [_user_version_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        token = uuid.uuid4().hex
+        cache.set_many({key: token for key in keys}, None)
+
+
+def encode_cursor(score, match_id):
+    return base64.urlsafe_b64encode(f'{score!r}:{match_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        score, match_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return float(score), int(match_id)
+    except (ValueError, UnicodeError):
+        raise InvalidCursor(cursor)
+
+
+def user_card(user, rating):
+    profile = user.profile if hasattr(user, 'profile') else None
+    department = profile.department if profile else None
+    return {
+        'id': user.id,
+        'username': user.username,
+        'department': department.code if department else None,
+        'rating': rating(profile) if profile else 0.0,
+    }
+
+
+def match_suggestion(match, user):
+    if match.learner_id == user.id:
+        counterpart = user_card(match.teacher, lambda profile: profile.average_rating_as_teacher)
+        direction = 'learn'
+    else:
+        counterpart = user_card(match.learner, lambda profile: profile.average_rating_as_learner)
+        direction = 'teach'
+    return {
+        'type': 'match',
+        'id': match.id,
+        'direction': direction,
+        'score': match.compatibility_score,
+        'is_mutual': match.is_mutual,
+        'skill': match.offered_skill.skill.name,
+        'user': counterpart,
+    }
+
+
+def swap_cycle_suggestion(cycle):
+    return {
+        'type': 'swap_cycle',
+        'id': cycle.id,
+        'size': cycle.size,
+        'score': cycle.score,
+        'legs': [
+            {
+                'teacher': leg.match.teacher.username,
+                'learner': leg.match.learner.username,
+                'skill': leg.match.offered_skill.skill.name,
+            }
+            for leg in cycle.legs.all()
+        ],
+    }
+
+
+def build_suggestions(user, cursor=None, limit=PAGE_SIZE):
+    """
+    One page of suggestions ordered by score (highest first), then match id.
+    Swap cycles are only included on the first page.
+    """
+    rows = SkillMatch.objects.filter(Q(teacher=user) | Q(learner=user), is_dismissed=False)
+    if cursor:
+        score, match_id = decode_cursor(cursor)
+        rows = rows.filter(Q(compatibility_score__lt=score) |
+                           Q(compatibility_score=score, id__gt=match_id))
+    top = heapq.nsmallest(limit + 1, rows.order_by().values_list('id', 'compatibility_score'),
+                          key=lambda row: (-row[1], row[0]))
+    has_more = len(top) > limit
+    top = top[:limit]
+
+    matches = SkillMatch.objects.filter(id__in=[match_id for match_id, _ in top]).select_related(
+        'teacher__profile__department', 'learner__profile__department', 'offered_skill__skill'
+    ).in_bulk()
+
+    page = {
+        'results': [match_suggestion(matches[match_id], user) for match_id, _ in top],
+        'next_cursor': encode_cursor(top[-1][1], top[-1][0]) if has_more else None,
+    }
+    if not cursor:
+        page['swap_cycles'] = [swap_cycle_suggestion(cycle) for cycle in cycles_for_user(user)[:MAX_CYCLES]]
+    return page
+
+
+def get_suggestions(user, cursor=None, limit=PAGE_SIZE):
+    """Cached build_suggestions"""
+    user_key = _user_version_key(user.id)
+    versions = cache.get_many([GLOBAL_VERSION_KEY, user_key])
+    key = 'suggestions:{}:{}:{}:{}:{}'.format(
+        user.id, versions.get(GLOBAL_VERSION_KEY, 0), versions.get(user_key, 0), limit, cursor or ''
+    )
+    page = cache.get(key)
+    if page is None:
+        page = build_suggestions(user, cursor, limit)
+        cache.set(key, page, CACHE_TIMEOUT)
+    return page
@@ -0,0 +1,190 @@
+"""
+Process-wide index of who actively offers each skill.
+
+For every skill id the index holds a sorted array of active teacher user
+ids with their proficiency rank and rating packed alongside, so lookups,
+counts and intersections don't touch the database.
+
+By default each process builds the whole index from OfferedSkill on first
+use and rebuilds it once it is SKILL_TEACHER_INDEX_TTL seconds old, so
+writes made by other processes show up within that time. With
+SKILL_TEACHER_INDEX_SHARED = True entries are also kept in the Django
+cache: a write stores the fresh entry there, bumps a generation number and
+records which skill that generation changed. Other processes notice the
+new generation (checked at most every SKILL_TEACHER_INDEX_CHECK_INTERVAL
+seconds) and drop only the skills changed since the one they last saw,
+or everything if that record has expired.
+"""
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import OfferedSkill
+from .scoring import LEVEL_RANK
+
+TeacherEntry = namedtuple('TeacherEntry', ['users', 'proficiency', 'ratings'])
+
+EMPTY_ENTRY = TeacherEntry(array('q'), array('B'), array('f'))
+
+GENERATION_KEY = 'teacher_index:generation'
+ENTRY_KEY = 'teacher_index:skill:{skill_id}'
+CHANGED_KEY = 'teacher_index:changed:{generation}'
+CACHE_TIMEOUT = 24 * 60 * 60
+# A process further behind than this reloads everything instead
+MAX_CATCH_UP = 500
+
+
+def _active_offers(**filters):
+    return OfferedSkill.objects.filter(
+        is_active=True, user__is_active=True, **filters
+    ).order_by('skill_id', 'user_id').values_list(
+        'skill_id', 'user_id', 'proficiency_level', 'average_rating'
+    )
+
+
+def _pack(rows):
+    """Group (skill_id, user_id, level, rating) rows, sorted by skill, into entries"""
+    entries = {}
+    for skill_id, user_id, level, rating in rows:
+        entry = entries.get(skill_id)
+        if entry is None:
+            entry = entries[skill_id] = TeacherEntry(array('q'), array('B'), array('f'))
+        entry.users.append(user_id)
+        entry.proficiency.append(LEVEL_RANK.get(level, 0))
+        entry.ratings.append(rating)
+    return entries
+
+
+class TeacherIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._complete = False
+        self._generation = None
+        self._checked_at = 0.0
+
+    @property
+    def shared(self):
+        return getattr(settings, 'SKILL_TEACHER_INDEX_SHARED', False)
+
+    def _sync(self):
+        """Forget local entries that are too old or that another process has changed"""
+        now = time.monotonic()
+        if not self.shared:
+            if self._complete and now - self._checked_at >= getattr(settings, 'SKILL_TEACHER_INDEX_TTL', 300):
+                with self._lock:
+                    self._complete = False
+            return
+        if now - self._checked_at < getattr(settings, 'SKILL_TEACHER_INDEX_CHECK_INTERVAL', 1.0):
+            return
+        self._checked_at = now
+        generation = cache.get(GENERATION_KEY, 0)
+        if generation != self._generation:
+            with self._lock:
+                self._catch_up(generation)
+
+    def _catch_up(self, generation):
+        """Drop the skills changed after self._generation up to `generation`; needs the lock"""
+        if self._generation is None or not 0 < generation - self._generation <= MAX_CATCH_UP:
+            self._entries = {}
+        else:
+            keys = [CHANGED_KEY.format(generation=number) for number in range(self._generation + 1, generation + 1)]
+            changed = cache.get_many(keys)
+            if len(changed) < len(keys):
+                self._entries = {}
+            else:
+                for skill_id in changed.values():
+                    self._entries.pop(skill_id, None)
+        self._generation = generation
+
+    def _load(self, skill_ids):
+        """Make sure every skill in skill_ids has a local entry"""
+        self._sync()
+        if self._complete:
+            return
+        if not self.shared:
+            with self._lock:
+                if not self._complete:
+                    self._entries = _pack(_active_offers())
+                    self._complete = True
+                    self._checked_at = time.monotonic()
+            return
+
+        missing = [skill_id for skill_id in skill_ids if skill_id not in self._entries]
+        if not missing:
+            return
+        keys = {ENTRY_KEY.format(skill_id=skill_id): skill_id for skill_id in missing}
+        found = {keys[key]: entry for key, entry in cache.get_many(list(keys)).items()}
+        still_missing = [skill_id for skill_id in missing if skill_id not in found]
+        if still_missing:
+            loaded = _pack(_active_offers(skill_id__in=still_missing))
+            for skill_id in still_missing:
+                found[skill_id] = loaded.get(skill_id, EMPTY_ENTRY)
+                # add() so a concurrent refresh_skill() always wins
+                cache.add(ENTRY_KEY.format(skill_id=skill_id), found[skill_id], CACHE_TIMEOUT)
+        self._entries.update(found)
+
+    def entry(self, skill_id):
+        """TeacherEntry for a skill; users are sorted ascending"""
+        self._load([skill_id])
+        return self._entries.get(skill_id, EMPTY_ENTRY)
+
+    def teachers(self, skill_id):
+        return self.entry(skill_id).users
+
+    def teacher_count(self, skill_id):
+        return len(self.entry(skill_id).users)
+
+    def counts(self, skill_ids):
+        """{skill_id: number of active teachers}"""
+        skill_ids = list(skill_ids)
+        self._load(skill_ids)
+        return {skill_id: len(self._entries.get(skill_id, EMPTY_ENTRY).users) for skill_id in skill_ids}
+
+    def common_teachers(self, skill_ids):
+        """Sorted ids of users who actively offer every one of the skills"""
+        skill_ids = list(skill_ids)
+        if not skill_ids:
+            return []
+        self._load(skill_ids)
+        entries = sorted((self._entries.get(skill_id, EMPTY_ENTRY).users for skill_id in skill_ids), key=len)
+        common = set(entries[0])
+        for users in entries[1:]:
+            if not common:
+                break
+            common.intersection_update(users)
+        return sorted(common)
+
+    def refresh_skill(self, skill_id):
+        """Reload one skill from the database after its offers changed"""
+        entry = _pack(_active_offers(skill_id=skill_id)).get(skill_id, EMPTY_ENTRY)
+        if self.shared:
+            cache.set(ENTRY_KEY.format(skill_id=skill_id), entry, CACHE_TIMEOUT)
+            try:
+                generation = cache.incr(GENERATION_KEY)
+            except ValueError:
+                generation = 1
+                cache.set(GENERATION_KEY, generation, None)
+            cache.set(CHANGED_KEY.format(generation=generation), skill_id, CACHE_TIMEOUT)
+            with self._lock:
+                self._catch_up(generation)
+                self._entries[skill_id] = entry
+                self._checked_at = time.monotonic()
+        else:
+            with self._lock:
+                if self._complete:
+                    self._entries[skill_id] = entry
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._complete = False
+            self._generation = None
+            self._checked_at = 0.0
+
+
+teacher_index = TeacherIndex()
@@ -1,3 +1,516 @@
-from django.test import TestCase
+import json
+import math
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Q
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .affinity import PRIOR_INTERACTIONS, Matrix, compute_matrix
+from .autocomplete import SkillAutocomplete
+from .canonical import resolver
+from .cycles import rebuild_swap_cycles
+from .management.commands.benchmark_matching import Command as BenchmarkCommand
+from .middleware import DeferredRefreshMiddleware
+from .matching import rebuild_matches, compute_matches, load_offered, load_desired, match_groups
+from .models import SkillCategory, Skill, SkillAlias, OfferedSkill, DesiredSkill, SkillMatch, SkillSignature, SwapCycle, SwapCycleLeg
+from .search import filter_skills, fts_available
+from .scoring import PythonScorer, NumpyScorer, np
+from .similarity import similar_students
+from .suggestions import build_suggestions, encode_cursor, decode_cursor, InvalidCursor
+from .teacher_index import TeacherIndex, teacher_index
+from .views import SkillDetailView
+
+
+def make_campus(users=80, skills=40):
+    call_command('generate_campus_data', users=users, skills=skills, requests_per_user=0,
+                 notifications_per_user=0, seed=3, stdout=StringIO())
+
+
+def wrong_mutual_flags():
+    """(teacher, learner) of every match whose is_mutual disagrees with the live reverse edges"""
+    live = set(SkillMatch.objects.filter(is_dismissed=False).values_list('teacher_id', 'learner_id'))
+    return [
+        (teacher_id, learner_id)
+        for teacher_id, learner_id, is_mutual in SkillMatch.objects.values_list('teacher_id', 'learner_id', 'is_mutual')
+        if is_mutual != ((learner_id, teacher_id) in live)
+    ]
+
+
+def stored_matches():
+    return set(SkillMatch.objects.values_list(
+        'teacher_id', 'learner_id', 'offered_skill_id', 'desired_skill_id', 'compatibility_score'
+    ))
+
+
+class MatchRebuildTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_campus()
+        rebuild_matches()
+
+    def test_rebuild_stores_the_computed_matches(self):
+        expected = {tuple(match) for match in compute_matches(load_offered(), load_desired())}
+        self.assertTrue(expected)
+        self.assertEqual(stored_matches(), expected)
+
+    def test_rebuild_writes_only_differences(self):
+        expected = stored_matches()
+        first, second, third = SkillMatch.objects.order_by('id')[:3]
+        SkillMatch.objects.filter(id=first.id).update(is_dismissed=True)
+        SkillMatch.objects.filter(id=second.id).update(compatibility_score=-1)
+        third.delete()
+        # update() skips the signals, so only the rebuild notices
+        dropped = SkillMatch.objects.exclude(id__in=[first.id, second.id]).last().desired_skill_id
+        DesiredSkill.objects.filter(id=dropped).update(is_active=False)
+        stale = SkillMatch.objects.filter(desired_skill_id=dropped).count()
+        untouched = dict(SkillMatch.objects.exclude(id__in=[first.id, second.id]).exclude(
+            desired_skill_id=dropped
+        ).values_list('id', 'updated_at'))
+
+        self.assertEqual(rebuild_matches()['deleted'], stale)
+        self.assertEqual(stored_matches(), {match for match in expected if match[3] != dropped})
+        self.assertTrue(SkillMatch.objects.get(id=first.id).is_dismissed)
+        self.assertEqual(
+            dict(SkillMatch.objects.filter(id__in=untouched).values_list('id', 'updated_at')), untouched
+        )
+
+
+@skipUnless(np is not None, 'NumpyScorer requires numpy')
+class ScorerParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_campus()
+
+    def setUp(self):
+        self.python, self.numpy = PythonScorer(), NumpyScorer()
+        self.groups = match_groups(load_offered(), load_desired())
+
+    def test_pair_scores_agree(self):
+        for teachers, learners in self.groups:
+            pairs = [(i, j) for i in range(len(teachers)) for j in range(len(learners))]
+            offered_idx, desired_idx = zip(*pairs)
+            expected = self.python.score(self.python.prepare_offered(teachers), self.python.prepare_desired(learners),
+                                         offered_idx, desired_idx)
+            scores = self.numpy.score(self.numpy.prepare_offered(teachers), self.numpy.prepare_desired(learners),
+                                      offered_idx, desired_idx)
+            self.assertEqual(scores.tolist(), expected)
+
+    def test_rankings_agree(self):
+        for teachers, learners in self.groups:
+            for limit in (1, 3):
+                with self.subTest(teachers=len(teachers), limit=limit):
+                    self.assertEqual(
+                        list(self.numpy.rank(self.numpy.prepare_offered(teachers),
+                                             self.numpy.prepare_desired(learners), limit)),
+                        list(self.python.rank(self.python.prepare_offered(teachers),
+                                              self.python.prepare_desired(learners), limit)),
+                    )
+
+
+class MatchRefreshTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_campus()
+        rebuild_matches()
+
+    def assertMatchesRebuild(self):
+        expected = {tuple(match) for match in compute_matches(load_offered(), load_desired())}
+        self.assertEqual(stored_matches(), expected)
+        self.assertEqual(wrong_mutual_flags(), [])
+
+    def edit(self, instance, **changes):
+        # The signal handlers refresh the matches when the edit commits
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in changes.items():
+                setattr(instance, name, value)
+            instance.save()
+        self.assertMatchesRebuild()
+
+    def busiest_offered(self):
+        return OfferedSkill.objects.filter(is_active=True).annotate(
+            matched=Count('skillmatch')
+        ).order_by('-matched', 'id').first()
+
+    def test_offered_skill_edits(self):
+        offered = self.busiest_offered()
+        self.edit(offered, proficiency_level='beginner', years_of_experience=0)
+        self.edit(offered, proficiency_level='expert', years_of_experience=10)
+        self.edit(offered, is_active=False)
+        self.edit(offered, is_active=True)
+
+    def test_desired_skill_edits(self):
+        desired = DesiredSkill.objects.filter(skillmatch__isnull=False).order_by('id').first()
+        self.edit(desired, current_level='advanced')
+        self.edit(desired, current_level='beginner', urgency='high')
+
+    def test_skill_moved_to_another_skill(self):
+        offered = self.busiest_offered()
+        taken = OfferedSkill.objects.filter(user=offered.user).values_list('skill_id', flat=True)
+        other = DesiredSkill.objects.exclude(skill_id__in=taken).values_list('skill_id', flat=True).first()
+        self.edit(offered, skill_id=other)
+
+    def test_new_and_deleted_offered_skills(self):
+        offered = self.busiest_offered()
+        learner = DesiredSkill.objects.filter(skill=offered.skill).exclude(
+            user__offered_skills__skill=offered.skill
+        ).first().user
+        with self.captureOnCommitCallbacks(execute=True):
+            OfferedSkill.objects.create(user=learner, skill=offered.skill, proficiency_level='expert',
+                                        years_of_experience=8)
+        self.assertMatchesRebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            offered.delete()
+        self.assertMatchesRebuild()
+
+
+class DeferredRefreshTests(TransactionTestCase):
+    def setUp(self):
+        make_campus(users=10, skills=5)
+        self.offered = OfferedSkill.objects.order_by('id').first()
+
+    def edit_twice(self, request=None):
+        for level in ('beginner', 'expert'):
+            self.offered.proficiency_level = level
+            self.offered.save()
+        return HttpResponse()
+
+    def refreshes(self, refresh):
+        # Test cases that rolled back can leave other pairs queued on this thread
+        pair = (self.offered.user_id, self.offered.skill_id)
+        return [call for call in refresh.call_args_list if call.args[:2] == pair]
+
+    def test_plain_saves_refresh_at_once(self):
+        with patch('skills.matching.refresh_matches') as refresh:
+            self.edit_twice()
+        self.assertEqual(len(self.refreshes(refresh)), 2)
+
+    def test_saves_in_a_request_refresh_once_after_the_view(self):
+        with patch('skills.matching.refresh_matches') as refresh:
+            DeferredRefreshMiddleware(self.edit_twice)(RequestFactory().post('/'))
+        self.assertEqual(len(self.refreshes(refresh)), 1)
+
+
+class BenchmarkMatchingTests(SimpleTestCase):
+    def test_tiny_run(self):
+        # In a subprocess, since the in-memory test database can't be swapped for the benchmark's file
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'results.json'
+            subprocess.run(
+                [sys.executable, 'manage.py', 'benchmark_matching', '--sizes', '30', '--operations', '4',
+                 '--workers', '1', '--output', str(output)],
+                cwd=settings.BASE_DIR, check=True, capture_output=True,
+            )
+            results = json.loads(output.read_text())
+        self.assertEqual(set(results['sizes']['30']),
+                         {'dataset', 'rebuild', 'scoring_x1', 'cycles', 'incremental', 'suggestions'})
+
+    def test_run_size_restores_the_test_database_name(self):
+        name = connection.settings_dict['TEST']['NAME']
+        with patch.object(connection.creation, 'create_test_db', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                BenchmarkCommand().run_size(30, 1, 4, [1])
+        self.assertEqual(connection.settings_dict['TEST']['NAME'], name)
+
+
+class AffinityTests(SimpleTestCase):
+    def test_same_department_swaps_count_once(self):
+        values = compute_matrix([1, 2], {(1, 1): 5, (1, 2): 5})
+        # Department 1 took part in ten swaps on top of the prior, department 2 in five
+        totals = [PRIOR_INTERACTIONS + 10, PRIOR_INTERACTIONS + 5]
+        self.assertAlmostEqual(values[0], (PRIOR_INTERACTIONS + 5) / totals[0])
+        self.assertAlmostEqual(values[1], 5 / math.sqrt(totals[0] * totals[1]))
+        self.assertAlmostEqual(values[3], PRIOR_INTERACTIONS / totals[1])
+
+    def test_unknown_ids_only_match_themselves(self):
+        matrix = Matrix([1, 2], compute_matrix([1, 2], {(1, 2): 5}))
+        self.assertEqual(matrix.value(3, 3), 1.0)
+        self.assertEqual(matrix.value(3, 1), 0.0)
+        self.assertEqual(matrix.value(3, 4), 0.0)
+        self.assertEqual(matrix.value(None, None), 0.0)
+        self.assertEqual(matrix.positions([None, 1, 3, 4]), [0, 1, 3, 4])
+        if matrix.array is not None:
+            self.assertEqual(matrix.array.tolist(), matrix.rows)
+
+
+class AutocompleteTests(TransactionTestCase):
+    def test_expired_index_picks_up_new_popularity(self):
+        category = SkillCategory.objects.create(name='Music')
+        guitar = Skill.objects.create(name='Guitar', category=category)
+        Skill.objects.create(name='Gamelan', category=category)
+        index = SkillAutocomplete()
+        self.assertEqual([s.name for s in index.complete('g')], ['Gamelan', 'Guitar'])
+
+        OfferedSkill.objects.create(user=User.objects.create(username='strummer'), skill=guitar)
+        with override_settings(SKILL_AUTOCOMPLETE_CHECK_INTERVAL=0, SKILL_AUTOCOMPLETE_TTL=0):
+            index.complete('g')
+        # The rebuild thread holds the lock until it is done
+        with index._lock:
+            self.assertEqual([s.name for s in index.complete('g')], ['Guitar', 'Gamelan'])
+
+
+class DismissalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_campus()
+        rebuild_matches()
+        rebuild_swap_cycles()
+
+    def set_dismissed(self, match, dismissed):
+        with self.captureOnCommitCallbacks(execute=True):
+            match.is_dismissed = dismissed
+            match.save()
+        self.assertEqual(wrong_mutual_flags(), [])
+
+    def test_dismissal_resets_mutual_flags(self):
+        match = SkillMatch.objects.filter(is_mutual=True).first()
+        self.set_dismissed(match, True)
+        self.assertFalse(SkillMatch.objects.filter(teacher=match.learner, learner=match.teacher,
+                                                   is_mutual=True).exists())
+        self.set_dismissed(match, False)
+        self.assertTrue(SkillMatch.objects.filter(teacher=match.learner, learner=match.teacher,
+                                                  is_mutual=True).exists())
+
+    def test_dismissal_drops_cycles_through_the_match(self):
+        leg = SwapCycleLeg.objects.select_related('match').first()
+        self.set_dismissed(leg.match, True)
+        self.assertFalse(SwapCycle.objects.filter(legs__match=leg.match).exists())
+
+
+class SuggestionCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_campus()
+        rebuild_matches()
+        cls.user = User.objects.annotate(matched=Count('teaching_matches')).order_by('-matched', 'id').first()
+
+    def test_cursor_round_trip(self):
+        for score, match_id in [(87.35, 12), (0.1 + 0.2, 7), (100.0, 1)]:
+            self.assertEqual(decode_cursor(encode_cursor(score, match_id)), (score, match_id))
+        for cursor in ['', 'not base64!', 'YWJj', 'MS4wOnR3bw==']:
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_pages_cover_every_match_once(self):
+        expected = list(SkillMatch.objects.filter(
+            Q(teacher=self.user) | Q(learner=self.user), is_dismissed=False
+        ).order_by('-compatibility_score', 'id').values_list('id', flat=True))
+        self.assertGreater(len(expected), 3)
+
+        seen, cursor = [], None
+        while True:
+            page = build_suggestions(self.user, cursor, limit=3)
+            seen.extend(result['id'] for result in page['results'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+
+class TeacherIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_campus()
+        cls.skill_ids = list(OfferedSkill.objects.filter(is_active=True).order_by(
+            'skill_id').values_list('skill_id', flat=True).distinct()[:2])
+
+    def setUp(self):
+        cache.clear()
+        teacher_index.clear()
+
+    def deactivate_offers(self, skill_id):
+        # A write another process made: no signals reach this one
+        return OfferedSkill.objects.filter(skill_id=skill_id).update(is_active=False)
+
+    def test_local_index_expires(self):
+        index = TeacherIndex()
+        skill_id = self.skill_ids[0]
+        self.assertGreater(index.teacher_count(skill_id), 0)
+        self.deactivate_offers(skill_id)
+        self.assertGreater(index.teacher_count(skill_id), 0)
+        with self.settings(SKILL_TEACHER_INDEX_TTL=0):
+            self.assertEqual(index.teacher_count(skill_id), 0)
+
+    @override_settings(SKILL_TEACHER_INDEX_SHARED=True, SKILL_TEACHER_INDEX_CHECK_INTERVAL=0)
+    def test_shared_index_drops_only_changed_skills(self):
+        changed, untouched = self.skill_ids
+        reader, writer = TeacherIndex(), TeacherIndex()
+        before = reader.counts(self.skill_ids)
+        kept = reader.entry(untouched)
+
+        self.deactivate_offers(changed)
+        writer.refresh_skill(changed)
+        self.assertEqual(reader.counts(self.skill_ids), {changed: 0, untouched: before[untouched]})
+        self.assertIs(reader.entry(untouched), kept)
+
+    def test_skill_detail_pages_teachers(self):
+        skill_id = OfferedSkill.objects.filter(is_active=True).values('skill_id').annotate(
+            teachers=Count('id')
+        ).order_by('-teachers').first()['skill_id']
+        teachers = TeacherIndex().teacher_count(skill_id)
+        url = reverse('skills:skill_detail', args=[skill_id])
+        with patch.object(SkillDetailView, 'teachers_per_page', 2):
+            first = self.client.get(url).context
+            last = self.client.get(url, {'page': first['teacher_page'].paginator.num_pages}).context
+        self.assertEqual(len(first['teachers']), 2)
+        self.assertEqual(first['offered_count'], teachers)
+        ratings = [teacher['rating'] for teacher in first['teachers']]
+        self.assertEqual(ratings, sorted(ratings, reverse=True))
+        self.assertEqual(len(last['teachers']), teachers - 2 * (last['teacher_page'].number - 1))
+        self.assertNotIn(last['teachers'][-1]['user'], [teacher['user'] for teacher in first['teachers']])
+
+
+class SimilarStudentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_campus()
+
+    def test_lookup_finds_students_with_shared_skills(self):
+        user = SkillSignature.objects.order_by('-skill_count', 'user_id').first().user
+        similar = similar_students(user)
+        self.assertTrue(similar)
+        self.assertNotIn(user, [other for other, _ in similar])
+        scores = [score for _, score in similar]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_lookup_without_signature_writes_nothing(self):
+        user = SkillSignature.objects.order_by('user_id').first().user
+        SkillSignature.objects.filter(user=user).delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(similar_students(user), [])
+        self.assertFalse(SkillSignature.objects.filter(user=user).exists())
+
+
+class SkillSearchIndexTests(TestCase):
+    def setUp(self):
+        if not fts_available():
+            self.skipTest('skill_fts needs SQLite with FTS5')
+        self.category = SkillCategory.objects.create(name='Programming')
+
+    def search(self, text):
+        return set(filter_skills(Skill.objects.all(), text).values_list('id', flat=True))
+
+    def test_triggers_follow_inserts_updates_and_deletes(self):
+        skill = Skill.objects.create(name='Haskell', description='Lazy functional programming',
+                                     category=self.category)
+        self.assertEqual(self.search('hask'), {skill.id})
+        self.assertEqual(self.search('functional'), {skill.id})
+
+        skill.name = 'Elm'
+        skill.description = 'Typed frontend language'
+        skill.save()
+        self.assertEqual(self.search('haskell'), set())
+        self.assertEqual(self.search('functional'), set())
+        self.assertEqual(self.search('elm frontend'), {skill.id})
+
+        self.category.name = 'Web Development'
+        self.category.save()
+        self.assertEqual(self.search('programming'), set())
+        self.assertEqual(self.search('web elm'), {skill.id})
+
+        skill.delete()
+        self.assertEqual(self.search('elm'), set())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM skill_fts')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class CanonicalSkillTests(TestCase):
+    def setUp(self):
+        resolver.invalidate()
+        self.category = SkillCategory.objects.create(name='Programming')
+
+    def test_new_skill_gets_its_builtin_aliases(self):
+        python, created = resolver.get_or_create('Python', self.category)
+        self.assertTrue(created)
+        self.assertEqual(set(python.aliases.values_list('normalized_name', flat=True)), {'python3', 'py'})
+        resolver.invalidate()
+        self.assertEqual(resolver.get_or_create('Python3'), (python, False))
+
+    def test_generated_campus_resolves_aliases(self):
+        make_campus(users=5, skills=10)
+        python = Skill.objects.get(normalized_name='python')
+        self.assertTrue(SkillAlias.objects.filter(normalized_name='python3', skill=python).exists())
+        self.assertEqual(resolver.get_or_create('Python3'), (python, False))
+
+    def test_resolver_applies_aliases_without_rows(self):
+        javascript = Skill.objects.bulk_create([
+            Skill(name='JavaScript', category=self.category, normalized_name='javascript')
+        ])[0]
+        self.assertFalse(SkillAlias.objects.exists())
+        self.assertEqual(resolver.resolve('JS'), javascript.id)
+
+    def test_cached_lookups_expire(self):
+        self.assertIsNone(resolver.resolve('Haskell'))
+        # bulk_create() sends no signals, like a write made by another process
+        haskell = Skill.objects.bulk_create([
+            Skill(name='Haskell', category=self.category, normalized_name='haskell')
+        ])[0]
+        self.assertIsNone(resolver.resolve('Haskell'))
+        with override_settings(SKILL_RESOLVER_CHECK_INTERVAL=0, SKILL_RESOLVER_TTL=0):
+            self.assertEqual(resolver.resolve('Haskell'), haskell.id)
+
+    def test_get_or_create_skips_a_skill_deleted_since_it_was_cached(self):
+        rust, _ = resolver.get_or_create('Rust', self.category)
+        Skill.objects.filter(pk=rust.pk).delete()
+        again, created = resolver.get_or_create('Rust', self.category)
+        self.assertTrue(created)
+        self.assertNotEqual(again.pk, rust.pk)
+
+
+class MergeDuplicateSkillsTests(TestCase):
+    def test_merge_moves_offered_and_desired_skills(self):
+        category = SkillCategory.objects.create(name='Programming')
+        canonical = Skill.objects.create(name='Rust', category=category)
+        # A key taken by another skill is saved as NULL, like a race would leave it
+        duplicate = Skill.objects.bulk_create([Skill(name='rust!', category=category)])[0]
+        both, offers, wants = [User.objects.create(username=name) for name in ('both', 'offers', 'wants')]
+        OfferedSkill.objects.bulk_create([
+            OfferedSkill(user=both, skill=canonical), OfferedSkill(user=both, skill=duplicate),
+            OfferedSkill(user=offers, skill=duplicate),
+        ])
+        DesiredSkill.objects.bulk_create([DesiredSkill(user=wants, skill=duplicate)])
+
+        out = StringIO()
+        call_command('merge_duplicate_skills', stdout=out)
+        self.assertIn('moved 1 offered and 1 desired skills', out.getvalue())
+        self.assertIn('dropped 1 repeated entries', out.getvalue())
+
+        self.assertFalse(Skill.objects.filter(id=duplicate.id).exists())
+        self.assertEqual(sorted(OfferedSkill.objects.values_list('user__username', 'skill_id')),
+                         [('both', canonical.id), ('offers', canonical.id)])
+        self.assertEqual(list(DesiredSkill.objects.values_list('user__username', 'skill_id')),
+                         [('wants', canonical.id)])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class ActiveSkillIndexTests(TestCase):
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return ' '.join(row[-1] for row in cursor.fetchall())
+
+    def test_active_offers_per_skill_use_partial_index(self):
+        plan = self.query_plan(OfferedSkill.objects.filter(skill_id=1, is_active=True))
+        self.assertIn('USING INDEX offered_active_skill_idx', plan)
+
+    def test_active_wants_per_skill_use_partial_index(self):
+        plan = self.query_plan(DesiredSkill.objects.filter(skill_id=1, is_active=True))
+        self.assertIn('USING INDEX desired_active_skill_idx', plan)
+
+    def test_inactive_rows_are_not_indexed(self):
+        plan = self.query_plan(OfferedSkill.objects.filter(skill_id=1, is_active=False))
+        self.assertNotIn('offered_active_skill_idx', plan)
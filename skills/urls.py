@@ -6,6 +6,7 @@ app_name = 'skills'
 urlpatterns = [
     # Skill browsing
     path('', views.SkillListView.as_view(), name='skill_list'),
+    path('skill/<int:pk>/', views.SkillDetailView.as_view(), name='skill_detail'),
     path('categories/', views.SkillCategoryListView.as_view(), name='category_list'),
     path('category/<int:category_id>/', views.SkillCategoryDetailView.as_view(), name='category_detail'),
     
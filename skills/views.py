@@ -4,10 +4,15 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
+from django.core.paginator import Paginator
 from django.http import JsonResponse
 
 from .models import Skill, SkillCategory, OfferedSkill, DesiredSkill, SkillMatch
 from .forms import OfferedSkillForm, DesiredSkillForm, SkillSearchForm
+from .autocomplete import autocomplete
+from .facets import category_facets
+from .search import filter_skills
+from .teacher_index import teacher_index
 
 # Create your views here.
 
@@ -15,9 +20,82 @@ class SkillListView(ListView):
     model = Skill
     template_name = 'skills/skill_list.html'
     context_object_name = 'skills'
+    paginate_by = 24
+    SORTS = {
+        'name': ('name', 'id'),
+        'popular': ('-offered_count', 'name', 'id'),
+        'recent': ('-created_at', '-id'),
+    }
     
     def get_queryset(self):
-        return Skill.objects.filter(category__is_active=True)
+        skills = Skill.objects.filter(category__is_active=True)
+        self.search = self.request.GET.get('search', '').strip()
+        if self.search:
+            skills = filter_skills(skills, self.search)
+        # Category counts are for the search alone, so other categories stay comparable
+        self.categories = list(category_facets(skills))
+
+        try:
+            self.category_id = int(self.request.GET.get('category', ''))
+        except ValueError:
+            self.category_id = None
+        if self.category_id is not None:
+            skills = skills.filter(category_id=self.category_id)
+
+        sort = self.request.GET.get('sort')
+        return skills.select_related('category').order_by(*self.SORTS.get(sort, self.SORTS['name']))
+
+    def get_paginator(self, queryset, *args, **kwargs):
+        paginator = super().get_paginator(queryset, *args, **kwargs)
+        # The facets already counted the matches
+        paginator.count = sum(
+            category.skill_count for category in self.categories
+            if self.category_id is None or category.id == self.category_id
+        )
+        return paginator
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context['skills'] = context['page_obj']
+        # Only the pages next to the current one get links
+        context['page_range'] = range(max(page.number - 2, 1), min(page.number + 2, page.paginator.num_pages) + 1)
+        context['total_skills'] = context['paginator'].count
+        context['categories'] = self.categories
+        context['selected_category'] = next(
+            (category for category in self.categories if category.id == self.category_id), None
+        )
+        return context
+
+
+class SkillDetailView(DetailView):
+    model = Skill
+    template_name = 'skills/skill_detail.html'
+    context_object_name = 'skill'
+    teachers_per_page = 24
+    
+    def get_queryset(self):
+        return Skill.objects.select_related('category')
+    
+    def get_context_data(self, **kwargs):
+        from django.contrib.auth.models import User
+        context = super().get_context_data(**kwargs)
+        entry = teacher_index.entry(self.object.id)
+        # Rank positions in the index, then load only the users on this page
+        ranked = sorted(range(len(entry.users)), key=lambda position: (-entry.ratings[position], entry.users[position]))
+        page = Paginator(ranked, self.teachers_per_page).get_page(self.request.GET.get('page'))
+        users = User.objects.filter(
+            id__in=[entry.users[position] for position in page]
+        ).select_related('profile__department').in_bulk()
+        levels = dict(enumerate(label for _, label in OfferedSkill.PROFICIENCY_LEVELS))
+        context['teachers'] = [
+            {'user': users[entry.users[position]], 'proficiency': levels.get(entry.proficiency[position]),
+             'rating': entry.ratings[position]}
+            for position in page
+            if entry.users[position] in users
+        ]
+        context['teacher_page'] = page
+        context['offered_count'] = len(entry.users)
+        return context
 
 
 class SkillCategoryListView(ListView):
@@ -41,7 +119,7 @@ class OfferedSkillListView(LoginRequiredMixin, ListView):
     context_object_name = 'offered_skills'
     
     def get_queryset(self):
-        return OfferedSkill.objects.filter(user=self.request.user)
+        return OfferedSkill.objects.filter(user=self.request.user).select_related('skill')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -149,9 +227,11 @@ class SkillMatchListView(LoginRequiredMixin, ListView):
 
 @login_required
 def dismiss_skill_match(request, pk):
+    from .suggestions import invalidate_suggestions
     match = get_object_or_404(SkillMatch, pk=pk)
     match.is_dismissed = True
     match.save()
+    invalidate_suggestions([match.teacher_id, match.learner_id])
     return redirect('skills:match_list')
 
 
@@ -159,12 +239,14 @@ class SkillAutocompleteView(LoginRequiredMixin, ListView):
     model = Skill
     
     def get_queryset(self):
-        term = self.request.GET.get('term', '')
-        return Skill.objects.filter(name__icontains=term)[:10]
+        return autocomplete.complete(self.request.GET.get('term', ''), limit=10)
     
     def get(self, request, *args, **kwargs):
-        skills = self.get_queryset()
-        data = [{'id': skill.id, 'text': skill.name} for skill in skills]
+        from core.result_cache import normalize, autocomplete_cache
+        data = autocomplete_cache.get_or_compute(
+            (normalize(request.GET.get('term', '')),),
+            lambda: [{'id': skill.id, 'text': skill.name} for skill in self.get_queryset()],
+        )
         return JsonResponse({'results': data})
 
 